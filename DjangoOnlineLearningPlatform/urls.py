@@ -28,6 +28,8 @@ from users.views import user_login, LoginView, RegisterView, ActiveUserView, For
 
 from organization.views import OrgListView
 from users.views import IndexView
+from courses.api import CourseApiView, CourseLessonApiView
+from organization.api import OrgApiView, TeacherApiView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -54,6 +56,11 @@ urlpatterns = [
     path('teacher/', include('organization.urls2', namespace='teacher')),
     # 用户中心
     path('usercenter/', include('users.urls', namespace='usercenter')),
+    # 只读数据接口
+    path('api/courses/', CourseApiView.as_view(), name='api_courses'),
+    re_path('api/courses/(?P<course_id>\d+)/lessons/', CourseLessonApiView.as_view(), name='api_course_lessons'),
+    path('api/orgs/', OrgApiView.as_view(), name='api_orgs'),
+    path('api/teachers/', TeacherApiView.as_view(), name='api_teachers'),
 ]
 
 if settings.DEBUG:
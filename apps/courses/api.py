@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.http import JsonResponse, Http404
+from django.urls import reverse
+from django.utils.http import http_date
+from django.views.generic.base import View
+
+from utils.api import CatalogView, conditional, int_param
+from .models import Course
+from .tree import get_course_tree
+
+# 点击数由计数器批量写回，不触发版本号变化，所以不对外提供
+
+
+class CourseApiView(CatalogView):
+    model = Course
+    allowed_fields = ('id', 'name', 'desc', 'detail', 'degree', 'learn_times', 'students', 'fav_nums', 'image', 'add_time',
+                      'course_org_id', 'category_id', 'teacher_id', 'lesson_nums', 'video_nums', 'video_times', 'comment_nums')
+    default_fields = ('id', 'name', 'desc', 'degree', 'learn_times', 'students', 'image', 'course_org_id', 'teacher_id')
+    version_name = 'course'
+
+    def get_queryset(self, request, **kwargs):
+        # 可按机构、类别、讲师、难度筛选
+        queryset = Course.objects.all()
+        for param, field in (('org', 'course_org_id'), ('category', 'category_id'), ('teacher', 'teacher_id')):
+            value = int_param(request, param)
+            if value is not None:
+                queryset = queryset.filter(**{field: value})
+        degree = request.GET.get('degree')
+        if degree:
+            queryset = queryset.filter(degree=degree)
+        return queryset
+
+
+# 课程的章节和视频，直接读取缓存的课程内容树
+class CourseLessonApiView(View):
+    def get(self, request, course_id):
+        course_id = int(course_id)
+        if not Course.objects.filter(id=course_id).exists():
+            raise Http404('课程不存在')
+        response, etag, last_modified = conditional(request, 'lesson:{}'.format(course_id))
+        if response is not None:
+            return response
+        results = [{
+            'id': lesson.id,
+            'name': lesson.name,
+            'videos': [{'id': video.id, 'name': video.name, 'learn_times': video.learn_times,
+                        'stream_url': reverse('course:video_stream', args=(video.id,))} for video in lesson.videos],
+        } for lesson in get_course_tree(course_id)]
+        response = JsonResponse({'results': results}, json_dumps_params={'ensure_ascii': False})
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class CoursesConfig(AppConfig):
     name = 'courses'
-    verbose_name = '课程'
\ No newline at end of file
+    verbose_name = '课程'
+
+    def ready(self):
+        # 注册信号处理函数
+        import courses.signals
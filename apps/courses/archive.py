@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+
+from django.conf import settings
+from django.http import StreamingHttpResponse, Http404
+
+from utils.fragment import get_list_version, bump_list_version
+from utils.sendfile import serve_file, content_disposition
+from utils.zipstream import stream_zip, unique_name
+
+# 打包下载时顺便保存一份压缩包，资源未变化时直接发送保存好的文件
+ARCHIVE_CACHE = getattr(settings, 'COURSE_ARCHIVE_CACHE', True)
+# 压缩包不能放在MEDIA_ROOT下，否则不用选课就能通过/media/地址直接下载；默认放在MEDIA_ROOT旁边的course_archive目录
+ARCHIVE_ROOT = getattr(settings, 'COURSE_ARCHIVE_ROOT',
+                       os.path.join(os.path.dirname(os.path.abspath(settings.MEDIA_ROOT)), 'course_archive'))
+# 使用nginx发送文件时，压缩包对应的internal location
+ARCHIVE_SENDFILE_URL = getattr(settings, 'COURSE_ARCHIVE_SENDFILE_URL', '/protected-archive/')
+
+
+def _version_name(course_id):
+    return 'resource:{}'.format(course_id)
+
+
+def expire_course_archive(course_id):
+    # 资源变化后版本号改变，旧的压缩包不再使用，下次打包时删除
+    bump_list_version(_version_name(course_id))
+
+
+def _archive_dir(course_id):
+    return os.path.join(ARCHIVE_ROOT, str(course_id))
+
+
+def _archive_files(resources):
+    used = set()
+    for resource in resources:
+        if not resource.download:
+            continue
+        path = resource.download.path
+        if not os.path.isfile(path):
+            continue
+        ext = os.path.splitext(resource.download.name)[1]
+        name = resource.name if resource.name.endswith(ext) else resource.name + ext
+        yield unique_name(name, used), path
+
+
+def _save_while_streaming(chunks, archive_dir, archive_name):
+    """
+    把发送出去的数据块同时写入.part文件，完整发送后改名为正式的压缩包，中途断开则删除
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    part_path = os.path.join(archive_dir, '{}.part'.format(uuid.uuid4().hex))
+    completed = False
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(part_path, os.path.join(archive_dir, archive_name))
+        completed = True
+        for name in os.listdir(archive_dir):
+            if name != archive_name and name.endswith('.zip'):
+                os.remove(os.path.join(archive_dir, name))
+    finally:
+        if not completed and os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def course_archive_response(request, course):
+    resources = list(course.courseresource_set.order_by('id'))
+    if not resources:
+        raise Http404('该课程没有资源')
+    filename = '{}.zip'.format(course.name)
+    archive_dir = _archive_dir(course.id)
+    archive_name = '{}.zip'.format(get_list_version(_version_name(course.id)))
+    archive_path = os.path.join(archive_dir, archive_name)
+
+    if ARCHIVE_CACHE and os.path.isfile(archive_path):
+        return serve_file(request, archive_path, filename=filename, attachment=True,
+                          sendfile_root=ARCHIVE_ROOT, sendfile_url=ARCHIVE_SENDFILE_URL)
+
+    chunks = stream_zip(_archive_files(resources))
+    if ARCHIVE_CACHE:
+        chunks = _save_while_streaming(chunks, archive_dir, archive_name)
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = content_disposition(filename)
+    return response
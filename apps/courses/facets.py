@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.fragment import get_list_version, bump_list_version
+from utils.search import search, tokenize
+from .models import Course
+
+FACETS = ('degree', 'category', 'tag')
+# 筛选项的版本号只在课程增删、难度、类别、标签变化时改变，学习人数、点击数等变化不影响
+FACET_VERSION = 'course:facet'
+
+
+def expire_facets():
+    bump_list_version(FACET_VERSION)
+
+
+def _index_key():
+    # 版本号改变后索引随之重建
+    return 'facet:index:{}'.format(get_list_version(FACET_VERSION))
+
+
+def build_facet_index():
+    """
+    每个筛选项对应的课程id集合，课程表和标签关联表各查询一次
+    """
+    index = {facet: defaultdict(set) for facet in FACETS}
+    all_ids = set()
+    for course_id, degree, category_id in Course.objects.values_list('id', 'degree', 'category_id'):
+        all_ids.add(course_id)
+        index['degree'][degree].add(course_id)
+        if category_id:
+            index['category'][category_id].add(course_id)
+    for course_id, tag_id in Course.tags.through.objects.values_list('course_id', 'tag_id'):
+        index['tag'][tag_id].add(course_id)
+    index = {facet: dict(values) for facet, values in index.items()}
+    index['all'] = all_ids
+    return index
+
+
+def get_facet_index():
+    index = cache.get(_index_key())
+    if index is None:
+        index = build_facet_index()
+        cache.set(_index_key(), index, getattr(settings, 'FACET_CACHE_TIMEOUT', 300))
+    return index
+
+
+def normalize_filters(degree='', category='', tag=''):
+    # 非法的筛选值视为不筛选，类别和标签统一为整数id
+    filters = {'degree': degree if degree in dict(Course.DEGREE_CHOICES) else ''}
+    for facet, value in (('category', category), ('tag', tag)):
+        try:
+            filters[facet] = int(value)
+        except (TypeError, ValueError):
+            filters[facet] = ''
+    return filters
+
+
+def get_facet_counts(keywords='', **filters):
+    """
+    当前搜索和筛选条件下各难度、类别、标签的课程数。
+    每个维度的数量不受自身筛选条件限制，只按其它维度筛选，这样切换选项前就能看到对应的数量。
+    结果按规范化后的条件缓存，带搜索关键词时课程名称等修改最多在FACET_CACHE_TIMEOUT后反映出来
+    """
+    filters = normalize_filters(**filters)
+    terms = sorted(set(tokenize(keywords, query=True)))
+    signature = json.dumps([bool(keywords), terms, filters['degree'], filters['category'], filters['tag']])
+    cache_key = 'facet:counts:{}:{}'.format(get_list_version(FACET_VERSION), hashlib.md5(signature.encode('utf-8')).hexdigest())
+    counts = cache.get(cache_key)
+    if counts is not None:
+        return counts
+
+    index = get_facet_index()
+    base = set(search('course', keywords)) & index['all'] if keywords else index['all']
+    # 每个维度自身选中的课程集合
+    selected = {facet: index[facet].get(filters[facet], set()) for facet in FACETS if filters[facet] != ''}
+    counts = {}
+    for facet in FACETS:
+        ids = base
+        for other, other_ids in selected.items():
+            if other != facet:
+                ids = ids & other_ids
+        counts[facet] = {value: len(ids & value_ids) for value, value_ids in index[facet].items()}
+    cache.set(cache_key, counts, getattr(settings, 'FACET_CACHE_TIMEOUT', 300))
+    return counts
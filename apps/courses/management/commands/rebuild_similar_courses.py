@@ -0,0 +1,22 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.similar import update_similar_courses
+
+
+# 全量重新计算课程的相关推荐，学习人数变化后可定时执行
+class Command(BaseCommand):
+    help = '重新计算所有课程的相关课程'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批计算的课程数')
+
+    def handle(self, *args, **options):
+        course_ids = list(Course.objects.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for i in range(0, len(course_ids), batch_size):
+            update_similar_courses(course_ids[i:i + batch_size])
+        self.stdout.write('已计算 {} 门课程的相关课程'.format(len(course_ids)))
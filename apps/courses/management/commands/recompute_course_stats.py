@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from courses.stats import recompute_course_stats
+
+
+# 重新统计所有课程的章节数、视频数和视频总时长，修复数据偏差
+class Command(BaseCommand):
+    help = '重新统计课程的章节数、视频数和视频总时长'
+
+    def handle(self, *args, **options):
+        nums = recompute_course_stats()
+        self.stdout.write('已更新 {} 门课程'.format(nums))
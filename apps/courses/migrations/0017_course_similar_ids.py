@@ -0,0 +1,18 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_course_is_banner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='similar_ids',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='相关课程'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:43
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_content_nums(apps, schema_editor):
+    # 统计已有课程的章节数、视频数和视频总时长
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Video = apps.get_model('courses', 'Video')
+    lesson_nums = dict(Lesson.objects.values_list('course_id').annotate(nums=Count('id')).order_by())
+    video_stats = {row['lesson__course_id']: row for row in
+                   Video.objects.values('lesson__course_id').annotate(nums=Count('id'), times=Sum('learn_times')).order_by()}
+    for course_id in Course.objects.values_list('id', flat=True):
+        stats = video_stats.get(course_id, {})
+        Course.objects.filter(id=course_id).update(
+            lesson_nums=lesson_nums.get(course_id, 0), video_nums=stats.get('nums', 0), video_times=stats.get('times') or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_course_similar_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lesson_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='章节数'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='video_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='视频数'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='video_times',
+            field=models.IntegerField(default=0, editable=False, verbose_name='视频总时长(分钟数)'),
+        ),
+        migrations.RunPython(fill_content_nums, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_course_content_nums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='comment_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='评论数'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.0.8 on 2026-10-18 17:10
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_similar_ids(apps, schema_editor):
+    # 已有课程的相关课程在迁移时计算一次，之后由信号维护。
+    # 与courses.similar的算法相同：按共同标签数、学习人数降序取前k个，不足时用同类别学习人数最多的课程补齐
+    Course = apps.get_model('courses', 'Course')
+    nums = getattr(settings, 'SIMILAR_COURSE_NUMS', 3)
+    course_tags = defaultdict(set)
+    tag_courses = defaultdict(set)
+    for course_id, tag_id in Course.tags.through.objects.values_list('course_id', 'tag_id'):
+        course_tags[course_id].add(tag_id)
+        tag_courses[tag_id].add(course_id)
+    info = {pk: (category_id, students) for pk, category_id, students in Course.objects.values_list('id', 'category_id', 'students')}
+    by_category = defaultdict(list)
+    for pk, (category_id, students) in sorted(info.items(), key=lambda item: (-item[1][1], -item[0])):
+        if category_id:
+            by_category[category_id].append(pk)
+
+    for course_id, (category_id, students) in info.items():
+        overlap = Counter()
+        for tag_id in course_tags[course_id]:
+            overlap.update(tag_courses[tag_id])
+        overlap.pop(course_id, None)
+        ranked = sorted(overlap, key=lambda pk: (-overlap[pk], -info[pk][1], -pk))[:nums]
+        for pk in by_category.get(category_id, ()):
+            if len(ranked) >= nums:
+                break
+            if pk != course_id and pk not in ranked:
+                ranked.append(pk)
+        if ranked:
+            Course.objects.filter(id=course_id).update(similar_ids=','.join(str(pk) for pk in ranked))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_course_comment_nums'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_similar_ids, migrations.RunPython.noop),
+    ]
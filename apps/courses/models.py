@@ -3,6 +3,8 @@ from datetime import datetime
 
 from organization.models import CourseOrg, Teacher
 
+from utils.mixins import DerivedFieldsMixin
+
 
 # 课程类别
 class Category(models.Model):
@@ -29,7 +31,7 @@ class Tag(models.Model):
 
 
 # 课程信息表
-class Course(models.Model):
+class Course(DerivedFieldsMixin, models.Model):
     DEGREE_CHOICES = (
         ("cj", "初级"),
         ("zj", "中级"),
@@ -55,13 +57,27 @@ class Course(models.Model):
     notes = models.CharField(max_length=20, default='人生苦短，我用Python！', verbose_name='课程须知')
     tell_you = models.CharField(max_length=20, default='', verbose_name='讲师告诉你学到了什么')
     is_banner = models.BooleanField(default=False, verbose_name='是否轮播')
+    # 以下三个字段由章节、视频的信号和recompute_course_stats命令维护，避免每张课程卡片都去统计
+    lesson_nums = models.IntegerField(default=0, editable=False, verbose_name='章节数')
+    video_nums = models.IntegerField(default=0, editable=False, verbose_name='视频数')
+    video_times = models.IntegerField(default=0, editable=False, verbose_name='视频总时长(分钟数)')
+    # 评论数，由评论写入队列批量写库时和评论的信号维护
+    comment_nums = models.IntegerField(default=0, editable=False, verbose_name='评论数')
+    # 预先计算好的相关课程id，逗号分隔，由标签变化时的信号和rebuild_similar_courses命令维护
+    similar_ids = models.CharField(max_length=100, default='', blank=True, editable=False, verbose_name='相关课程')
 
     class Meta:
         verbose_name = verbose_name_plural = '课程'
 
     def get_lesson_nums(self):
-        # 获取课程章节数，如果章节模型中未定义关联名称（related_name）则直接使用字段名_set来获取
-        return self.lesson_set.all().count()
+        # 获取课程章节数，直接读取冗余字段，不再每次count
+        return self.lesson_nums
+
+    def get_similar_courses(self):
+        # 根据预先计算的相关课程id一次取出课程，并保持排序
+        ids = [int(i) for i in self.similar_ids.split(',') if i]
+        courses = Course.objects.in_bulk(ids)
+        return [courses[i] for i in ids if i in courses]
 
     def __str__(self):
         return self.name
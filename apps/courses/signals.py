@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Course, Category, Lesson, Video, CourseResource
+from .similar import update_similar_courses, courses_sharing_tags, courses_in_categories
+from .tree import expire_course_tree
+from .stats import recompute_course_stats
+from .archive import expire_course_archive
+from .facets import expire_facets
+from utils.fragment import bump_list_version
+
+
+# 课程标签变化时，重新计算该课程以及与它有共同标签的课程的相关推荐
+@receiver(m2m_changed, sender=Course.tags.through)
+def course_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # clear之后就拿不到原来的标签了，先记录下来
+        if reverse:
+            instance._old_similar_ids = set(instance.courses.values_list('id', flat=True))
+        else:
+            instance._old_similar_ids = courses_sharing_tags(instance.tags.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # 课程标签的筛选数量需要重新统计
+    bump_list_version('course')
+    expire_facets()
+
+    affected = getattr(instance, '_old_similar_ids', set())
+    if reverse:
+        # 从标签一侧修改，instance是标签，pk_set是课程id，拥有该标签的课程都会受影响
+        affected |= set(pk_set or ())
+        affected |= set(instance.courses.values_list('id', flat=True))
+    else:
+        # 只有拥有变化标签的课程与当前课程的共同标签数会变
+        affected |= {instance.pk}
+        affected |= courses_sharing_tags(pk_set or ())
+    if affected:
+        update_similar_courses(affected)
+
+
+# 修改课程时一次查出保存前的机构、类别和难度，本模块和organization.signals的post_save据此判断是否变化；
+# 指定了update_fields时只记录其中的字段
+@receiver(pre_save, sender=Course)
+def course_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._old_values = {}
+    if not instance.pk:
+        return
+    fields = [sender._meta.get_field(name) for name in ('course_org', 'category', 'degree')]
+    if update_fields is not None:
+        fields = [field for field in fields if {field.name, field.attname} & set(update_fields)]
+    if fields:
+        row = sender.objects.filter(pk=instance.pk).values_list(*[field.attname for field in fields]).first()
+        if row:
+            instance._old_values = dict(zip([field.attname for field in fields], row))
+
+
+# 新建课程或修改类别时，重新计算该课程和新旧类别中的课程，相关课程不足时要用同类别的课程补齐；
+# 新建课程或修改难度、类别时，筛选项的数量需要重新统计
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    old_values = getattr(instance, '_old_values', {})
+    old_category_id = old_values.get('category_id', instance.category_id)
+    old_degree = old_values.get('degree', instance.degree)
+    if created or (old_category_id, old_degree) != (instance.category_id, instance.degree):
+        expire_facets()
+    if created or old_category_id != instance.category_id:
+        update_similar_courses({instance.pk} | courses_in_categories([old_category_id, instance.category_id]))
+
+
+# 删除课程或类别(课程的类别置为空)时，筛选项的数量需要重新统计
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Category)
+def facet_removed(sender, instance, **kwargs):
+    expire_facets()
+
+
+# 章节或视频变化时清除课程内容树缓存，并重新统计课程的章节数、视频数和时长
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    expire_course_tree(instance.course_id)
+    bump_list_version('lesson:{}'.format(instance.course_id))
+    recompute_course_stats([instance.course_id])
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def video_changed(sender, instance, **kwargs):
+    course_id = Lesson.objects.filter(id=instance.lesson_id).values_list('course_id', flat=True).first()
+    if course_id:
+        expire_course_tree(course_id)
+        bump_list_version('lesson:{}'.format(course_id))
+        recompute_course_stats([course_id])
+
+
+# 课程资源变化时，课程资源打包的版本号改变
+@receiver(post_save, sender=CourseResource)
+@receiver(post_delete, sender=CourseResource)
+def resource_changed(sender, instance, **kwargs):
+    expire_course_archive(instance.course_id)
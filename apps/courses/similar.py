@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .models import Course
+
+
+def _similar_nums():
+    return getattr(settings, 'SIMILAR_COURSE_NUMS', 3)
+
+
+def compute_similar_ids(course_ids):
+    """
+    计算课程的相关课程：课程的标签看作稀疏向量，按共同标签数(向量点积)降序、学习人数降序取前k个，
+    不足k个时用同类别的课程补齐。返回 {课程id: [相关课程id]}
+    """
+    nums = _similar_nums()
+    through = Course.tags.through
+    course_ids = list(course_ids)
+
+    # 当前课程的标签
+    course_tags = defaultdict(set)
+    for course_id, tag_id in through.objects.filter(course_id__in=course_ids).values_list('course_id', 'tag_id'):
+        course_tags[course_id].add(tag_id)
+
+    # 标签 -> 课程 的倒排表，只取涉及到的标签
+    tag_courses = defaultdict(set)
+    all_tags = set().union(*course_tags.values()) if course_tags else set()
+    for course_id, tag_id in through.objects.filter(tag_id__in=all_tags).values_list('course_id', 'tag_id'):
+        tag_courses[tag_id].add(course_id)
+
+    overlaps = {}
+    candidates = set(course_ids)
+    for course_id in course_ids:
+        overlap = Counter()
+        for tag_id in course_tags[course_id]:
+            overlap.update(tag_courses[tag_id])
+        overlap.pop(course_id, None)
+        overlaps[course_id] = overlap
+        candidates.update(overlap)
+
+    info = {pk: (category_id, students) for pk, category_id, students in
+            Course.objects.filter(id__in=candidates).values_list('id', 'category_id', 'students')}
+
+    result = {}
+    short_categories = defaultdict(list)
+    for course_id in course_ids:
+        overlap = overlaps[course_id]
+        ranked = sorted(overlap, key=lambda pk: (-overlap[pk], -info.get(pk, (None, 0))[1], -pk))[:nums]
+        result[course_id] = ranked
+        category_id = info.get(course_id, (None, 0))[0]
+        if len(ranked) < nums and category_id:
+            short_categories[category_id].append(course_id)
+
+    # 同类别课程补齐，每个类别只查一次
+    for category_id, short_ids in short_categories.items():
+        fill = list(Course.objects.filter(category_id=category_id).order_by('-students', '-id').values_list('id', flat=True)[:nums + len(short_ids)])
+        for course_id in short_ids:
+            ranked = result[course_id]
+            for pk in fill:
+                if len(ranked) >= nums:
+                    break
+                if pk != course_id and pk not in ranked:
+                    ranked.append(pk)
+    return result
+
+
+def update_similar_courses(course_ids):
+    # 重新计算并保存相关课程，使用update避免触发课程的post_save信号
+    for course_id, similar in compute_similar_ids(course_ids).items():
+        Course.objects.filter(id=course_id).update(similar_ids=','.join(str(pk) for pk in similar))
+
+
+def courses_sharing_tags(tag_ids):
+    return set(Course.tags.through.objects.filter(tag_id__in=tag_ids).values_list('course_id', flat=True))
+
+
+def courses_in_categories(category_ids):
+    return set(Course.objects.filter(category_id__in=[pk for pk in category_ids if pk]).values_list('id', flat=True))
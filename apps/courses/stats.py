@@ -0,0 +1,42 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models import Count, Sum
+
+from utils.fragment import bump_object_version, bump_list_version
+from .models import Course, Lesson, Video
+
+
+def recompute_course_stats(course_ids=None):
+    """
+    重新统计课程的章节数、视频数和视频总时长，course_ids为空时统计全部课程。
+    章节和视频各一次GROUP BY查询，然后逐个课程UPDATE，有变化时让课程的缓存片段和接口的ETag失效，返回更新的课程数
+    """
+    lessons = Lesson.objects.all()
+    videos = Video.objects.all()
+    courses = Course.objects.all()
+    if course_ids is not None:
+        lessons = lessons.filter(course_id__in=course_ids)
+        videos = videos.filter(lesson__course_id__in=course_ids)
+        courses = courses.filter(id__in=course_ids)
+
+    lesson_nums = dict(lessons.values_list('course_id').annotate(nums=Count('id')).order_by())
+    video_stats = {row['lesson__course_id']: row for row in
+                   videos.values('lesson__course_id').annotate(nums=Count('id'), times=Sum('learn_times')).order_by()}
+
+    nums = 0
+    for course_id, old_lesson_nums, old_video_nums, old_video_times in courses.values_list('id', 'lesson_nums', 'video_nums', 'video_times'):
+        stats = video_stats.get(course_id, {})
+        values = {
+            'lesson_nums': lesson_nums.get(course_id, 0),
+            'video_nums': stats.get('nums', 0),
+            'video_times': stats.get('times') or 0,
+        }
+        # 没有变化的课程不需要写数据库
+        if (old_lesson_nums, old_video_nums, old_video_times) != (values['lesson_nums'], values['video_nums'], values['video_times']):
+            Course.objects.filter(id=course_id).update(**values)
+            bump_object_version(Course(id=course_id))
+            nums += 1
+    if nums:
+        bump_list_version('course')
+    return nums
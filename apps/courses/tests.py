@@ -1,3 +1,270 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory, override_settings
+
+from organization.models import CityDict, CourseOrg, Teacher
+from utils.counter import WriteBehindCounter
+from utils.pagination import KeysetPaginator
+from utils.sendfile import media_path, serve_file
+from users.models import UserProfile
+from utils.fragment import get_list_version, bump_list_version
+from operation.comments import add_comment
+from .facets import FACET_VERSION, get_facet_counts
+from .stats import recompute_course_stats
+from .models import Course, Category, CourseResource
+
+
+def create_course(**kwargs):
+    # 测试用的机构、讲师和课程
+    city = CityDict.objects.create(name='北京', desc='北京')
+    org = CourseOrg.objects.create(name='测试机构', desc='测试机构', city=city, address='北京', image='org/x.jpg')
+    teacher = Teacher.objects.create(org=org, name='讲师', work_company='公司', work_position='职位', points='特点', image='teacher/x.jpg')
+    defaults = dict(name='Django入门', desc='学习Django', detail='详情', degree='cj', course_org=org, teacher=teacher, image='courses/x.jpg')
+    defaults.update(kwargs)
+    return Course.objects.create(**defaults)
+
+
+class WriteBehindCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.counter = WriteBehindCounter(interval=3600)
+        # 避免incr时自动写回
+        cache.set(self.counter.flush_at_key, 1e12, None)
+
+    def test_flush_writes_buffered_increments(self):
+        self.counter.incr(self.course, 'click_nums')
+        self.counter.incr(self.course, 'click_nums')
+        self.assertEqual(self.counter.flush(), 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.click_nums, 2)
+        self.assertIsNone(cache.get(self.counter.buffer_key))
+
+    def test_failed_flush_keeps_increments(self):
+        self.counter.incr(self.course, 'click_nums')
+        with mock.patch.object(WriteBehindCounter, '_update', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.counter.flush()
+        # 写入失败的增量仍在缓冲中，下次写回
+        self.counter.flush()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.click_nums, 1)
+
+
+class SimilarCourseTest(TestCase):
+    def setUp(self):
+        self.python = Category.objects.create(name='Python')
+        self.java = Category.objects.create(name='Java')
+
+    def test_new_course_fills_same_category(self):
+        first = create_course(category=self.python)
+        second = create_course(category=self.python)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.similar_ids, str(second.pk))
+        self.assertEqual(second.similar_ids, str(first.pk))
+
+    def test_category_change_recomputes(self):
+        first = create_course(category=self.python)
+        second = create_course(category=self.python)
+        second.category = self.java
+        second.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.similar_ids, '')
+        self.assertEqual(second.similar_ids, '')
+
+    def test_migration_backfills_existing_courses(self):
+        first = create_course(category=self.python)
+        second = create_course(category=self.python)
+        Course.objects.update(similar_ids='')
+        migration = import_module('courses.migrations.0020_fill_similar_ids')
+        migration.fill_similar_ids(apps, None)
+        first.refresh_from_db()
+        self.assertEqual(first.similar_ids, str(second.pk))
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # 学习人数有重复，翻页时要按 (students, id) 区分
+        for students in (5, 5, 3, 3, 3, 1, 0):
+            create_course(students=students)
+        self.expected = list(Course.objects.order_by('-students', '-id'))
+
+    def get_page(self, params):
+        request = RequestFactory().get('/course/list/', params)
+        return KeysetPaginator(Course.objects.all(), 3, request=request, order_field='-students').page(params.get('page', 1))
+
+    def test_next_cursor_walks_every_row_once(self):
+        page = self.get_page({})
+        rows = list(page.object_list)
+        while page.has_next():
+            params = QueryDict(page.next_page_number().querystring).dict()
+            self.assertEqual(page.paginator.decode_cursor(params['cursor'])[0], 'next')
+            page = self.get_page(params)
+            rows += list(page.object_list)
+        self.assertEqual(rows, self.expected)
+
+    def test_prev_cursor_returns_previous_page(self):
+        paginator = KeysetPaginator(Course.objects.all(), 3, order_field='-students')
+        cursor = paginator.encode_cursor('prev', self.expected[6])
+        page = self.get_page({'page': 2, 'cursor': cursor})
+        self.assertEqual(list(page.object_list), self.expected[3:6])
+        self.assertTrue(page.has_next())
+
+    def test_bad_cursor_falls_back_to_offset(self):
+        page = self.get_page({'page': 2, 'cursor': 'not-a-cursor'})
+        self.assertEqual(list(page.object_list), self.expected[3:6])
+
+
+class DerivedFieldsTest(TestCase):
+    def test_full_save_keeps_derived_counters(self):
+        course = create_course()
+        Course.objects.filter(id=course.id).update(comment_nums=3, video_times=40)
+        # 后台编辑时拿到的是旧值
+        course.name = 'Django进阶'
+        course.save()
+        course.refresh_from_db()
+        self.assertEqual((course.name, course.comment_nums, course.video_times), ('Django进阶', 3, 40))
+
+    def test_org_full_save_keeps_stats(self):
+        org = create_course().course_org
+        org.refresh_from_db()
+        self.assertEqual(org.course_nums, 1)
+        type(org).objects.filter(id=org.id).update(course_nums=5)
+        org.save()
+        org.refresh_from_db()
+        self.assertEqual(org.course_nums, 5)
+
+
+class ServeFileTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.path = os.path.join(self.media_root, 'video.mp4')
+        with open(self.path, 'wb') as f:
+            f.write(b'0123456789')
+
+    def get(self, **headers):
+        response = serve_file(RequestFactory().get('/', **headers), self.path)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_range_returns_partial_content(self):
+        response, content = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, content, response['Content-Range']), (206, b'2345', 'bytes 2-5/10'))
+        response, content = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, content), (206, b'789'))
+        response, content = self.get(HTTP_RANGE='bytes=7-')
+        self.assertEqual((response.status_code, content), (206, b'789'))
+
+    def test_unsatisfiable_range(self):
+        response, content = self.get(HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+    def test_stale_if_range_returns_whole_file(self):
+        response, content = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+
+    def test_not_modified(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+    def test_media_path_only_accepts_own_files(self):
+        with override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/'):
+            self.assertEqual(media_path('/media/video.mp4'), self.path)
+            self.assertEqual(media_path('http://testserver/media/video.mp4', 'testserver'), self.path)
+            self.assertIsNone(media_path('http://cdn.example.com/media/video.mp4', 'testserver'))
+            self.assertIsNone(media_path('/media/../secret.txt'))
+            self.assertIsNone(media_path(''))
+
+    def test_resource_without_file_is_404(self):
+        resource = CourseResource.objects.create(course=create_course(), name='课件')
+        UserProfile.objects.create_user('admin', 'admin@a.com', '12345', is_staff=True)
+        self.client.login(username='admin', password='12345')
+        self.assertEqual(self.client.get('/course/resource/{}/download/'.format(resource.id)).status_code, 404)
+
+
+class CourseArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.archive_root)
+        os.makedirs(os.path.join(self.media_root, 'course', 'resource'))
+        with open(os.path.join(self.media_root, 'course', 'resource', 'a.txt'), 'wb') as f:
+            f.write(b'hello')
+        self.course = create_course()
+        CourseResource.objects.create(course=self.course, name='讲义', download='course/resource/a.txt')
+        CourseResource.objects.create(course=self.course, name='空资源')
+        UserProfile.objects.create_user('admin', 'admin@a.com', '12345', is_staff=True)
+        self.client.login(username='admin', password='12345')
+
+    def test_archive_is_saved_outside_media_root(self):
+        url = '/course/id/{}/resource/archive/'.format(self.course.id)
+        with override_settings(MEDIA_ROOT=self.media_root), mock.patch('courses.archive.ARCHIVE_ROOT', self.archive_root):
+            response = self.client.get(url)
+            b''.join(response.streaming_content)
+            self.assertEqual(len(os.listdir(os.path.join(self.archive_root, str(self.course.id)))), 1)
+            self.assertEqual(os.listdir(os.path.join(self.media_root, 'course')), ['resource'])
+            # 第二次直接发送保存好的压缩包
+            self.assertEqual(self.client.get(url)['Accept-Ranges'], 'bytes')
+
+
+class FacetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course(degree='cj')
+
+    def test_unrelated_changes_keep_facet_cache(self):
+        version = get_list_version(FACET_VERSION)
+        bump_list_version('course')
+        self.course.students = 10
+        self.course.save()
+        self.assertEqual(get_list_version(FACET_VERSION), version)
+
+    def test_degree_change_updates_counts(self):
+        self.assertEqual(get_facet_counts()['degree'], {'cj': 1})
+        self.course.degree = 'gj'
+        self.course.save()
+        self.assertEqual(get_facet_counts()['degree'], {'gj': 1})
+        category = Category.objects.create(name='Python')
+        self.course.category = category
+        self.course.save()
+        self.assertEqual(get_facet_counts()['category'], {category.id: 1})
+        category.delete()
+        self.assertEqual(get_facet_counts()['category'], {})
+
+
+class CourseApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+
+    def test_invalid_integer_filters_return_400(self):
+        for url in ('/api/courses/?org=abc', '/api/courses/?category=x', '/api/courses/?teacher=1.5'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+        response = self.client.get('/api/courses/?org={}'.format(self.course.course_org_id))
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['results'][0]['id'], self.course.id)
+
+    def test_etag_changes_with_comment_and_content_nums(self):
+        url = '/api/courses/?fields=id,comment_nums,video_times'
+        etag = self.client.get(url)['ETag']
+        user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+        add_comment(user, self.course.id, '好课')
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        etag = self.client.get(url)['ETag']
+        Course.objects.filter(id=self.course.id).update(video_times=99)
+        recompute_course_stats([self.course.id])
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
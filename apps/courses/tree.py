@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple, defaultdict
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Lesson, Video
+
+# 课程内容树的节点，使用namedtuple保证缓存后的数据不可修改
+LessonNode = namedtuple('LessonNode', ['id', 'name', 'videos'])
+VideoNode = namedtuple('VideoNode', ['id', 'name', 'url', 'learn_times', 'play_url'])
+
+
+def _cache_key(course_id):
+    return 'course:tree:{}'.format(course_id)
+
+
+def build_course_tree(course_id):
+    # 章节和视频各一次查询，播放地址提前反解好
+    videos = defaultdict(list)
+    for video in Video.objects.filter(lesson__course_id=course_id).order_by('id').values('id', 'name', 'url', 'learn_times', 'lesson_id'):
+        play_url = reverse('course:video_content', args=(course_id, video['id']))
+        videos[video['lesson_id']].append(
+            VideoNode(video['id'], video['name'], video['url'], video['learn_times'], play_url))
+    return tuple(
+        LessonNode(lesson['id'], lesson['name'], tuple(videos[lesson['id']]))
+        for lesson in Lesson.objects.filter(course_id=course_id).order_by('id').values('id', 'name')
+    )
+
+
+def get_course_tree(course_id):
+    # 课程的章节视频树，章节或视频变化时由信号清除缓存
+    tree = cache.get(_cache_key(course_id))
+    if tree is None:
+        tree = build_course_tree(course_id)
+        cache.set(_cache_key(course_id), tree, None)
+    return tree
+
+
+def find_video(tree, video_id):
+    for lesson in tree:
+        for video in lesson.videos:
+            if video.id == video_id:
+                return video
+    return None
+
+
+def expire_course_tree(course_id):
+    cache.delete(_cache_key(course_id))
@@ -1,6 +1,6 @@
 from django.urls import path, re_path
 
-from .views import CourseListView, CourseDetailView, CourseContentView, AddCommentView
+from .views import CourseListView, CourseDetailView, CourseContentView, AddCommentView, ResourceDownloadView, ResourceArchiveView, VideoStreamView
 
 app_name = 'courses'
 
@@ -11,4 +11,7 @@ urlpatterns = [
     re_path('id/(?P<course_id>\d+)/content/', CourseContentView.as_view(), name="course_content"),  # 课程内容
     path('add_comment/', AddCommentView.as_view(), name="add_comment"),  # 添加评论，参数放在post中的
     re_path('id/(?P<course_id>\d+)/video/(?P<video_id>\d+)/', CourseContentView.as_view(), name="video_content"),  # 课程视频播放
+    re_path('resource/(?P<resource_id>\d+)/download/', ResourceDownloadView.as_view(), name="resource_download"),  # 课程资源下载
+    re_path('id/(?P<course_id>\d+)/resource/archive/', ResourceArchiveView.as_view(), name="resource_archive"),  # 课程资源打包下载
+    re_path('video/(?P<video_id>\d+)/stream/', VideoStreamView.as_view(), name="video_stream"),  # 本站视频文件
 ]
@@ -1,15 +1,27 @@
-from django.shortcuts import render, HttpResponse
+import os
+
+from django.shortcuts import render, HttpResponse, redirect, get_object_or_404
+from django.http import Http404, HttpResponseForbidden
 from django.views.generic.base import View
 from django.utils import timezone
-from django.db.models.aggregates import Count
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
 
-from pure_pagination import Paginator, EmptyPage, PageNotAnInteger
+from pure_pagination import PageNotAnInteger
 
-from .models import Course, Tag, Video
-from operation.models import UserFavorite
-from operation.models import UserCourse, CourseComments
+from .models import Course, CourseResource, Video, Category, Tag
+from .tree import get_course_tree, find_video
+from .archive import course_archive_response
+from .facets import get_facet_counts, normalize_filters
+from operation.favorites import has_fav
+from operation.models import UserCourse
+from operation.comments import add_comment, get_pending_comments, newest_page_key, COMMENT_PAGE_TIMEOUT
+from operation.recommend import get_related_courses
+from operation.enrollment import enroll, is_enrolled
+from operation.trending import get_trending, record
+from utils.counter import click_counter
+from utils.search import search_queryset
+from utils.pagination import KeysetPaginator
+from utils.sendfile import serve_file, media_path
 
 
 class CourseListView(View):
@@ -17,38 +29,56 @@ class CourseListView(View):
         all_degree = list(map(lambda x: {'code': x[0], 'explain': x[1]}, Course.DEGREE_CHOICES))  # 显示难度等级
 
         all_course = Course.objects.all().order_by('-add_time')  # 默认按照时间排序
+        order_field = '-add_time'  # keyset分页使用的排序字段
 
         # 全局搜索---课程列表
         search_keywords = request.GET.get('keywords', '')
         if search_keywords:
-            # 在name字段进行操作, 做like语句的操作。i代表不区分大小写，or操作使用Q
-            all_course = all_course.filter(Q(name__icontains=search_keywords) | Q(desc__icontains=search_keywords) | Q(detail__icontains=search_keywords))
+            # 通过倒排索引搜索，结果按相关度排序，此时不能按字段做keyset分页
+            all_course = search_queryset(all_course, 'course', search_keywords)
+            order_field = None
 
         degree_code = request.GET.get('degree', '')
-        if degree_code:
-            all_course = all_course.filter(degree=degree_code)
+        category_id = request.GET.get('category', '')
+        tag_id = request.GET.get('tag', '')
+        filters = normalize_filters(degree=degree_code, category=category_id, tag=tag_id)
+        if filters['degree']:
+            all_course = all_course.filter(degree=filters['degree'])
+        if filters['category']:
+            all_course = all_course.filter(category_id=filters['category'])
+        if filters['tag']:
+            all_course = all_course.filter(tags__id=filters['tag'])
+
+        # 各筛选项对应的课程数量，一次统计并按筛选条件缓存
+        facet_counts = get_facet_counts(search_keywords, degree=degree_code, category=category_id, tag=tag_id)
+        for degree in all_degree:
+            degree['nums'] = facet_counts['degree'].get(degree['code'], 0)
+        all_category = [{'code': str(category.id), 'explain': category.name, 'nums': facet_counts['category'].get(category.id, 0)}
+                        for category in Category.objects.all()]
+        all_tag = [{'code': str(tag.id), 'explain': tag.name, 'nums': facet_counts['tag'].get(tag.id, 0)}
+                   for tag in Tag.objects.all()]
 
         sort = request.GET.get('sort', '')
         if sort:
             if sort == 'fav':
-                all_course = all_course.order_by('-fav_nums')  # 收藏人数排序
+                order_field = '-fav_nums'  # 收藏人数排序
             elif sort == 'click':
-                all_course = all_course.order_by('-click_nums')  # 点击数排序
+                order_field = '-click_nums'  # 点击数排序
             elif sort == 'students':
-                all_course = all_course.order_by('-students')  # 按学习人数排序
-
-        course_nums = all_course.count()  # 课程筛选后的数量
+                order_field = '-students'  # 按学习人数排序
 
         # 分页
         try:
             page = request.GET.get('page', 1)
         except PageNotAnInteger:
             page = 1
-        # 这里指从all_course中取8个出来，每页显示8个
-        p = Paginator(all_course, 8, request=request)
+        # 这里指从all_course中取8个出来，每页显示8个，翻页时按排序字段和id定位，不使用OFFSET
+        p = KeysetPaginator(all_course, 8, request=request, order_field=order_field)
         all_course_page = p.page(page)
 
-        hot_course = Course.objects.all().order_by('-students')[:3]  # 热门课程选择3个显示
+        course_nums = p.count  # 课程筛选后的数量，短时间缓存
+
+        hot_course = get_trending('course', 3)  # 热门课程选择3个显示，按随时间衰减的热度排行
 
         # 标记当前页，用于页面选中active
         current_access_url = 'course'
@@ -63,14 +93,12 @@ class CourseDetailView(View):
     def get(self, request, course_id):
         course = Course.objects.get(id=course_id)
 
-        # 增加课程点击数
-        course.click_nums += 1
-        course.save(update_fields=['click_nums'])
+        # 增加课程点击数，先记入计数器缓冲，定期批量写回数据库
+        click_counter.incr(course, 'click_nums')
+        record('course', course.id, 'click')
 
-        # 相关推荐
-        course_tags_ids = course.tags.values_list('id', flat=True)  # 获取当前课程所有标签的id
-        similar_course = Course.objects.filter(tags__in=course_tags_ids).exclude(id=course.id)  # 获取包含这些标签的课程并排除当前课程
-        similar_course = similar_course.annotate(same_tags=Count('tags')).order_by('-same_tags', '-students')[:3]  # 使用Count聚合函数来生成一个计算字段same_tags
+        # 相关推荐，按共同标签数预先计算好，这里只需按id取出
+        similar_course = course.get_similar_courses()
 
         # 学习该课程的用户，首先获取该课程在UserCourse对应关系，然后查询UserCourse表中的所有用户，使用distinct()去重
         user_courses = UserCourse.objects.filter(course=course)
@@ -84,10 +112,11 @@ class CourseDetailView(View):
 
         # 必须是用户已登录我们才需要判断。
         if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=course.id, fav_type=1):
+            # 收藏集合按用户缓存，页面上的判断都不查询数据库
+            if has_fav(request.user, course.id, 1):
                 # 该课程已收藏
                 has_fav_course = True
-            if UserFavorite.objects.filter(user=request.user, fav_id=course.course_org.id, fav_type=2):
+            if has_fav(request.user, course.course_org_id, 2):
                 # 该机构已收藏
                 has_fav_org = True
 
@@ -104,48 +133,40 @@ class CourseContentView(LoginRequiredMixin, View):
     def get(self, request, course_id, **kwargs):  # kwargs 专用于获取视频id的
         course = Course.objects.get(id=course_id)
 
-        # 查询用户和该课程是否关联，如果不存在，则创建关联
-        has_user_course = UserCourse.objects.filter(user=request.user, course=course)
-        if not has_user_course:
-            UserCourse.objects.create(user=request.user, course=course)
-            # 然后课程的学习人数+1
+        # 查询用户和该课程是否关联，如果不存在，则创建关联并且课程的学习人数+1
+        if enroll(request.user, course):
             course.students += 1
-            course.save(update_fields=['students'])
 
-        # 获取该课程的所有章节
-        all_lesson = course.lesson_set.all()
+        # 获取该课程的所有章节及视频，从缓存的课程内容树中读取
+        all_lesson = get_course_tree(course.id)
 
         # 获取该课程所有的下载资源
         all_resource = course.courseresource_set.all()
 
         # 获取该课程所有的评论
-        all_comment = course.coursecomments_set.all().order_by('-add_time')
-        comment_nums = all_comment.count()
+        all_comment = course.coursecomments_set.select_related('user')
+        # 还在写入队列中的评论
+        pending_comment = get_pending_comments(course.id)
+        comment_nums = course.comment_nums + len(pending_comment)
         # 评论分页
         try:
             page = request.GET.get('page', 1)
         except PageNotAnInteger:
             page = 1
-        # 每页显示5个
-        p = Paginator(all_comment, 5, request=request)
+        # 每页显示5个，按评论时间倒序，翻页时按时间和id定位，总数使用评论数字段，开启评论队列时第一页缓存
+        p = KeysetPaginator(all_comment, 5, request=request, order_field='-add_time', count=course.comment_nums,
+                            first_page_key=newest_page_key(course.id), first_page_timeout=COMMENT_PAGE_TIMEOUT)
         all_comment_page = p.page(page)
+        if all_comment_page.number == 1 and pending_comment:
+            all_comment_page.object_list = pending_comment + all_comment_page.object_list
 
         # tab选择标识，当进入分页的时候，说明已经进入评论页面，则在模板中需要active tab
         if request.GET.get('page'):
             tab_choose = 'comment'
 
         # 学习该课程的人还学过？
-        # 获取该课程的用户课程对应关系
-        all_user_course = UserCourse.objects.filter(course=course)
-        # 获取该课程的所有用户
-        all_user = [user_course.user for user_course in all_user_course]
-        # 获取这些用户在用户课程对应关系表中学习的所有课程，并排除当前课程
-        related_user_course = UserCourse.objects.filter(user__in=all_user).exclude(course=course)
-        # 获取所有关联课程的id
-        related_course_id = [user_course.course.id for user_course in related_user_course]
-        # 获取关联课程id在课程模型中的查询集，并且按照学习人数排序，取前5个
-        related_course = Course.objects.filter(id__in=related_course_id).order_by('-students')[:5]
-        # print(related_course)
+        # 从选课时增量维护的课程共同学习关系中取前5个
+        related_course = get_related_courses(course)
 
         # -------------------------
         # 处理访问video的页面
@@ -155,7 +176,9 @@ class CourseContentView(LoginRequiredMixin, View):
         video_id = kwargs.get('video_id')
         if video_id:
             show_video = True  # 显示课程视频播放，隐藏课程横幅
-            video = Video.objects.get(id=video_id)
+            video = find_video(all_lesson, int(video_id))
+            if video is None:
+                raise Http404('视频不存在')
         # -------------------------
 
         # 标记当前页，用于页面选中active
@@ -171,14 +194,51 @@ class AddCommentView(View):
             return HttpResponse('{"comment_status":"fail", "comment_msg":"用户未登录"}', content_type='application/json')
         course_id = request.POST.get('course_id', 0)
         comments = request.POST.get('comments', '')
-        if int(course_id) > 0 and comments.strip():
-            course_comment = CourseComments()
-
-            course_comment.course = Course.objects.get(id=course_id)
-            course_comment.comments = comments
-            course_comment.user = request.user
-            course_comment.save()
+        # 校验后放入评论队列，由队列批量写入数据库
+        if add_comment(request.user, course_id, comments):
             return HttpResponse('{"comment_status":"success", "comment_msg":"评论成功"}', content_type='application/json')
         else:
             return HttpResponse('{"comment_status":"fail", "comment_msg":"评论失败"}', content_type='application/json')
 
+
+# 课程资源下载，只有学习了该课程的用户可以下载
+class ResourceDownloadView(LoginRequiredMixin, View):
+    login_url = '/login/'
+    redirect_field_name = 'next'
+
+    def get(self, request, resource_id):
+        resource = get_object_or_404(CourseResource, id=resource_id)
+        if not (request.user.is_staff or is_enrolled(request.user.id, resource.course_id)):
+            return HttpResponseForbidden('请先开始学习该课程')
+        if not resource.download:
+            raise Http404('资源文件不存在')
+        return serve_file(request, resource.download.path, filename=os.path.basename(resource.download.name), attachment=True)
+
+
+# 课程全部资源打包下载，边压缩边发送
+class ResourceArchiveView(LoginRequiredMixin, View):
+    login_url = '/login/'
+    redirect_field_name = 'next'
+
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        if not (request.user.is_staff or is_enrolled(request.user.id, course.id)):
+            return HttpResponseForbidden('请先开始学习该课程')
+        return course_archive_response(request, course)
+
+
+# 本站存储的课程视频，支持Range请求拖动播放；外部视频地址直接跳转
+class VideoStreamView(LoginRequiredMixin, View):
+    login_url = '/login/'
+    redirect_field_name = 'next'
+
+    def get(self, request, video_id):
+        video = get_object_or_404(Video.objects.select_related('lesson'), id=video_id)
+        if not (request.user.is_staff or is_enrolled(request.user.id, video.lesson.course_id)):
+            return HttpResponseForbidden('请先开始学习该课程')
+        path = media_path(video.url, request.get_host())
+        if path is None:
+            if not video.url:
+                raise Http404('视频不存在')
+            return redirect(video.url)
+        return serve_file(request, path)
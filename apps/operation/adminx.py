@@ -3,14 +3,24 @@
 
 import xadmin
 
-from .models import UserAsk, UserCourse, UserMessage, CourseComments, UserFavorite
+from .models import UserAsk, UserAskStat, UserCourse, UserMessage, MessageReceipt, CourseComments, UserFavorite
 
 
 # 用户表单我要学习后台管理器
 class UserAskAdmin(object):
     list_display = ['name', 'mobile', 'course_name', 'add_time']
     search_fields = ['name', 'mobile', 'course_name']
-    list_filter = ['name', 'mobile', 'course_name', 'add_time']
+    # 姓名、手机号的筛选项需要对整张表去重，按课程的汇总见咨询统计
+    list_filter = ['add_time']
+    ordering = ['-add_time']
+
+
+# 课程咨询统计后台管理器，数据由咨询写入时维护，只读
+class UserAskStatAdmin(object):
+    list_display = ['course_name', 'ask_nums', 'last_ask_time']
+    search_fields = ['course_name']
+    ordering = ['-ask_nums']
+    readonly_fields = ['course_name', 'ask_nums', 'last_ask_time']
 
 
 # 用户课程学习后台管理器
@@ -27,6 +37,13 @@ class UserMessageAdmin(object):
     list_filter = ['user', 'message', 'has_read', 'add_time']
 
 
+# 全员消息单条已读记录后台管理器
+class MessageReceiptAdmin(object):
+    list_display = ['user', 'message', 'add_time']
+    search_fields = ['user__username']
+    list_filter = ['add_time']
+
+
 # 用户评论后台管理器
 class CourseCommentsAdmin(object):
     list_display = ['user', 'course', 'comments', 'add_time']
@@ -43,7 +60,9 @@ class UserFavoriteAdmin(object):
 
 # 将后台管理器与models进行关联注册。
 xadmin.site.register(UserAsk, UserAskAdmin)
+xadmin.site.register(UserAskStat, UserAskStatAdmin)
 xadmin.site.register(UserCourse, UserCourseAdmin)
 xadmin.site.register(UserMessage, UserMessageAdmin)
+xadmin.site.register(MessageReceipt, MessageReceiptAdmin)
 xadmin.site.register(CourseComments, CourseCommentsAdmin)
 xadmin.site.register(UserFavorite, UserFavoriteAdmin)
\ No newline at end of file
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class OperationConfig(AppConfig):
     name = 'operation'
-    verbose_name = '操作'
\ No newline at end of file
+    verbose_name = '操作'
+
+    def ready(self):
+        # 注册信号处理函数
+        import operation.signals
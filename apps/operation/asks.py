@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from utils.queue import CacheQueue
+from .models import UserAsk, UserAskStat
+
+# 同一手机号对同一课程的咨询，在该时间(秒)内只记录一次
+USER_ASK_DEDUP_WINDOW = getattr(settings, 'USER_ASK_DEDUP_WINDOW', 600)
+# 咨询先放入缓存队列再批量写库，队列中的咨询只在缓存里，需要配置开启了持久化的redis才能开启
+USER_ASK_QUEUE_ENABLED = getattr(settings, 'USER_ASK_QUEUE_ENABLED', False)
+
+
+def _dedup_key(mobile, course_name):
+    return 'ask:dedup:{}'.format(hashlib.md5('{}:{}'.format(mobile, course_name).encode('utf-8')).hexdigest())
+
+
+def change_ask_stats(course_counts):
+    # 各课程咨询数F()增量更新，还没有统计记录的课程新建一条，减少时不会小于0
+    now = datetime.now()
+    for course_name, nums in course_counts.items():
+        if nums < 0:
+            UserAskStat.objects.filter(course_name=course_name, ask_nums__gte=-nums).update(ask_nums=F('ask_nums') + nums)
+            continue
+        updated = UserAskStat.objects.filter(course_name=course_name).update(ask_nums=F('ask_nums') + nums, last_ask_time=now)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    UserAskStat.objects.create(course_name=course_name, ask_nums=nums, last_ask_time=now)
+            except IntegrityError:
+                # 并发写入时别的进程已经建好了
+                UserAskStat.objects.filter(course_name=course_name).update(ask_nums=F('ask_nums') + nums, last_ask_time=now)
+
+
+def persist_user_asks(items):
+    # 同一批中重复的咨询只保留第一条，其余一次bulk_create写入，并更新各课程咨询数
+    asks = OrderedDict()
+    for item in items:
+        asks.setdefault((item['mobile'], item['course_name']), item)
+    course_counts = {}
+    for mobile, course_name in asks:
+        course_counts[course_name] = course_counts.get(course_name, 0) + 1
+    with transaction.atomic():
+        UserAsk.objects.bulk_create([UserAsk(**item) for item in asks.values()])
+        change_ask_stats(course_counts)
+
+
+# 未开启时put直接调用persist_user_asks写入
+user_ask_queue = CacheQueue('user_asks', persist_user_asks,
+                            batch_size=getattr(settings, 'USER_ASK_BATCH_SIZE', 50),
+                            interval=getattr(settings, 'USER_ASK_FLUSH_INTERVAL', 5),
+                            enabled=USER_ASK_QUEUE_ENABLED)
+
+
+def add_user_ask(name, mobile, course_name):
+    """
+    表单校验通过后放入写入队列，由队列批量写入数据库并更新课程咨询数；未开启队列时在请求中直接写入。
+    返回False表示时间窗口内已经提交过相同的咨询，不再重复记录
+    """
+    # cache.add只有key不存在时才成功，多个进程同时提交也只有一个能放入队列
+    dedup_key = _dedup_key(mobile, course_name)
+    if not cache.add(dedup_key, 1, USER_ASK_DEDUP_WINDOW):
+        return False
+    try:
+        user_ask_queue.put({'name': name, 'mobile': mobile, 'course_name': course_name, 'add_time': datetime.now()})
+    except Exception:
+        # 写入失败时允许用户重新提交
+        cache.delete(dedup_key)
+        raise
+    return True
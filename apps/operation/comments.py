@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from courses.models import Course
+from users.models import UserProfile
+from utils.fragment import bump_object_version, bump_list_version
+from utils.queue import CacheQueue
+from .models import CourseComments
+
+COMMENT_MAX_LENGTH = 300
+# 评论先放入缓存队列再批量写库，队列中的评论只在缓存里，需要配置开启了持久化的redis才能开启
+COMMENT_QUEUE_ENABLED = getattr(settings, 'COMMENT_QUEUE_ENABLED', False)
+# 最新一页评论的缓存时间(秒)，写入评论时会删除，过期时间兜底其它进程没删到的情况
+COMMENT_PAGE_TIMEOUT = getattr(settings, 'COMMENT_PAGE_TIMEOUT', 60)
+
+
+def newest_page_key(course_id):
+    # 只有开启评论队列(即配置了共享的redis)时才缓存最新一页评论
+    if not COMMENT_QUEUE_ENABLED:
+        return None
+    return 'comments:newest:{}'.format(course_id)
+
+
+def change_comment_nums(course_deltas):
+    # 评论数按增量分组，F()批量更新；update()不会触发post_save，手动让课程的缓存片段和接口的ETag失效
+    by_delta = defaultdict(list)
+    for course_id, delta in course_deltas.items():
+        if delta:
+            by_delta[delta].append(course_id)
+    for delta, course_ids in by_delta.items():
+        Course.objects.filter(id__in=course_ids).update(comment_nums=F('comment_nums') + delta)
+        for course_id in course_ids:
+            bump_object_version(Course(id=course_id))
+    if by_delta:
+        bump_list_version('course')
+    if COMMENT_QUEUE_ENABLED:
+        cache.delete_many([newest_page_key(course_id) for course_id in course_deltas])
+
+
+def persist_comments(items):
+    # 丢弃课程或用户已不存在的评论，其余一次bulk_create写入，并更新各课程评论数
+    course_ids = set(Course.objects.filter(id__in={item['course_id'] for item in items}).values_list('id', flat=True))
+    user_ids = set(UserProfile.objects.filter(id__in={item['user_id'] for item in items}).values_list('id', flat=True))
+    comments = [CourseComments(**item) for item in items if item['course_id'] in course_ids and item['user_id'] in user_ids]
+    CourseComments.objects.bulk_create(comments)
+    change_comment_nums(Counter(comment.course_id for comment in comments))
+
+
+# 未开启时put直接调用persist_comments写入
+comment_queue = CacheQueue('comments', persist_comments,
+                           batch_size=getattr(settings, 'COMMENT_BATCH_SIZE', 50),
+                           interval=getattr(settings, 'COMMENT_FLUSH_INTERVAL', 5),
+                           enabled=COMMENT_QUEUE_ENABLED)
+
+
+def add_comment(user, course_id, comments):
+    """
+    校验后放入评论队列，由队列批量写入数据库并更新课程评论数；未开启队列时在请求中直接写入。返回是否成功
+    """
+    try:
+        course_id = int(course_id)
+    except (TypeError, ValueError):
+        return False
+    comments = comments.strip()
+    if course_id <= 0 or not comments or len(comments) > COMMENT_MAX_LENGTH:
+        return False
+    if not Course.objects.filter(id=course_id).exists():
+        return False
+    comment_queue.put({'course_id': course_id, 'user_id': user.id, 'comments': comments, 'add_time': datetime.now()})
+    return True
+
+
+def get_pending_comments(course_id):
+    # 队列中还没写入数据库的该课程评论，按时间倒序，用于评论第一页显示
+    items = [item for item in comment_queue.pending() if item['course_id'] == course_id]
+    if not items:
+        return []
+    users = UserProfile.objects.in_bulk({item['user_id'] for item in items})
+    return [CourseComments(course_id=item['course_id'], user=users[item['user_id']], comments=item['comments'], add_time=item['add_time'])
+            for item in reversed(items) if item['user_id'] in users]
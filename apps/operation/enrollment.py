@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from courses.models import Course
+from utils.fragment import bump_object_version, bump_list_version
+from .models import UserCourse
+from .trending import record
+
+
+def _cache_key(user_id):
+    return 'enroll:user:{}'.format(user_id)
+
+
+def get_enrolled_course_ids(user_id):
+    # 用户已学习的课程id，排好序的整数数组，缓存后判断是否已选课不需要查询数据库
+    course_ids = cache.get(_cache_key(user_id))
+    if course_ids is None:
+        course_ids = array('l', sorted(UserCourse.objects.filter(user_id=user_id).values_list('course_id', flat=True)))
+        cache.set(_cache_key(user_id), course_ids, None)
+    return course_ids
+
+
+def is_enrolled(user_id, course_id):
+    course_ids = get_enrolled_course_ids(user_id)
+    i = bisect_left(course_ids, course_id)
+    return i < len(course_ids) and course_ids[i] == course_id
+
+
+def expire_enrolled_course_ids(user_id):
+    cache.delete(_cache_key(user_id))
+    # 选课记录提交前其它请求可能把旧的列表又放回了缓存，提交后再删一次
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def change_course_students(course_id, delta):
+    # 课程学习人数用F()原子加减，由选课记录的信号调用，后台增删选课记录时也会更新
+    queryset = Course.objects.filter(id=course_id)
+    if delta < 0:
+        queryset = queryset.filter(students__gte=-delta)
+    queryset.update(students=F('students') + delta)
+    # update()不会触发post_save，这里手动让课程卡片、热门课程的缓存片段和接口的ETag失效
+    bump_object_version(Course(id=course_id))
+    bump_list_version('course')
+
+
+def enroll(user, course):
+    """
+    用户开始学习课程，已学习过时直接返回False。
+    依靠(user, course)唯一约束保证不会重复选课，课程和机构的学习人数、已选课程缓存由选课记录的信号维护
+    """
+    if is_enrolled(user.id, course.id):
+        return False
+    try:
+        with transaction.atomic():
+            UserCourse.objects.create(user=user, course=course)
+    except IntegrityError:
+        # 并发请求已经创建了选课记录
+        return False
+    record('course', course.id, 'enroll')
+    record('org', course.course_org_id, 'enroll')
+    return True
@@ -0,0 +1,255 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from array import array
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import F, Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+
+from utils.fragment import bump_object_version, bump_list_version
+from .models import UserFavorite
+from .trending import record
+
+# 收藏类型对应的模型和热度/片段缓存使用的名称
+FAV_TYPES = {
+    1: ('courses.Course', 'course'),
+    2: ('organization.CourseOrg', 'org'),
+    3: ('organization.Teacher', 'teacher'),
+}
+
+# 显示收藏列表时需要一起查询的外键
+FAV_SELECT_RELATED = {
+    1: ('course_org',),
+    2: ('city',),
+    3: ('org',),
+}
+
+
+def _cache_key(user_id):
+    return 'fav:user:{}'.format(user_id)
+
+
+def get_user_fav_ids(user_id):
+    # 用户收藏的数据id，按收藏类型分组，每组是按收藏先后排列的整数数组，一次查询后缓存
+    fav_ids = cache.get(_cache_key(user_id))
+    if fav_ids is None:
+        grouped = {}
+        for fav_type, fav_id in UserFavorite.objects.filter(user_id=user_id).order_by('id').values_list('fav_type', 'fav_id'):
+            grouped.setdefault(fav_type, []).append(fav_id)
+        fav_ids = {fav_type: array('l', ids) for fav_type, ids in grouped.items()}
+        # 收藏记录增删时由信号清除缓存，过期时间只是兜底
+        cache.set(_cache_key(user_id), fav_ids, getattr(settings, 'FAV_CACHE_TIMEOUT', 3600))
+    return fav_ids
+
+
+def _get_fav_sets(user):
+    # 同一个请求中request.user是同一个对象，收藏集合只从缓存读取一次，页面上的多次判断都是集合查找
+    fav_sets = getattr(user, '_fav_sets', None)
+    if fav_sets is None:
+        fav_sets = {fav_type: frozenset(ids) for fav_type, ids in get_user_fav_ids(user.id).items()}
+        user._fav_sets = fav_sets
+    return fav_sets
+
+
+def has_fav(user, fav_id, fav_type):
+    """
+    用户是否已收藏，未登录时返回False，fav_type: 1课程 2机构 3讲师
+    """
+    if not user.is_authenticated or not fav_id:
+        return False
+    return int(fav_id) in _get_fav_sets(user).get(int(fav_type), ())
+
+
+def expire_user_fav_ids(user_id, user=None):
+    # 传入user时同时清除本次请求中已读取的收藏集合
+    cache.delete(_cache_key(user_id))
+    if user is not None and hasattr(user, '_fav_sets'):
+        del user._fav_sets
+
+
+def _change_fav_nums(fav_type, fav_ids, delta):
+    """
+    被收藏数据的收藏数用F()原子加减，一条UPDATE，减少时不会小于0，返回更新的行数
+    """
+    label, name = FAV_TYPES[fav_type]
+    model = apps.get_model(label)
+    queryset = model.objects.filter(id__in=fav_ids)
+    if delta < 0:
+        queryset = queryset.filter(fav_nums__gte=-delta)
+    nums = queryset.update(fav_nums=F('fav_nums') + delta)
+    # update()不会触发post_save，手动让卡片和列表的缓存片段失效
+    for fav_id in fav_ids:
+        bump_object_version(model(id=fav_id))
+    bump_list_version(name)
+    return nums
+
+
+def _recount_fav_nums(fav_type, fav_ids):
+    # 按收藏记录重新统计这些数据的收藏数，一条带子查询的UPDATE，用于无法确定增量的并发情况
+    label, name = FAV_TYPES[fav_type]
+    model = apps.get_model(label)
+    nums = (UserFavorite.objects.filter(fav_type=fav_type, fav_id=OuterRef('pk')).order_by()
+            .values('fav_id').annotate(nums=Count('id')).values('nums'))
+    model.objects.filter(id__in=fav_ids).update(fav_nums=Coalesce(Subquery(nums, output_field=IntegerField()), 0))
+    for fav_id in fav_ids:
+        bump_object_version(model(id=fav_id))
+    bump_list_version(name)
+
+
+def _remove_fav(user, fav_id, fav_type):
+    # 删除收藏记录，按实际删除的条数减少收藏数，返回是否删除了
+    with transaction.atomic():
+        deleted = UserFavorite.objects.filter(user=user, fav_id=fav_id, fav_type=fav_type).delete()[1].get(UserFavorite._meta.label, 0)
+        if deleted:
+            _change_fav_nums(fav_type, [fav_id], -deleted)
+    return bool(deleted)
+
+
+def _add_fav(user, fav_id, fav_type):
+    # 添加收藏记录，返回True；被收藏的数据不存在时回滚并返回None；已经收藏过时抛出IntegrityError
+    try:
+        with transaction.atomic():
+            UserFavorite.objects.create(user=user, fav_id=fav_id, fav_type=fav_type)
+            if not _change_fav_nums(fav_type, [fav_id], 1):
+                raise LookupError
+    except LookupError:
+        return None
+    record(FAV_TYPES[fav_type][1], fav_id, 'fav')
+    return True
+
+
+def _normalize(fav_id, fav_type):
+    try:
+        fav_id, fav_type = int(fav_id), int(fav_type)
+    except (TypeError, ValueError):
+        return None, None
+    if fav_id <= 0 or fav_type not in FAV_TYPES:
+        return None, None
+    return fav_id, fav_type
+
+
+def toggle_fav(user, fav_id, fav_type):
+    """
+    收藏或取消收藏，返回True表示已收藏，False表示已取消，None表示参数错误或数据不存在。
+    先按用户收藏缓存判断方向，缓存与数据库不一致时以数据库为准：要删除的记录不存在就改为收藏，
+    收藏时违反(user, fav_id, fav_type)唯一约束说明已经收藏过，改为取消收藏
+    """
+    fav_id, fav_type = _normalize(fav_id, fav_type)
+    if fav_id is None:
+        return None
+    if has_fav(user, fav_id, fav_type) and _remove_fav(user, fav_id, fav_type):
+        result = False
+    else:
+        try:
+            result = _add_fav(user, fav_id, fav_type)
+        except IntegrityError:
+            _remove_fav(user, fav_id, fav_type)
+            result = False
+    expire_user_fav_ids(user.id, user)
+    return result
+
+
+def batch_toggle_fav(user, fav_ids, fav_type):
+    """
+    批量切换同一类型的收藏状态，返回{fav_id: True/False}，不存在的数据被忽略。
+    是否已收藏按数据库中的收藏记录判断，不使用可能过期的缓存。无论多少个，语句数都是固定的
+    """
+    try:
+        fav_type = int(fav_type)
+    except (TypeError, ValueError):
+        return None
+    if fav_type not in FAV_TYPES:
+        return None
+    fav_ids = {fav_id for fav_id, t in (_normalize(fav_id, fav_type) for fav_id in fav_ids) if fav_id}
+    if not fav_ids:
+        return {}
+
+    current = set(UserFavorite.objects.filter(user=user, fav_type=fav_type, fav_id__in=fav_ids).values_list('fav_id', flat=True))
+    remove_ids = sorted(fav_ids & current)
+    add_ids = sorted(fav_ids - current)
+    model = apps.get_model(FAV_TYPES[fav_type][0])
+    try:
+        with transaction.atomic():
+            if remove_ids:
+                deleted = UserFavorite.objects.filter(user=user, fav_type=fav_type, fav_id__in=remove_ids).delete()[1].get(UserFavorite._meta.label, 0)
+                if deleted == len(remove_ids):
+                    _change_fav_nums(fav_type, remove_ids, -1)
+                else:
+                    # 并发请求已经删除了其中一部分，不知道是哪些，按收藏记录重新统计
+                    _recount_fav_nums(fav_type, remove_ids)
+            if add_ids:
+                add_ids = sorted(model.objects.filter(id__in=add_ids).values_list('id', flat=True))
+                UserFavorite.objects.bulk_create([UserFavorite(user=user, fav_id=fav_id, fav_type=fav_type) for fav_id in add_ids])
+                if add_ids:
+                    _change_fav_nums(fav_type, add_ids, 1)
+    except IntegrityError:
+        # 与其它请求冲突时整体回滚，由前端重试
+        expire_user_fav_ids(user.id, user)
+        return None
+    for fav_id in add_ids:
+        record(FAV_TYPES[fav_type][1], fav_id, 'fav')
+    expire_user_fav_ids(user.id, user)
+    result = {fav_id: False for fav_id in remove_ids}
+    result.update({fav_id: True for fav_id in add_ids})
+    return result
+
+
+def recompute_fav_nums():
+    """
+    按收藏记录重新统计课程、机构、讲师的收藏数，修复后台直接修改收藏记录造成的偏差，返回更新的行数
+    """
+    counts = {}
+    for fav_type, fav_id, nums in UserFavorite.objects.values_list('fav_type', 'fav_id').annotate(nums=Count('id')).order_by():
+        counts.setdefault(fav_type, {})[fav_id] = nums
+    updated = 0
+    for fav_type, (label, name) in FAV_TYPES.items():
+        model = apps.get_model(label)
+        type_counts = counts.get(fav_type, {})
+        for pk, fav_nums in model.objects.values_list('id', 'fav_nums'):
+            if fav_nums != type_counts.get(pk, 0):
+                model.objects.filter(id=pk).update(fav_nums=type_counts.get(pk, 0))
+                bump_object_version(model(id=pk))
+                updated += 1
+        bump_list_version(name)
+    return updated
+
+
+class FavoriteResolver(object):
+    """
+    把用户的收藏记录解析成课程、机构、讲师对象：收藏的id来自用户收藏缓存，每种类型一次in_bulk。
+    同一个请求中共用一个实例(见for_request)，已加载的对象不会重复查询，
+    例如“我的收藏”页面和页头的收藏下拉框
+    """
+
+    def __init__(self, user):
+        self.user = user
+        # 每种类型已加载的对象，不存在的数据记为None
+        self._objects = {fav_type: {} for fav_type in FAV_TYPES}
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, '_fav_resolver', None)
+        if resolver is None or resolver.user.id != request.user.id:
+            resolver = request._fav_resolver = cls(request.user)
+        return resolver
+
+    def counts(self):
+        # 各类型的收藏数，直接由分组后的收藏id得到，不再单独COUNT
+        fav_ids = get_user_fav_ids(self.user.id)
+        return {fav_type: len(fav_ids.get(fav_type, ())) for fav_type in FAV_TYPES}
+
+    def resolve(self, fav_type, limit=None):
+        ids = list(get_user_fav_ids(self.user.id).get(fav_type, ()))[:limit]
+        loaded = self._objects[fav_type]
+        missing = [fav_id for fav_id in ids if fav_id not in loaded]
+        if missing:
+            label, name = FAV_TYPES[fav_type]
+            objects = apps.get_model(label).objects.select_related(*FAV_SELECT_RELATED[fav_type]).in_bulk(missing)
+            for fav_id in missing:
+                loaded[fav_id] = objects.get(fav_id)
+        # 被收藏的数据已删除时跳过
+        return [loaded[fav_id] for fav_id in ids if loaded[fav_id] is not None]
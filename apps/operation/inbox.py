@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import IntegrityError
+
+from users.models import UserProfile
+from utils.pagination import KeysetPaginator, MergedQuerySet
+from .models import UserMessage, MessageReceipt
+
+# 全员消息只存一条(user=0)，每个用户记录一个已读位置(read_message_id)和已读位置之后的单条已读记录
+BROADCAST_IDS_KEY = 'msg:broadcast:ids'
+
+
+def _unread_key(user_id):
+    return 'msg:unread:{}'.format(user_id)
+
+
+def _receipts_key(user_id):
+    return 'msg:receipts:{}'.format(user_id)
+
+
+def get_broadcast_ids():
+    # 全员消息(user=0)的id，排好序的整数数组，增删全员消息时清除缓存
+    ids = cache.get(BROADCAST_IDS_KEY)
+    if ids is None:
+        ids = array('l', UserMessage.objects.filter(user=0).order_by('id').values_list('id', flat=True))
+        cache.set(BROADCAST_IDS_KEY, ids, None)
+    return ids
+
+
+def get_receipt_ids(user):
+    # 已读位置之后单独阅读过的全员消息id，已读位置后移后旧记录通过bisect自然忽略
+    ids = cache.get(_receipts_key(user.id))
+    if ids is None:
+        ids = array('l', MessageReceipt.objects.filter(user_id=user.id, message_id__gt=user.read_message_id)
+                    .order_by('message_id').values_list('message_id', flat=True))
+        cache.set(_receipts_key(user.id), ids, None)
+    return ids
+
+
+def get_personal_unread_nums(user):
+    # 已读位置之后发给用户本人的未读消息数，写入和标记已读时维护，缓存丢失时COUNT一次
+    nums = cache.get(_unread_key(user.id))
+    if nums is None:
+        nums = UserMessage.objects.filter(user=user.id, id__gt=user.read_message_id, has_read=False).count()
+        cache.set(_unread_key(user.id), nums, None)
+    return nums
+
+
+def get_unread_nums(user):
+    """
+    未读消息数 = 本人的未读消息数 + 已读位置之后的全员消息数 - 其中单独读过的条数，缓存命中时不查询数据库
+    """
+    ids = get_broadcast_ids()
+    receipts = get_receipt_ids(user)
+    broadcast_nums = len(ids) - bisect_right(ids, user.read_message_id)
+    receipt_nums = len(receipts) - bisect_right(receipts, user.read_message_id)
+    return get_personal_unread_nums(user) + broadcast_nums - receipt_nums
+
+
+def incr_unread_nums(user_id, delta=1):
+    # 计数不在缓存中时不处理，下次读取时重新统计
+    try:
+        cache.incr(_unread_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def expire_unread_nums(user_id):
+    cache.delete(_unread_key(user_id))
+
+
+def expire_broadcast_ids():
+    cache.delete(BROADCAST_IDS_KEY)
+
+
+def is_read(user, message):
+    if message.id <= user.read_message_id:
+        return True
+    if message.user:
+        return message.has_read
+    receipts = get_receipt_ids(user)
+    i = bisect_right(receipts, message.id)
+    return i > 0 and receipts[i - 1] == message.id
+
+
+def mark_read(user, message_id):
+    """
+    标记一条消息已读：个人消息修改has_read，全员消息写一条已读记录。返回False表示消息不存在
+    """
+    try:
+        message_id = int(message_id)
+    except (TypeError, ValueError):
+        return False
+    message = UserMessage.objects.filter(id=message_id, user__in=[0, user.id]).first()
+    if message is None:
+        return False
+    if is_read(user, message):
+        return True
+    if message.user:
+        if UserMessage.objects.filter(id=message.id, has_read=False).update(has_read=True):
+            incr_unread_nums(user.id, -1)
+    else:
+        try:
+            MessageReceipt.objects.create(user_id=user.id, message_id=message.id)
+        except IntegrityError:
+            pass
+        cache.delete(_receipts_key(user.id))
+    return True
+
+
+def mark_all_read(user):
+    """
+    标记全部已读只把已读位置移到最新一条消息，一条UPDATE，没有未读消息时不写数据库
+    """
+    if not get_unread_nums(user):
+        return
+    latest_id = UserMessage.objects.filter(user__in=[0, user.id]).order_by('-id').values_list('id', flat=True).first()
+    if latest_id and latest_id > user.read_message_id:
+        UserProfile.objects.filter(id=user.id, read_message_id__lt=latest_id).update(read_message_id=latest_id)
+        user.read_message_id = latest_id
+    # 查询latest_id之后可能又收到了新消息，不能直接把计数置0，删除后下次读取时重新统计
+    expire_unread_nums(user.id)
+
+
+class InboxPaginator(KeysetPaginator):
+    """
+    收件箱：个人消息和全员消息两个按id倒序的流合并，按id做keyset翻页，总数由两部分相加
+    """
+
+    def __init__(self, user, per_page, request=None, **kwargs):
+        streams = MergedQuerySet([UserMessage.objects.filter(user=user.id), UserMessage.objects.filter(user=0)])
+        count = UserMessage.objects.filter(user=user.id).count() + len(get_broadcast_ids())
+        super(InboxPaginator, self).__init__(streams, per_page, request=request, order_field='-id', count=count, **kwargs)
+        self.user = user
+
+    def page(self, number):
+        page = super(InboxPaginator, self).page(number)
+        # 标记全部已读之前记下每条消息的已读状态，用于页面显示
+        for message in page.object_list:
+            message.is_read = is_read(self.user, message)
+        return page
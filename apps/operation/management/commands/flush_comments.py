@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from operation.comments import comment_queue
+
+
+# 将评论队列中的评论写入数据库，可以通过crontab定时执行；需要settings.COMMENT_QUEUE_ENABLED并配置redis缓存，未开启时没有要写入的评论
+class Command(BaseCommand):
+    help = '将评论队列中的评论批量写入数据库'
+
+    def handle(self, *args, **options):
+        nums = comment_queue.flush()
+        self.stdout.write('已写入 {} 条评论'.format(nums))
@@ -0,0 +1,17 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from utils.counter import click_counter
+
+
+# 将缓冲中的点击数写回数据库，可以通过crontab定时执行。
+# 需要配置memcached/redis等多进程共享的缓存，本地内存缓存时命令所在的进程看不到web进程的缓冲，
+# 这时由web进程在请求中按COUNTER_FLUSH_INTERVAL定期写回
+class Command(BaseCommand):
+    help = '将缓冲中的点击数等计数批量写回数据库'
+
+    def handle(self, *args, **options):
+        nums = click_counter.flush()
+        self.stdout.write('已写回 {} 条计数记录'.format(nums))
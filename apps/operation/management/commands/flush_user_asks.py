@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from operation.asks import user_ask_queue
+
+
+# 将咨询队列中的咨询写入数据库，可以通过crontab定时执行；需要settings.USER_ASK_QUEUE_ENABLED并配置redis缓存，未开启时没有要写入的咨询
+class Command(BaseCommand):
+    help = '将用户咨询队列中的咨询批量写入数据库'
+
+    def handle(self, *args, **options):
+        nums = user_ask_queue.flush()
+        self.stdout.write('已写入 {} 条咨询'.format(nums))
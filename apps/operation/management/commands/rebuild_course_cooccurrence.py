@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from operation.recommend import rebuild_co_occurrence
+
+
+# 全量重建课程共同学习关系，首次上线或数据修复时执行，平时由选课信号增量维护
+class Command(BaseCommand):
+    help = '根据用户课程重新计算“学习该课程的同学还学过”'
+
+    def handle(self, *args, **options):
+        nums = rebuild_co_occurrence()
+        self.stdout.write('已生成 {} 条课程共同学习记录'.format(nums))
@@ -0,0 +1,23 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.search import SEARCH_DOCS, rebuild_index
+
+
+# 全量重建搜索索引，初次上线或索引损坏时执行
+class Command(BaseCommand):
+    help = '重建课程、机构、讲师的搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('doc_types', nargs='*', help='需要重建的数据类型(course/org/teacher)，默认全部')
+
+    def handle(self, *args, **options):
+        doc_types = options['doc_types'] or list(SEARCH_DOCS)
+        for doc_type in doc_types:
+            if doc_type not in SEARCH_DOCS:
+                raise CommandError('未知的数据类型：{}'.format(doc_type))
+        for doc_type in doc_types:
+            nums = rebuild_index(doc_type)
+            self.stdout.write('{} 已索引 {} 条'.format(doc_type, nums))
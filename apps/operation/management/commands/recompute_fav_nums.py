@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from operation.favorites import recompute_fav_nums
+
+
+# 按收藏记录重新统计课程、机构、讲师的收藏数，后台直接修改收藏记录后执行
+class Command(BaseCommand):
+    help = '重新统计课程、机构、讲师的收藏数'
+
+    def handle(self, *args, **options):
+        nums = recompute_fav_nums()
+        self.stdout.write('已更新 {} 条收藏数'.format(nums))
@@ -0,0 +1,26 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from operation.trending import refresh, seed
+from utils.queue import is_shared_cache
+
+
+# 把累积的点击、收藏、学习合并到热度排行，需要通过crontab定时执行，例如每10分钟一次。
+# 需要配置memcached/redis等多进程共享的缓存，本地内存缓存时命令所在的进程看不到web进程的缓冲和排行榜
+class Command(BaseCommand):
+    help = '衰减并刷新热门课程、机构、讲师排行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='首次上线时按累计的学习人数、收藏数、点击数初始化热度')
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError('热度排行需要配置memcached/redis等多进程共享的缓存')
+        if options['seed']:
+            nums = seed()
+            self.stdout.write('已初始化 {} 条热度记录'.format(nums))
+        else:
+            nums = refresh()
+            self.stdout.write('已合并 {} 条热度增量'.format(nums))
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('course', '课程'), ('org', '课程机构'), ('teacher', '讲师')], max_length=10, verbose_name='数据类型')),
+                ('doc_id', models.IntegerField(verbose_name='数据id')),
+                ('term', models.CharField(max_length=50, verbose_name='词条')),
+                ('weight', models.IntegerField(default=1, verbose_name='权重')),
+            ],
+            options={
+                'verbose_name': '搜索索引',
+                'verbose_name_plural': '搜索索引',
+                'unique_together': {('doc_type', 'doc_id', 'term')},
+                'index_together': {('doc_type', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_course_similar_ids'),
+        ('operation', '0002_searchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseCoOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nums', models.IntegerField(default=0, verbose_name='共同学习人数')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_occurrences', to='courses.Course', verbose_name='课程')),
+                ('related_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.Course', verbose_name='相关课程')),
+            ],
+            options={
+                'verbose_name': '课程共同学习',
+                'verbose_name_plural': '课程共同学习',
+                'unique_together': {('course', 'related_course')},
+                'index_together': {('course', 'nums')},
+            },
+        ),
+    ]
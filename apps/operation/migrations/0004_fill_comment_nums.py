@@ -0,0 +1,25 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:46
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def fill_comment_nums(apps, schema_editor):
+    # 统计已有课程的评论数
+    Course = apps.get_model('courses', 'Course')
+    CourseComments = apps.get_model('operation', 'CourseComments')
+    comment_nums = CourseComments.objects.values_list('course_id').annotate(nums=Count('id')).order_by()
+    for course_id, nums in comment_nums:
+        Course.objects.filter(id=course_id).update(comment_nums=nums)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_course_comment_nums'),
+        ('operation', '0003_coursecooccurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_comment_nums, migrations.RunPython.noop),
+    ]
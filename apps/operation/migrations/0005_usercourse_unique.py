@@ -0,0 +1,30 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:44
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_user_courses(apps, schema_editor):
+    # 加唯一约束前删除重复的选课记录，保留最早的一条
+    UserCourse = apps.get_model('operation', 'UserCourse')
+    duplicates = UserCourse.objects.values('user_id', 'course_id').annotate(nums=Count('id'), first_id=Min('id')).filter(nums__gt=1).order_by()
+    for row in duplicates:
+        UserCourse.objects.filter(user_id=row['user_id'], course_id=row['course_id']).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_course_comment_nums'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('operation', '0004_fill_comment_nums'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_user_courses, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='usercourse',
+            unique_together={('user', 'course')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0005_usercourse_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('course', '课程'), ('org', '课程机构'), ('teacher', '讲师')], max_length=10, verbose_name='数据类型')),
+                ('doc_id', models.IntegerField(verbose_name='数据id')),
+                ('score', models.FloatField(default=0, verbose_name='热度')),
+            ],
+            options={
+                'verbose_name': '热度排行',
+                'verbose_name_plural': '热度排行',
+                'unique_together': {('doc_type', 'doc_id')},
+                'index_together': {('doc_type', 'score')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:56
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    # 加唯一约束前删除重复的收藏记录，保留最早的一条
+    UserFavorite = apps.get_model('operation', 'UserFavorite')
+    duplicates = UserFavorite.objects.values('user_id', 'fav_id', 'fav_type').annotate(nums=Count('id'), first_id=Min('id')).filter(nums__gt=1).order_by()
+    for row in duplicates:
+        UserFavorite.objects.filter(user_id=row['user_id'], fav_id=row['fav_id'], fav_type=row['fav_type']).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('operation', '0006_trendingscore'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='userfavorite',
+            unique_together={('user', 'fav_id', 'fav_type')},
+        ),
+    ]
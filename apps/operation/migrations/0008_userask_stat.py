@@ -0,0 +1,43 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:57
+
+import datetime
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_userask_stat(apps, schema_editor):
+    # 统计已有咨询的各课程咨询数
+    UserAsk = apps.get_model('operation', 'UserAsk')
+    UserAskStat = apps.get_model('operation', 'UserAskStat')
+    stats = UserAsk.objects.values_list('course_name').annotate(nums=Count('id'), last=Max('add_time')).order_by()
+    UserAskStat.objects.bulk_create([UserAskStat(course_name=course_name, ask_nums=nums, last_ask_time=last)
+                                     for course_name, nums, last in stats], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0007_userfavorite_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAskStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_name', models.CharField(max_length=50, unique=True, verbose_name='课程名')),
+                ('ask_nums', models.IntegerField(default=0, verbose_name='咨询数')),
+                ('last_ask_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='最近咨询时间')),
+            ],
+            options={
+                'verbose_name': '课程咨询统计',
+                'verbose_name_plural': '课程咨询统计',
+            },
+        ),
+        migrations.AlterField(
+            model_name='userask',
+            name='add_time',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name='添加时间'),
+        ),
+        migrations.RunPython(fill_userask_stat, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.0.8 on 2026-10-18 12:00
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('operation', '0008_userask_stat'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='usermessage',
+            index_together={('user', 'id')},
+        ),
+        migrations.CreateModel(
+            name='MessageReceipt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='添加时间')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='operation.UserMessage', verbose_name='消息')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '消息已读记录',
+                'verbose_name_plural': '消息已读记录',
+                'unique_together': {('user', 'message')},
+            },
+        ),
+    ]
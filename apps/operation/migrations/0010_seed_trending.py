@@ -0,0 +1,42 @@
+# Generated by Django 2.0.8 on 2026-10-18 17:40
+
+from django.conf import settings
+from django.db import migrations
+
+TRENDING_DOCS = {
+    'course': ('courses', 'Course'),
+    'org': ('organization', 'CourseOrg'),
+    'teacher': ('organization', 'Teacher'),
+}
+
+
+def seed_trending(apps, schema_editor):
+    # 按累计的学习人数、收藏数、点击数初始化热度，否则在第一次刷新前热门排行都是空的
+    TrendingScore = apps.get_model('operation', 'TrendingScore')
+    if TrendingScore.objects.exists():
+        return
+    weights = getattr(settings, 'TRENDING_WEIGHTS', {'click': 1, 'fav': 5, 'enroll': 10})
+    scores = []
+    for doc_type, (app_label, model_name) in TRENDING_DOCS.items():
+        model = apps.get_model(app_label, model_name)
+        names = {field.name for field in model._meta.get_fields()}
+        fields = [field for field in ('students', 'fav_nums', 'click_nums') if field in names]
+        for row in model.objects.values('id', *fields):
+            score = (row.get('students', 0) * weights.get('enroll', 0) + row.get('fav_nums', 0) * weights.get('fav', 0) +
+                     row.get('click_nums', 0) * weights.get('click', 0))
+            if score >= 0.01:
+                scores.append(TrendingScore(doc_type=doc_type, doc_id=row['id'], score=score))
+    TrendingScore.objects.bulk_create(scores, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_fill_similar_ids'),
+        ('organization', '0009_org_stats'),
+        ('operation', '0009_messagereceipt'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_trending, migrations.RunPython.noop),
+    ]
@@ -11,7 +11,7 @@ class UserAsk(models.Model):
     name = models.CharField(max_length=20, verbose_name='姓名')
     mobile = models.CharField(max_length=11, verbose_name='手机号')
     course_name = models.CharField(max_length=50, verbose_name='课程名')
-    add_time = models.DateTimeField(default=datetime.now, verbose_name='添加时间')
+    add_time = models.DateTimeField(default=datetime.now, db_index=True, verbose_name='添加时间')
 
     class Meta:
         verbose_name_plural = verbose_name = '用户咨询'
@@ -20,6 +20,19 @@ class UserAsk(models.Model):
         return self.name + ' 咨询 ' + self.course_name
 
 
+# 按课程名汇总的咨询数，写入咨询时增量更新，后台查看统计时不用扫描咨询表
+class UserAskStat(models.Model):
+    course_name = models.CharField(max_length=50, unique=True, verbose_name='课程名')
+    ask_nums = models.IntegerField(default=0, verbose_name='咨询数')
+    last_ask_time = models.DateTimeField(default=datetime.now, verbose_name='最近咨询时间')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '课程咨询统计'
+
+    def __str__(self):
+        return '{} {}'.format(self.course_name, self.ask_nums)
+
+
 # 用户对于课程评论
 class CourseComments(models.Model):
     # 会涉及两个外键: 1. 用户， 2. 课程。import进来
@@ -51,6 +64,8 @@ class UserFavorite(models.Model):
 
     class Meta:
         verbose_name_plural = verbose_name = '用户收藏'
+        # 同一个用户对同一数据只能收藏一次
+        unique_together = (('user', 'fav_id', 'fav_type'),)
 
     def __str__(self):
         return self.user.username + ' 收藏'
@@ -68,11 +83,27 @@ class UserMessage(models.Model):
 
     class Meta:
         verbose_name_plural = verbose_name = '用户消息'
+        # 收件箱分别按(用户, id)倒序读取个人消息和全员消息(user=0)再合并
+        index_together = (('user', 'id'),)
 
     def __str__(self):
         return self.message
 
 
+# 全员消息的单条已读记录，只记录已读位置之后单独阅读过的消息，标记全部已读只需移动已读位置
+class MessageReceipt(models.Model):
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, verbose_name='用户')
+    message = models.ForeignKey(UserMessage, on_delete=models.CASCADE, verbose_name='消息')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name='添加时间')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '消息已读记录'
+        unique_together = (('user', 'message'),)
+
+    def __str__(self):
+        return '{} {}'.format(self.user_id, self.message_id)
+
+
 # 用户学习课程
 class UserCourse(models.Model):
     # 会涉及两个外键: 1. 用户， 2. 课程。import进来
@@ -83,6 +114,59 @@ class UserCourse(models.Model):
     class Meta:
         verbose_name = u"用户课程"
         verbose_name_plural = verbose_name
+        # 同一个用户同一门课程只能有一条记录，防止并发时重复选课
+        unique_together = (('user', 'course'),)
+
+    def __str__(self):
+        return self.user.username + ' 学习 ' + self.course.name
+
+
+# 全站搜索倒排索引，每条记录表示某个词条出现在某个课程/机构/讲师中
+class SearchIndex(models.Model):
+    DOC_CHOICES = (
+        ("course", "课程"),
+        ("org", "课程机构"),
+        ("teacher", "讲师")
+    )
+    doc_type = models.CharField(max_length=10, choices=DOC_CHOICES, verbose_name='数据类型')
+    doc_id = models.IntegerField(verbose_name='数据id')
+    term = models.CharField(max_length=50, verbose_name='词条')
+    weight = models.IntegerField(default=1, verbose_name='权重')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '搜索索引'
+        unique_together = (('doc_type', 'doc_id', 'term'),)
+        index_together = (('doc_type', 'term'),)
+
+    def __str__(self):
+        return '{}:{} {}'.format(self.doc_type, self.doc_id, self.term)
+
+
+# 课程共同学习关系，nums表示同时学习了course和related_course的用户数
+class CourseCoOccurrence(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='co_occurrences', verbose_name='课程')
+    related_course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+', verbose_name='相关课程')
+    nums = models.IntegerField(default=0, verbose_name='共同学习人数')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '课程共同学习'
+        unique_together = (('course', 'related_course'),)
+        index_together = (('course', 'nums'),)
+
+    def __str__(self):
+        return '{} - {}'.format(self.course_id, self.related_course_id)
+
+
+# 课程、机构、讲师的热度分数，由点击、学习、收藏按权重累加，并随时间按半衰期衰减
+class TrendingScore(models.Model):
+    doc_type = models.CharField(max_length=10, choices=SearchIndex.DOC_CHOICES, verbose_name='数据类型')
+    doc_id = models.IntegerField(verbose_name='数据id')
+    score = models.FloatField(default=0, verbose_name='热度')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '热度排行'
+        unique_together = (('doc_type', 'doc_id'),)
+        index_together = (('doc_type', 'score'),)
 
     def __str__(self):
-        return self.user.username + ' 学习 ' + self.course.name
\ No newline at end of file
+        return '{}:{} {}'.format(self.doc_type, self.doc_id, self.score)
@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from courses.models import Course
+from .models import UserCourse, CourseCoOccurrence
+
+
+def _cache_key(course_id):
+    return 'recommend:course:{}'.format(course_id)
+
+
+def _related_nums():
+    return getattr(settings, 'RELATED_COURSE_NUMS', 5)
+
+
+def get_related_courses(course):
+    # 学习该课程的人还学过的课程，id列表缓存起来，命中缓存时只需一次按主键取课程
+    ids = cache.get(_cache_key(course.id))
+    if ids is None:
+        ids = list(CourseCoOccurrence.objects.filter(course=course, nums__gt=0).order_by(
+            '-nums', '-related_course__students').values_list('related_course_id', flat=True)[:_related_nums()])
+        cache.set(_cache_key(course.id), ids, None)
+    courses = Course.objects.in_bulk(ids)
+    return [courses[i] for i in ids if i in courses]
+
+
+def _change_pairs(course_id, other_ids, delta):
+    """
+    课程与其他课程的共同学习数同时加减，两个方向各一条UPDATE。
+    增加时先查出已有的记录，只UPDATE这些，其余的再补建；先UPDATE后检查的话，
+    两条语句之间并发请求刚建好的记录会被当成已加过，这次的增量就丢了
+    """
+    forward = CourseCoOccurrence.objects.filter(course_id=course_id, related_course_id__in=other_ids)
+    backward = CourseCoOccurrence.objects.filter(course_id__in=other_ids, related_course_id=course_id)
+    if delta < 0:
+        forward.update(nums=F('nums') + delta)
+        backward.update(nums=F('nums') + delta)
+    else:
+        forward_ids = set(forward.values_list('related_course_id', flat=True))
+        backward_ids = set(backward.values_list('course_id', flat=True))
+        if forward_ids:
+            forward.filter(related_course_id__in=forward_ids).update(nums=F('nums') + delta)
+        if backward_ids:
+            backward.filter(course_id__in=backward_ids).update(nums=F('nums') + delta)
+        missing = [(course_id, pk) for pk in other_ids if pk not in forward_ids]
+        missing += [(pk, course_id) for pk in other_ids if pk not in backward_ids]
+        for a, b in missing:
+            try:
+                with transaction.atomic():
+                    CourseCoOccurrence.objects.create(course_id=a, related_course_id=b, nums=delta)
+            except IntegrityError:
+                # 并发时其他请求已经建好了记录
+                CourseCoOccurrence.objects.filter(course_id=a, related_course_id=b).update(nums=F('nums') + delta)
+    cache.delete_many([_cache_key(pk) for pk in [course_id] + list(other_ids)])
+
+
+def add_enrollment(user_course):
+    other_ids = list(UserCourse.objects.filter(user_id=user_course.user_id).exclude(
+        course_id=user_course.course_id).values_list('course_id', flat=True).distinct())
+    if other_ids:
+        _change_pairs(user_course.course_id, other_ids, 1)
+
+
+def remove_enrollment(user_course):
+    other_ids = list(UserCourse.objects.filter(user_id=user_course.user_id).exclude(
+        course_id=user_course.course_id).values_list('course_id', flat=True).distinct())
+    if other_ids:
+        _change_pairs(user_course.course_id, other_ids, -1)
+
+
+def rebuild_co_occurrence(batch_size=1000):
+    # 从用户课程表全量计算课程共同学习矩阵（稀疏存储，只保存大于0的项）
+    user_courses = defaultdict(set)
+    for user_id, course_id in UserCourse.objects.values_list('user_id', 'course_id').iterator():
+        user_courses[user_id].add(course_id)
+
+    matrix = Counter()
+    for course_ids in user_courses.values():
+        for a in course_ids:
+            for b in course_ids:
+                if a != b:
+                    matrix[(a, b)] += 1
+
+    with transaction.atomic():
+        CourseCoOccurrence.objects.all().delete()
+        CourseCoOccurrence.objects.bulk_create(
+            [CourseCoOccurrence(course_id=a, related_course_id=b, nums=nums) for (a, b), nums in matrix.items()],
+            batch_size=batch_size)
+    cache.delete_many([_cache_key(pk) for pk in Course.objects.values_list('id', flat=True)])
+    return len(matrix)
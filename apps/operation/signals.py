@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from courses.models import Course
+from organization.models import CourseOrg, Teacher
+from utils.search import index_document, remove_document, get_indexed_fields
+from utils.fragment import bump_object_version, bump_list_version
+from .models import UserCourse, CourseComments, UserFavorite, UserAsk, UserMessage
+from .comments import change_comment_nums
+from .asks import change_ask_stats
+from .inbox import incr_unread_nums, expire_unread_nums, expire_broadcast_ids
+from .enrollment import expire_enrolled_course_ids, change_course_students
+from .favorites import expire_user_fav_ids
+from .recommend import add_enrollment, remove_enrollment
+
+
+def _need_reindex(doc_type, update_fields):
+    # 只更新了点击数、收藏数等非索引字段时不需要重建索引
+    if update_fields is None:
+        return True
+    return bool(set(update_fields) & set(get_indexed_fields(doc_type)))
+
+
+# 课程、机构、讲师保存或删除时增量更新搜索索引
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, update_fields=None, **kwargs):
+    if _need_reindex('course', update_fields):
+        index_document('course', instance)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    remove_document('course', instance.pk)
+
+
+@receiver(post_save, sender=CourseOrg)
+def index_org(sender, instance, update_fields=None, **kwargs):
+    if _need_reindex('org', update_fields):
+        index_document('org', instance)
+        # 讲师的索引中包含了机构名称
+        for teacher in instance.teachers.all():
+            teacher.org = instance
+            index_document('teacher', teacher)
+
+
+@receiver(post_delete, sender=CourseOrg)
+def unindex_org(sender, instance, **kwargs):
+    remove_document('org', instance.pk)
+
+
+@receiver(post_save, sender=Teacher)
+def index_teacher(sender, instance, update_fields=None, **kwargs):
+    if _need_reindex('teacher', update_fields):
+        index_document('teacher', instance)
+
+
+@receiver(post_delete, sender=Teacher)
+def unindex_teacher(sender, instance, **kwargs):
+    remove_document('teacher', instance.pk)
+
+
+# 用户选课或退课(包括后台增删选课记录)时更新课程学习人数、已选课程缓存和课程共同学习关系
+@receiver(post_save, sender=UserCourse)
+def user_course_added(sender, instance, created, **kwargs):
+    if created:
+        change_course_students(instance.course_id, 1)
+        expire_enrolled_course_ids(instance.user_id)
+        add_enrollment(instance)
+
+
+@receiver(post_delete, sender=UserCourse)
+def user_course_removed(sender, instance, **kwargs):
+    change_course_students(instance.course_id, -1)
+    expire_enrolled_course_ids(instance.user_id)
+    remove_enrollment(instance)
+
+
+# 课程、机构、讲师变化时使对应的模板片段缓存失效
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def expire_course_fragments(sender, instance, **kwargs):
+    bump_object_version(instance)
+    bump_list_version('course')
+
+
+@receiver(post_save, sender=CourseOrg)
+@receiver(post_delete, sender=CourseOrg)
+def expire_org_fragments(sender, instance, **kwargs):
+    bump_object_version(instance)
+    bump_list_version('org')
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def expire_teacher_fragments(sender, instance, **kwargs):
+    bump_object_version(instance)
+    bump_list_version('teacher')
+
+
+# 后台直接添加或删除评论时同步课程评论数，队列中bulk_create写入的评论不会触发该信号
+@receiver(post_save, sender=CourseComments)
+def comment_added(sender, instance, created, **kwargs):
+    if created:
+        change_comment_nums({instance.course_id: 1})
+
+
+@receiver(post_delete, sender=CourseComments)
+def comment_removed(sender, instance, **kwargs):
+    change_comment_nums({instance.course_id: -1})
+
+
+# 收藏数和热度由operation.favorites维护，后台或其它地方增删收藏记录时也要清除用户的收藏缓存
+@receiver(post_save, sender=UserFavorite)
+@receiver(post_delete, sender=UserFavorite)
+def favorite_changed(sender, instance, **kwargs):
+    expire_user_fav_ids(instance.user_id)
+
+
+# 后台直接添加或删除咨询时同步咨询统计，队列中bulk_create写入的咨询不会触发该信号
+@receiver(post_save, sender=UserAsk)
+def user_ask_added(sender, instance, created, **kwargs):
+    if created:
+        change_ask_stats({instance.course_name: 1})
+
+
+@receiver(post_delete, sender=UserAsk)
+def user_ask_removed(sender, instance, **kwargs):
+    change_ask_stats({instance.course_name: -1})
+
+
+# 写入或修改消息时维护未读消息计数
+@receiver(post_save, sender=UserMessage)
+def message_saved(sender, instance, created, **kwargs):
+    if not instance.user:
+        if created:
+            expire_broadcast_ids()
+    elif created:
+        if not instance.has_read:
+            incr_unread_nums(instance.user)
+    else:
+        # 后台修改了已读状态或接收用户，重新统计
+        expire_unread_nums(instance.user)
+
+
+@receiver(post_delete, sender=UserMessage)
+def message_deleted(sender, instance, **kwargs):
+    if not instance.user:
+        expire_broadcast_ids()
+    else:
+        expire_unread_nums(instance.user)
@@ -0,0 +1,20 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django import template
+
+from utils.fragment import get_object_version, get_list_version
+
+register = template.Library()
+
+
+# 配合{% cache %}使用，例如 {% cache 300 course_card course.id course|fragment_version %}
+@register.filter
+def fragment_version(instance):
+    return get_object_version(instance)
+
+
+# 列表类片段(热门课程、讲师排行榜等)的版本号，例如 {% cache 300 hot_course 'course'|list_version %}
+@register.filter
+def list_version(name):
+    return get_list_version(name)
@@ -1,3 +1,378 @@
-from django.test import TestCase
+import contextlib
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, IntegrityError
+from django.db.migrations.executor import MigrationExecutor
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, RequestFactory
+
+from courses.models import Course
+from courses.tests import create_course
+from users.models import UserProfile
+from . import trending
+from .asks import add_user_ask, user_ask_queue
+from .enrollment import enroll, is_enrolled
+from .comments import add_comment, comment_queue, get_pending_comments, persist_comments
+from .recommend import _change_pairs
+from .favorites import toggle_fav, batch_toggle_fav, get_user_fav_ids, has_fav, _recount_fav_nums
+from .inbox import InboxPaginator, mark_read, mark_all_read, get_unread_nums
+from .models import CourseCoOccurrence, UserCourse, UserMessage, CourseComments, TrendingScore, UserFavorite, UserAsk, UserAskStat
+from utils.queue import CacheQueue
+from utils.search import search, search_queryset
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_html_is_not_indexed(self):
+        course = create_course(detail='<p class="intro" style="color:red">Flask&nbsp;教程</p>')
+        self.assertEqual(search('course', 'flask'), [course.id])
+        self.assertEqual(search('course', 'style'), [])
+        self.assertEqual(search('course', 'intro'), [])
+
+    def test_results_are_not_capped(self):
+        course = create_course(name='Python 基础')
+        for i in range(5):
+            Course.objects.create(name='Python 进阶{}'.format(i), desc='desc', detail='detail', course_org=course.course_org,
+                                  teacher=course.teacher, image='courses/x.jpg')
+        self.assertEqual(len(search('course', 'python')), 6)
+        self.assertEqual(search_queryset(Course.objects.all(), 'course', 'python').count(), 6)
+
+
+class CommentTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+
+    def test_comment_is_saved_in_request(self):
+        self.assertTrue(add_comment(self.user, str(self.course.id), ' 讲得很好 '))
+        self.assertEqual(list(CourseComments.objects.values_list('course_id', 'comments')), [(self.course.id, '讲得很好')])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.comment_nums, 1)
+
+    def test_invalid_comment_is_rejected(self):
+        self.assertFalse(add_comment(self.user, 'abc', '讲得很好'))
+        self.assertFalse(add_comment(self.user, self.course.id + 1, '讲得很好'))
+        self.assertFalse(add_comment(self.user, self.course.id, '  '))
+        self.assertFalse(CourseComments.objects.exists())
+
+    def test_queued_comments_are_written_on_flush(self):
+        # 开启队列时评论先留在缓存，flush时一次写入并更新评论数
+        with mock.patch.object(comment_queue, 'enabled', True), mock.patch.object(comment_queue, 'interval', 3600):
+            cache.set(comment_queue.flush_at_key, time.time(), None)
+            self.assertTrue(add_comment(self.user, self.course.id, '讲得很好'))
+            self.assertFalse(CourseComments.objects.exists())
+            self.assertEqual([c.comments for c in get_pending_comments(self.course.id)], ['讲得很好'])
+            self.assertEqual(comment_queue.flush(), 1)
+            self.assertEqual(get_pending_comments(self.course.id), [])
+        self.assertEqual(CourseComments.objects.count(), 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.comment_nums, 1)
+
+    def test_failed_flush_keeps_comments_queued(self):
+        with mock.patch.object(comment_queue, 'enabled', True), mock.patch.object(comment_queue, 'interval', 3600):
+            cache.set(comment_queue.flush_at_key, time.time(), None)
+            add_comment(self.user, self.course.id, '讲得很好')
+            with mock.patch.object(comment_queue, 'handler', side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    comment_queue.flush()
+            self.assertEqual(len(comment_queue.pending()), 1)
+            comment_queue.flush()
+        self.assertEqual(CourseComments.objects.count(), 1)
+
+    def test_queue_requires_redis(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheQueue('test', persist_comments, enabled=True)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """
+    先回退到migrate_from，用迁移时的模型准备数据，再执行到migrate_to检查数据迁移的结果。
+    回退前可以在prepare()中用当前的模型创建不受这些迁移影响的数据
+    """
+    migrate_from = None
+    migrate_to = None
+
+    def prepare(self):
+        pass
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        cache.clear()
+        self.prepare()
+        self.old_apps = self.migrate([self.migrate_from])
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+class UserCourseMigrationTest(MigrationTestCase):
+    migrate_from = ('operation', '0004_fill_comment_nums')
+    migrate_to = ('operation', '0005_usercourse_unique')
+
+    def prepare(self):
+        self.course = create_course()
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+
+    def test_duplicates_are_removed_before_unique_index(self):
+        UserCourse = self.old_apps.get_model('operation', 'UserCourse')
+        first = UserCourse.objects.create(user_id=self.user.id, course_id=self.course.id)
+        UserCourse.objects.create(user_id=self.user.id, course_id=self.course.id)
+        UserCourse.objects.create(user_id=self.user.id, course_id=self.course.id)
+        new_apps = self.migrate([self.migrate_to])
+        self.assertEqual(list(new_apps.get_model('operation', 'UserCourse').objects.values_list('id', flat=True)), [first.id])
+
+
+class EnrollmentTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+
+    def assertStudents(self, nums):
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students, nums)
+
+    def test_enroll_once(self):
+        self.assertTrue(enroll(self.user, self.course))
+        self.assertFalse(enroll(self.user, self.course))
+        self.assertTrue(is_enrolled(self.user.id, self.course.id))
+        self.assertStudents(1)
+
+    def test_records_changed_outside_enroll_update_students_and_cache(self):
+        # 后台增删选课记录时同样更新学习人数和已选课程缓存
+        self.assertFalse(is_enrolled(self.user.id, self.course.id))
+        user_course = UserCourse.objects.create(user=self.user, course=self.course)
+        self.assertTrue(is_enrolled(self.user.id, self.course.id))
+        self.assertStudents(1)
+        user_course.delete()
+        self.assertFalse(is_enrolled(self.user.id, self.course.id))
+        self.assertStudents(0)
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+
+    def test_record_buffers_until_refresh(self):
+        trending.record('course', self.course.id, 'enroll')
+        trending.record('course', self.course.id, 'click')
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(trending.refresh(), 1)
+        self.assertEqual(TrendingScore.objects.get().score, 11)
+        self.assertEqual(trending.get_first('course'), self.course)
+
+    def test_record_writes_score_when_lock_is_busy(self):
+        # 拿不到锁时不丢弃，直接加到热度分数上
+        with mock.patch.object(trending.lock, 'acquire', return_value=False):
+            trending.record('course', self.course.id, 'click')
+            trending.record('course', self.course.id, 'click')
+        self.assertEqual(TrendingScore.objects.get().score, 2)
+
+    def test_refresh_loads_new_rows_into_short_top_list(self):
+        self.assertIsNone(trending.get_first('course'))
+        TrendingScore.objects.create(doc_type='course', doc_id=self.course.id, score=5)
+        trending.refresh()
+        self.assertEqual(trending.get_first('course'), self.course)
+
+
+class TrendingMigrationTest(MigrationTestCase):
+    migrate_from = ('operation', '0009_messagereceipt')
+    migrate_to = ('operation', '0010_seed_trending')
+
+    def prepare(self):
+        self.course = create_course(students=2, click_nums=3)
+
+    def test_scores_are_seeded(self):
+        new_apps = self.migrate([self.migrate_to])
+        scores = new_apps.get_model('operation', 'TrendingScore').objects.values_list('doc_type', 'doc_id', 'score')
+        self.assertIn(('course', self.course.id, 23), list(scores))
+
+
+class FavoriteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+
+    def assertFavNums(self, nums):
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.fav_nums, nums)
+
+    def test_toggle(self):
+        self.assertTrue(toggle_fav(self.user, self.course.id, 1))
+        self.assertFavNums(1)
+        self.assertFalse(toggle_fav(self.user, self.course.id, 1))
+        self.assertFavNums(0)
+        self.assertIsNone(toggle_fav(self.user, self.course.id + 1, 1))
+
+    def test_stale_cache_does_not_swallow_click(self):
+        # 缓存认为已收藏，数据库中没有：改为收藏
+        get_user_fav_ids(self.user.id)
+        toggle_fav(self.user, self.course.id, 1)
+        UserFavorite.objects.filter(user=self.user).delete()
+        self.assertTrue(toggle_fav(self.user, self.course.id, 1))
+        # 缓存认为未收藏，数据库中已有：改为取消收藏
+        cache.set('fav:user:{}'.format(self.user.id), {}, None)
+        self.assertFalse(toggle_fav(self.user, self.course.id, 1))
+        self.assertFalse(UserFavorite.objects.exists())
+
+    def test_delete_expires_cache(self):
+        toggle_fav(self.user, self.course.id, 1)
+        self.assertTrue(has_fav(self.user, self.course.id, 1))
+        UserFavorite.objects.filter(user=self.user).delete()
+        del self.user._fav_sets
+        self.assertFalse(has_fav(self.user, self.course.id, 1))
+
+    def test_batch_toggle(self):
+        other = create_course()
+        toggle_fav(self.user, self.course.id, 1)
+        result = batch_toggle_fav(self.user, [self.course.id, other.id, 'x'], 1)
+        self.assertEqual(result, {self.course.id: False, other.id: True})
+        self.assertFavNums(0)
+        other.refresh_from_db()
+        self.assertEqual(other.fav_nums, 1)
+        Course.objects.update(fav_nums=7)
+        _recount_fav_nums(1, [self.course.id, other.id])
+        self.assertEqual(dict(Course.objects.values_list('id', 'fav_nums')), {self.course.id: 0, other.id: 1})
+
+
+class FavoriteMigrationTest(MigrationTestCase):
+    migrate_from = ('operation', '0006_trendingscore')
+    migrate_to = ('operation', '0007_userfavorite_unique')
+
+    def prepare(self):
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+
+    def test_duplicates_are_removed_before_unique_index(self):
+        UserFavorite = self.old_apps.get_model('operation', 'UserFavorite')
+        first = UserFavorite.objects.create(user_id=self.user.id, fav_id=1, fav_type=1)
+        UserFavorite.objects.create(user_id=self.user.id, fav_id=1, fav_type=1)
+        other = UserFavorite.objects.create(user_id=self.user.id, fav_id=1, fav_type=2)
+        new_apps = self.migrate([self.migrate_to])
+        ids = new_apps.get_model('operation', 'UserFavorite').objects.order_by('id').values_list('id', flat=True)
+        self.assertEqual(list(ids), [first.id, other.id])
+
+
+class UserAskTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ask_is_saved_in_request_once_per_window(self):
+        self.assertTrue(add_user_ask('张三', '13800000000', 'Django入门'))
+        self.assertFalse(add_user_ask('张三', '13800000000', 'Django入门'))
+        self.assertTrue(add_user_ask('张三', '13800000000', 'Flask入门'))
+        self.assertEqual(UserAsk.objects.count(), 2)
+        self.assertEqual(UserAskStat.objects.get(course_name='Django入门').ask_nums, 1)
+
+    def test_failed_insert_allows_retry(self):
+        with mock.patch.object(UserAsk.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                add_user_ask('张三', '13800000000', 'Django入门')
+        self.assertTrue(add_user_ask('张三', '13800000000', 'Django入门'))
+
+    def test_queued_asks_are_written_on_flush(self):
+        with mock.patch.object(user_ask_queue, 'enabled', True), mock.patch.object(user_ask_queue, 'interval', 3600):
+            cache.set(user_ask_queue.flush_at_key, time.time(), None)
+            self.assertTrue(add_user_ask('张三', '13800000000', 'Django入门'))
+            self.assertTrue(add_user_ask('李四', '13900000000', 'Django入门'))
+            self.assertFalse(UserAsk.objects.exists())
+            self.assertEqual(user_ask_queue.flush(), 2)
+        self.assertEqual(UserAsk.objects.count(), 2)
+        self.assertEqual(UserAskStat.objects.get(course_name='Django入门').ask_nums, 2)
+
+
+class InboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserProfile.objects.create_user('u1', 'u1@a.com', '12345')
+        other = UserProfile.objects.create_user('u2', 'u2@a.com', '12345')
+        # 个人消息、全员消息和别人的消息交错
+        for user_id in (self.user.id, 0, other.id, 0, self.user.id, self.user.id, 0, other.id, 0):
+            UserMessage.objects.create(user=user_id, message='消息')
+        self.expected = list(UserMessage.objects.filter(user__in=[0, self.user.id]).order_by('-id').values_list('id', flat=True))
+
+    def get_page(self, params):
+        request = RequestFactory().get('/usercenter/my_message/', params)
+        return InboxPaginator(self.user, 3, request=request).page(params.get('page', 1))
+
+    def test_merged_keyset_pages(self):
+        page = self.get_page({})
+        self.assertEqual(page.paginator.count, 7)
+        ids = [message.id for message in page.object_list]
+        while page.has_next():
+            page = self.get_page(QueryDict(page.next_page_number().querystring).dict())
+            ids += [message.id for message in page.object_list]
+        self.assertEqual(ids, self.expected)
+        # 从第3页往前翻
+        cursor = page.paginator.encode_cursor('prev', page.object_list[0])
+        page = self.get_page({'page': 2, 'cursor': cursor})
+        self.assertEqual([message.id for message in page.object_list], self.expected[3:6])
+
+    def test_mark_read(self):
+        self.assertEqual(get_unread_nums(self.user), 7)
+        self.assertFalse(mark_read(self.user, 'abc'))
+        self.assertFalse(mark_read(self.user, UserMessage.objects.exclude(user__in=[0, self.user.id]).first().id))
+        self.assertTrue(mark_read(self.user, self.expected[0]))
+        self.assertTrue(mark_read(self.user, str(self.expected[1])))
+        self.assertEqual(get_unread_nums(self.user), 5)
+        mark_all_read(self.user)
+        self.assertEqual(get_unread_nums(self.user), 0)
+
+    def test_message_arriving_during_mark_all_read_stays_unread(self):
+        # 查出最新消息id之后、更新已读位置之前收到的新消息不能被计数置0吞掉
+        def filter_then_receive(*args, **kwargs):
+            UserMessage.objects.create(user=self.user.id, message='新消息')
+            return UserProfile.objects.all().filter(*args, **kwargs)
+        self.assertEqual(get_unread_nums(self.user), 7)
+        with mock.patch('operation.inbox.UserProfile.objects.filter', side_effect=filter_then_receive):
+            mark_all_read(self.user)
+        self.assertEqual(get_unread_nums(self.user), 1)
+
+    def test_read_view_rejects_bad_id(self):
+        self.client.login(username='u1', password='12345')
+        response = self.client.post('/usercenter/my_message/read/', {'msg_id': 'abc'})
+        self.assertEqual((response.status_code, json.loads(response.content.decode('utf-8'))['status']), (200, 'fail'))
+
+
+class CoOccurrenceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b, self.c = create_course(), create_course(), create_course()
+
+    def nums(self):
+        return dict(((a, b), n) for a, b, n in CourseCoOccurrence.objects.values_list('course_id', 'related_course_id', 'nums'))
+
+    def test_existing_pairs_are_updated_and_missing_pairs_created(self):
+        CourseCoOccurrence.objects.create(course=self.a, related_course=self.b, nums=2)
+        _change_pairs(self.a.id, [self.b.id, self.c.id], 1)
+        self.assertEqual(self.nums(), {(self.a.id, self.b.id): 3, (self.b.id, self.a.id): 1,
+                                       (self.a.id, self.c.id): 1, (self.c.id, self.a.id): 1})
+        _change_pairs(self.a.id, [self.b.id], -1)
+        self.assertEqual(self.nums()[(self.a.id, self.b.id)], 2)
+        self.assertEqual(self.nums()[(self.b.id, self.a.id)], 0)
+
+    def test_pair_created_concurrently_keeps_increment(self):
+        # 查询已有记录之后，并发请求建好了(a, c)：创建时违反唯一约束，改为F()加1
+        def create(**kwargs):
+            obj = CourseCoOccurrence(**kwargs)
+            if (obj.course_id, obj.related_course_id) == (self.a.id, self.c.id):
+                CourseCoOccurrence.objects.bulk_create([CourseCoOccurrence(course_id=self.a.id, related_course_id=self.c.id, nums=1)])
+                raise IntegrityError
+            obj.save()
+            return obj
+        with mock.patch('operation.recommend.transaction', mock.Mock(atomic=contextlib.nullcontext)), \
+                mock.patch.object(CourseCoOccurrence.objects, 'create', side_effect=create):
+            _change_pairs(self.a.id, [self.c.id], 1)
+        self.assertEqual(self.nums()[(self.a.id, self.c.id)], 2)
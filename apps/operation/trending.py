@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+
+from utils.fragment import bump_list_version
+from utils.queue import CacheLock
+from .models import TrendingScore
+
+TRENDING_DOCS = {
+    'course': 'courses.Course',
+    'org': 'organization.CourseOrg',
+    'teacher': 'organization.Teacher',
+}
+
+# 各种行为对热度的贡献
+TRENDING_WEIGHTS = getattr(settings, 'TRENDING_WEIGHTS', {'click': 1, 'fav': 5, 'enroll': 10})
+# 半衰期(秒)，默认7天前的行为只算一半
+TRENDING_HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 7 * 24 * 3600)
+# 缓存的排行榜长度，页面上最多取这么多个
+TRENDING_TOP_K = getattr(settings, 'TRENDING_TOP_K', 20)
+# 衰减到该分数以下的记录直接删除
+TRENDING_MIN_SCORE = 0.01
+
+BUFFER_KEY = 'trending:buffer'
+REFRESHED_AT_KEY = 'trending:refreshed_at'
+REFRESHING_KEY = 'trending:refreshing'
+# 请求中只尝试两次，拿不到锁时直接写数据库
+lock = CacheLock('trending:lock', retries=2)
+
+
+def _top_key(doc_type):
+    return 'trending:top:{}'.format(doc_type)
+
+
+def record(doc_type, doc_id, event, times=1):
+    """
+    记录一次点击、收藏或学习，先累积在缓存中，由定时任务refresh_trending合并到热度分数。
+    缓冲和排行榜都放在缓存中，缓存必须是多进程共用的memcached/redis，否则定时任务看不到web进程的缓冲
+    """
+    weight = TRENDING_WEIGHTS.get(event, 0) * times
+    if not weight or not doc_id:
+        return
+    if not lock.acquire():
+        # 拿不到锁时直接加到热度分数上，排行榜在下次刷新时更新
+        _add_scores({(doc_type, doc_id): weight})
+        return
+    try:
+        buffer = cache.get(BUFFER_KEY) or {}
+        buffer[(doc_type, doc_id)] = buffer.get((doc_type, doc_id), 0) + weight
+        cache.set(BUFFER_KEY, buffer, None)
+    finally:
+        lock.release()
+
+
+def _load_top(doc_type):
+    # 缓存的排行榜[(分数, id)]，缓存丢失时按(doc_type, score)索引取前K个
+    top = cache.get(_top_key(doc_type))
+    if top is None:
+        top = list(TrendingScore.objects.filter(doc_type=doc_type).order_by('-score').values_list('score', 'doc_id')[:TRENDING_TOP_K])
+        cache.set(_top_key(doc_type), top, None)
+    return top
+
+
+def _get_trending(doc_type, nums):
+    ids = [doc_id for score, doc_id in _load_top(doc_type)[:nums]]
+    objects = apps.get_model(TRENDING_DOCS[doc_type]).objects.in_bulk(ids)
+    # 已删除的数据在下次刷新前会被跳过
+    return [objects[doc_id] for doc_id in ids if doc_id in objects]
+
+
+def get_trending(doc_type, nums):
+    """
+    热门课程、机构、讲师，返回惰性列表，模板片段缓存命中时不会查询数据库
+    """
+    return SimpleLazyObject(lambda: _get_trending(doc_type, nums))
+
+
+def get_first(doc_type):
+    trending = _get_trending(doc_type, 1)
+    return trending[0] if trending else None
+
+
+def _add_scores(increments):
+    for (doc_type, doc_id), inc in increments.items():
+        updated = TrendingScore.objects.filter(doc_type=doc_type, doc_id=doc_id).update(score=F('score') + inc)
+        if not updated:
+            TrendingScore.objects.create(doc_type=doc_type, doc_id=doc_id, score=inc)
+
+
+def refresh():
+    """
+    由refresh_trending定时执行：所有分数按距上次刷新的时间统一衰减，再加上这段时间累积的增量。
+    统一衰减不改变原有排名，所以新的前K名只可能来自原来的前K名和本次有增量的数据，不需要全表排序
+    """
+    # 同一时间只有一个进程刷新，避免按同一个上次刷新时间重复衰减
+    if not cache.add(REFRESHING_KEY, 1, 60):
+        return 0
+    try:
+        return _refresh()
+    finally:
+        cache.delete(REFRESHING_KEY)
+
+
+def _refresh():
+    # 定时任务里可以多等一会儿锁
+    if not CacheLock(lock.key).acquire():
+        return 0
+    try:
+        increments = cache.get(BUFFER_KEY) or {}
+        cache.delete(BUFFER_KEY)
+    finally:
+        lock.release()
+
+    now = time.time()
+    refreshed_at = cache.get(REFRESHED_AT_KEY)
+    if refreshed_at is not None and now > refreshed_at:
+        factor = 0.5 ** ((now - refreshed_at) / TRENDING_HALF_LIFE)
+        TrendingScore.objects.update(score=F('score') * factor)
+        TrendingScore.objects.filter(score__lt=TRENDING_MIN_SCORE).delete()
+    cache.set(REFRESHED_AT_KEY, now, None)
+
+    _add_scores(increments)
+
+    for doc_type in TRENDING_DOCS:
+        top = cache.get(_top_key(doc_type))
+        if top is None or len(top) < TRENDING_TOP_K:
+            # 排行榜不满K个时可能漏掉没有增量的记录，直接按索引重新取前K个
+            cache.delete(_top_key(doc_type))
+            _load_top(doc_type)
+        else:
+            candidates = {doc_id for score, doc_id in top}
+            candidates |= {doc_id for (t, doc_id) in increments if t == doc_type}
+            top = sorted(TrendingScore.objects.filter(doc_type=doc_type, doc_id__in=candidates).values_list('score', 'doc_id'), reverse=True)
+            cache.set(_top_key(doc_type), top[:TRENDING_TOP_K], None)
+        bump_list_version(doc_type)
+    return len(increments)
+
+
+def seed():
+    """
+    重新按累计的学习人数、收藏数、点击数初始化热度，之后随时间衰减。上线时由数据迁移执行过一次
+    """
+    TrendingScore.objects.all().delete()
+    scores = []
+    for doc_type, label in TRENDING_DOCS.items():
+        model = apps.get_model(label)
+        names = {field.name for field in model._meta.get_fields()}
+        fields = [field for field in ('students', 'fav_nums', 'click_nums') if field in names]
+        for row in model.objects.values('id', *fields):
+            score = (row.get('students', 0) * TRENDING_WEIGHTS.get('enroll', 0) + row.get('fav_nums', 0) * TRENDING_WEIGHTS.get('fav', 0) +
+                     row.get('click_nums', 0) * TRENDING_WEIGHTS.get('click', 0))
+            if score >= TRENDING_MIN_SCORE:
+                scores.append(TrendingScore(doc_type=doc_type, doc_id=row['id'], score=score))
+    TrendingScore.objects.bulk_create(scores, batch_size=500)
+    cache.set(REFRESHED_AT_KEY, time.time(), None)
+    for doc_type in TRENDING_DOCS:
+        cache.delete(_top_key(doc_type))
+        bump_list_version(doc_type)
+    return len(scores)
@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from utils.api import CatalogView, int_param
+from .models import CourseOrg, Teacher
+
+# 点击数由计数器批量写回，不触发版本号变化，所以不对外提供
+
+
+class OrgApiView(CatalogView):
+    model = CourseOrg
+    allowed_fields = ('id', 'name', 'desc', 'category', 'fav_nums', 'students', 'course_nums', 'image', 'address', 'city_id', 'add_time')
+    default_fields = ('id', 'name', 'category', 'students', 'course_nums', 'image', 'address', 'city_id')
+    version_name = 'org'
+
+    def get_queryset(self, request, **kwargs):
+        queryset = CourseOrg.objects.all()
+        city_id = int_param(request, 'city')
+        if city_id is not None:
+            queryset = queryset.filter(city_id=city_id)
+        category = request.GET.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        return queryset
+
+
+class TeacherApiView(CatalogView):
+    model = Teacher
+    allowed_fields = ('id', 'name', 'org_id', 'work_years', 'work_company', 'work_position', 'points', 'fav_nums', 'image', 'add_time')
+    default_fields = ('id', 'name', 'org_id', 'work_years', 'work_company', 'work_position', 'points', 'image')
+    version_name = 'teacher'
+
+    def get_queryset(self, request, **kwargs):
+        queryset = Teacher.objects.all()
+        org_id = int_param(request, 'org')
+        if org_id is not None:
+            queryset = queryset.filter(org_id=org_id)
+        return queryset
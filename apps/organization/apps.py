@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrganizationConfig(AppConfig):
     name = 'organization'
     verbose_name = '机构'
+
+    def ready(self):
+        # 注册信号处理函数
+        import organization.signals
@@ -0,0 +1,30 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.cache import cache
+from django.http import Http404
+
+from operation.favorites import has_fav
+from utils.fragment import get_object_version
+from .models import CourseOrg
+
+
+def get_course_org(org_id):
+    """
+    机构详情各个标签页共用的机构信息(含城市和统计数)，按机构版本号缓存，机构变化后自动失效
+    """
+    org_id = int(org_id)
+    cache_key = 'org:header:{}:{}'.format(org_id, get_object_version(CourseOrg(id=org_id)))
+    course_org = cache.get(cache_key)
+    if course_org is None:
+        course_org = CourseOrg.objects.select_related('city').filter(id=org_id).first()
+        if course_org is None:
+            raise Http404('机构不存在')
+        cache.set(cache_key, course_org, 3600)
+    return course_org
+
+
+def load_org_header(request, org_id):
+    # 返回机构以及当前用户是否已收藏该机构
+    course_org = get_course_org(org_id)
+    return course_org, has_fav(request.user, course_org.id, 2)
@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from organization.stats import recompute_org_stats
+
+
+# 重新统计所有机构的课程数、学习人数、讲师数和收藏数，修复数据偏差
+class Command(BaseCommand):
+    help = '重新统计机构的课程数、学习人数、讲师数和收藏数'
+
+    def handle(self, *args, **options):
+        nums = recompute_org_stats()
+        self.stdout.write('已更新 {} 个机构'.format(nums))
@@ -0,0 +1,54 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_org_stats(apps, schema_editor):
+    # 按课程、选课、讲师、收藏重新统计已有机构的数据
+    CourseOrg = apps.get_model('organization', 'CourseOrg')
+    Teacher = apps.get_model('organization', 'Teacher')
+    Course = apps.get_model('courses', 'Course')
+    UserCourse = apps.get_model('operation', 'UserCourse')
+    UserFavorite = apps.get_model('operation', 'UserFavorite')
+    course_nums = dict(Course.objects.values_list('course_org_id').annotate(nums=Count('id')).order_by())
+    students = dict(UserCourse.objects.values_list('course__course_org_id').annotate(nums=Count('id')).order_by())
+    teacher_nums = dict(Teacher.objects.values_list('org_id').annotate(nums=Count('id')).order_by())
+    fav_nums = dict(UserFavorite.objects.filter(fav_type=2).values_list('fav_id').annotate(nums=Count('id')).order_by())
+    for org_id in CourseOrg.objects.values_list('id', flat=True):
+        CourseOrg.objects.filter(id=org_id).update(
+            course_nums=course_nums.get(org_id, 0), students=students.get(org_id, 0),
+            teacher_nums=teacher_nums.get(org_id, 0), fav_nums=fav_nums.get(org_id, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organization', '0008_auto_20180813_2209'),
+        ('courses', '0019_course_comment_nums'),
+        ('operation', '0006_trendingscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseorg',
+            name='teacher_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='讲师数'),
+        ),
+        migrations.AlterField(
+            model_name='courseorg',
+            name='course_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='课程数'),
+        ),
+        migrations.AlterField(
+            model_name='courseorg',
+            name='fav_nums',
+            field=models.IntegerField(default=0, editable=False, verbose_name='收藏数'),
+        ),
+        migrations.AlterField(
+            model_name='courseorg',
+            name='students',
+            field=models.IntegerField(default=0, editable=False, verbose_name='学习人数'),
+        ),
+        migrations.RunPython(fill_org_stats, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from datetime import datetime
 
+from utils.mixins import DerivedFieldsMixin
+
 
 # 城市信息，用户课程机构所在城市选择
 class CityDict(models.Model):
@@ -16,7 +18,7 @@ class CityDict(models.Model):
 
 
 # 课程机构信息
-class CourseOrg(models.Model):
+class CourseOrg(DerivedFieldsMixin, models.Model):
     ORG_CHOICES = (
         ("pxjg", "培训机构"),
         ("gx", "高校"),
@@ -27,9 +29,11 @@ class CourseOrg(models.Model):
     desc = models.TextField(verbose_name='机构描述')
     category = models.CharField(choices=ORG_CHOICES, max_length=10, default='pxjg', verbose_name='机构类别')
     click_nums = models.IntegerField(default=0, verbose_name='点击数')
-    fav_nums = models.IntegerField(default=0, verbose_name='收藏数')
-    students = models.IntegerField(default=0, verbose_name='学习人数')
-    course_nums = models.IntegerField(default=0, verbose_name='课程数')
+    # 以下统计字段由课程、选课、讲师、收藏的信号增量维护，recompute_org_stats命令修复偏差，不在后台手动修改
+    fav_nums = models.IntegerField(default=0, editable=False, verbose_name='收藏数')
+    students = models.IntegerField(default=0, editable=False, verbose_name='学习人数')
+    course_nums = models.IntegerField(default=0, editable=False, verbose_name='课程数')
+    teacher_nums = models.IntegerField(default=0, editable=False, verbose_name='讲师数')
     image = models.ImageField(upload_to='org/%Y/%m', max_length=100, blank=True, null=True, verbose_name='封面图')
     address = models.CharField(max_length=150, verbose_name='机构地址')
     city = models.ForeignKey(CityDict, on_delete=models.CASCADE, verbose_name='所在城市')
@@ -39,13 +43,8 @@ class CourseOrg(models.Model):
         verbose_name_plural = verbose_name = '课程机构'
 
     def get_teacher_nums(self):
-        return self.teachers.count()
-
-    def change_fav_nums(self, add=1):
-        self.fav_nums += add
-        if self.fav_nums < 0:
-            self.fav_nums = 0
-        self.save(update_fields=['fav_nums'])
+        # 获取机构讲师数，直接读取统计字段，不再每次count
+        return self.teacher_nums
 
     def __str__(self):
         return self.name
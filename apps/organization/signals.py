@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from courses.models import Course
+from operation.models import UserCourse
+from .models import Teacher
+from .stats import change_org_stats
+
+
+def _org_changed(created, old_org_id, org_id, field):
+    if created:
+        change_org_stats(org_id, **{field: 1})
+    elif old_org_id != org_id:
+        change_org_stats(old_org_id, **{field: -1})
+        change_org_stats(org_id, **{field: 1})
+
+
+# 课程增删或换机构时更新机构课程数，原来的机构由courses.signals的pre_save记录
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    old_org_id = getattr(instance, '_old_values', {}).get('course_org_id', instance.course_org_id)
+    _org_changed(created, old_org_id, instance.course_org_id, 'course_nums')
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    change_org_stats(instance.course_org_id, course_nums=-1)
+
+
+# 讲师增删或换机构时更新机构讲师数，修改时先记录原来的机构
+@receiver(pre_save, sender=Teacher)
+def teacher_pre_save(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or {'org', 'org_id'} & set(update_fields)):
+        instance._old_org_id = sender.objects.filter(pk=instance.pk).values_list('org_id', flat=True).first()
+
+
+@receiver(post_save, sender=Teacher)
+def teacher_saved(sender, instance, created, **kwargs):
+    _org_changed(created, instance.__dict__.pop('_old_org_id', instance.org_id), instance.org_id, 'teacher_nums')
+
+
+@receiver(post_delete, sender=Teacher)
+def teacher_deleted(sender, instance, **kwargs):
+    change_org_stats(instance.org_id, teacher_nums=-1)
+
+
+# 选课和退课时更新机构学习人数
+@receiver(post_save, sender=UserCourse)
+def user_course_saved(sender, instance, created, **kwargs):
+    if created:
+        change_org_stats(instance.course.course_org_id, students=1)
+
+
+@receiver(post_delete, sender=UserCourse)
+def user_course_deleted(sender, instance, **kwargs):
+    org_id = Course.objects.filter(id=instance.course_id).values_list('course_org_id', flat=True).first()
+    change_org_stats(org_id, students=-1)
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models import Count, F
+
+from courses.models import Course
+from operation.models import UserCourse, UserFavorite
+from utils.fragment import bump_object_version, bump_list_version
+from .models import CourseOrg, Teacher
+
+ORG_STAT_FIELDS = ('course_nums', 'students', 'teacher_nums', 'fav_nums')
+
+
+def change_org_stats(org_id, **deltas):
+    """
+    增量更新机构的统计字段，例如 change_org_stats(1, course_nums=1, students=-1)，减少时不会小于0。
+    收藏数由operation.favorites维护
+    """
+    if not org_id:
+        return
+    for field, delta in deltas.items():
+        if delta > 0:
+            CourseOrg.objects.filter(id=org_id).update(**{field: F(field) + delta})
+        elif delta < 0:
+            CourseOrg.objects.filter(id=org_id, **{field + '__gte': -delta}).update(**{field: F(field) + delta})
+    # update()不会触发post_save，手动让机构卡片和列表的缓存失效
+    bump_object_version(CourseOrg(id=org_id))
+    bump_list_version('org')
+
+
+def recompute_org_stats(org_ids=None):
+    """
+    重新统计机构的课程数、学习人数、讲师数和收藏数，org_ids为空时统计全部机构。
+    每个来源表一次GROUP BY查询，只更新有变化的机构，返回更新的机构数
+    """
+    courses = Course.objects.all()
+    user_courses = UserCourse.objects.all()
+    teachers = Teacher.objects.all()
+    favorites = UserFavorite.objects.filter(fav_type=2)
+    orgs = CourseOrg.objects.all()
+    if org_ids is not None:
+        courses = courses.filter(course_org_id__in=org_ids)
+        user_courses = user_courses.filter(course__course_org_id__in=org_ids)
+        teachers = teachers.filter(org_id__in=org_ids)
+        favorites = favorites.filter(fav_id__in=org_ids)
+        orgs = orgs.filter(id__in=org_ids)
+
+    stats = {
+        'course_nums': dict(courses.values_list('course_org_id').annotate(nums=Count('id')).order_by()),
+        'students': dict(user_courses.values_list('course__course_org_id').annotate(nums=Count('id')).order_by()),
+        'teacher_nums': dict(teachers.values_list('org_id').annotate(nums=Count('id')).order_by()),
+        'fav_nums': dict(favorites.values_list('fav_id').annotate(nums=Count('id')).order_by()),
+    }
+
+    nums = 0
+    for row in orgs.values('id', *ORG_STAT_FIELDS):
+        values = {field: stats[field].get(row['id'], 0) for field in ORG_STAT_FIELDS}
+        # 没有变化的机构不需要写数据库
+        if any(values[field] != row[field] for field in ORG_STAT_FIELDS):
+            CourseOrg.objects.filter(id=row['id']).update(**values)
+            bump_object_version(CourseOrg(id=row['id']))
+            nums += 1
+    if nums:
+        bump_list_version('org')
+    return nums
@@ -1,3 +1,47 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from courses.tests import create_course
+from .models import CourseOrg
+
+
+class OrgApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = create_course().course_org
+
+    def test_invalid_integer_filters_return_400(self):
+        self.assertEqual(self.client.get('/api/orgs/?city=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/teachers/?org=x').status_code, 400)
+
+    def test_filters(self):
+        response = self.client.get('/api/orgs/?city={}&category=pxjg&fields=id'.format(self.org.city_id))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/teachers/?org={}&fields=id'.format(self.org.id))
+        self.assertIn('"results": [{"id"', b''.join(response.streaming_content).decode('utf-8'))
+
+
+class OrgStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = create_course()
+        self.org = self.course.course_org
+        self.other = CourseOrg.objects.create(name='其它机构', desc='其它机构', city=self.org.city, address='北京', image='org/x.jpg')
+
+    def assertCourseNums(self, org, nums):
+        org.refresh_from_db()
+        self.assertEqual(org.course_nums, nums)
+
+    def test_moving_course_updates_both_orgs(self):
+        self.course.course_org = self.other
+        self.course.save()
+        self.assertCourseNums(self.org, 0)
+        self.assertCourseNums(self.other, 1)
+
+    def test_org_not_in_update_fields_is_ignored(self):
+        # 只保存名称时，内存中改过的机构没有写入数据库，机构课程数不变
+        self.course.course_org = self.other
+        self.course.name = 'Django进阶'
+        self.course.save(update_fields=['name'])
+        self.assertCourseNums(self.org, 1)
+        self.assertCourseNums(self.other, 0)
@@ -3,7 +3,7 @@
 
 from django.urls import path, re_path
 
-from organization.views import OrgListView, AddUserAskView, OrgHomeView, OrgCourseView, OrgDescView, OrgTeacherView, AddFavView
+from organization.views import OrgListView, AddUserAskView, OrgHomeView, OrgCourseView, OrgDescView, OrgTeacherView, AddFavView, BatchFavView
 
 app_name = 'organization'
 
@@ -16,4 +16,5 @@ urlpatterns = [
     re_path('id/(?P<org_id>\d+)/desc/', OrgDescView.as_view(), name='org_desc'),  # 机构介绍
     re_path('id/(?P<org_id>\d+)/teacher/', OrgTeacherView.as_view(), name='org_teacher'),  # 机构讲师
     path('add_fav/', AddFavView.as_view(), name="add_fav"),  # 添加机构收藏
+    path('batch_fav/', BatchFavView.as_view(), name="batch_fav"),  # 批量收藏或取消收藏
 ]
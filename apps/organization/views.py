@@ -1,14 +1,20 @@
+import json
+
 from django.shortcuts import render, HttpResponse
-from django.db.models import Q
 
 from django.views.generic.base import View
-from pure_pagination import Paginator, EmptyPage, PageNotAnInteger
+from pure_pagination import PageNotAnInteger
 
 from .models import CourseOrg, CityDict, Teacher
+from .header import load_org_header
 from .forms import UserAskForm
-from operation.models import UserFavorite
-from courses.models import Course
+from operation.favorites import has_fav, toggle_fav, batch_toggle_fav
+from operation.asks import add_user_ask
 from organization.models import Teacher
+from operation.trending import get_trending, record
+from utils.counter import click_counter
+from utils.search import search_queryset
+from utils.pagination import KeysetPaginator
 
 
 class OrgListView(View):
@@ -20,14 +26,17 @@ class OrgListView(View):
         # 机构类别
         all_category = list(map(lambda x: {'code': x[0], 'explain': x[1]}, CourseOrg.ORG_CHOICES))
 
-        # 热门机构，选择点击数最多的3个机构显示到右边
-        hot_org = all_org.order_by('-click_nums')[:3]
+        # 热门机构，选择热度最高的3个机构显示到右边
+        hot_org = get_trending('org', 3)
+
+        order_field = 'id'  # keyset分页使用的排序字段
 
         # 全局搜索---课程列表
         search_keywords = request.GET.get('keywords', '')
         if search_keywords:
-            # 在name字段进行操作, 做like语句的操作。i代表不区分大小写，or操作使用Q
-            all_org = all_org.filter(Q(name__icontains=search_keywords) | Q(desc__icontains=search_keywords))
+            # 通过倒排索引搜索，结果按相关度排序，此时不能按字段做keyset分页
+            all_org = search_queryset(all_org, 'org', search_keywords)
+            order_field = None
 
         # 处理类别筛选，取回的是字符串
         category_code = request.GET.get('category', '')
@@ -43,14 +52,11 @@ class OrgListView(View):
         sort = request.GET.get('sort', '')
         if sort:
             if sort == 'students':
-                all_org = all_org.order_by('-students')
+                order_field = '-students'
             elif sort == 'courses':
-                all_org = all_org.order_by('-course_nums')
+                order_field = '-course_nums'
             elif sort == 'fav':
-                all_org = all_org.order_by('-fav_nums')
-
-        # 机构数量
-        org_nums = all_org.count()
+                order_field = '-fav_nums'
 
         # 对课程机构进行分页
         # 尝试获取前台get请求传递过来的page参数
@@ -59,10 +65,13 @@ class OrgListView(View):
             page = request.GET.get('page', 1)
         except PageNotAnInteger:
             page = 1
-        # 从列表中取5个出来，也就是每页显示5个
-        p = Paginator(all_org, 5, request=request)
+        # 从列表中取5个出来，也就是每页显示5个，翻页时按排序字段和id定位，不使用OFFSET
+        p = KeysetPaginator(all_org, 5, request=request, order_field=order_field)
         all_org = p.page(page)
 
+        # 机构数量，短时间缓存
+        org_nums = p.count
+
         # 标记当前页，用于页面选中active
         current_access_url = 'org'
         return render(request, 'org-list.html', locals())
@@ -74,11 +83,9 @@ class AddUserAskView(View):
         userask_form = UserAskForm(request.POST)
         # 判断form是否有效
         if userask_form.is_valid():
-            # 这里是modelform和form的区别
-            # 它有model的属性
-            # 当commit为true进行真正保存
-            userask_form.save(commit=True)
-            # 这样就不需要把一个一个字段取出来然后存到model的对象中之后save
+            # 校验通过后放入写入队列批量保存，时间窗口内相同手机号和课程的重复提交只记录一次，
+            # 对用户来说都是提交成功
+            add_user_ask(**userask_form.cleaned_data)
 
             # 如果保存成功,返回json字符串,后面content type是告诉浏览器的
             return HttpResponse('{"post_statue": "success", "msg": "Tips：提交成功"}', content_type='application/json')
@@ -90,27 +97,17 @@ class AddUserAskView(View):
 # 机构首页
 class OrgHomeView(View):
     def get(self, request, org_id):
-        # 通过id找到机构
-        course_org = CourseOrg.objects.get(id=org_id)
+        # 机构信息和收藏状态，各标签页共用缓存
+        course_org, has_fav = load_org_header(request, org_id)
 
-        # 点击数+1
-        course_org.click_nums += 1
-        course_org.save(update_fields=['click_nums'])
+        # 点击数+1，先记入计数器缓冲，定期批量写回数据库
+        click_counter.incr(course_org, 'click_nums')
+        record('org', course_org.id, 'click')
 
         # 通过机构找到这个机构的课程和教师，并按一些数据进行排序
         all_course = course_org.courses.all().order_by('-students', '-fav_nums', 'click_nums')[:4]
         all_teacher = course_org.teachers.all().order_by('-fav_nums', '-click_nums')[:4]
 
-        # TYPE_CHOICES = (
-        #     (1, "课程"),
-        #     (2, "课程机构"),
-        #     (3, "讲师")
-        # )
-        has_fav = False
-        if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=course_org.id, fav_type=2):
-                has_fav = True
-
         # 标记当前页，用于页面选中active
         current_access_url = 'org'
         current_url = 'org_home'
@@ -120,8 +117,8 @@ class OrgHomeView(View):
 # 机构课程详情
 class OrgCourseView(View):
     def get(self, request, org_id):
-        # 通过id找到机构
-        course_org = CourseOrg.objects.get(id=org_id)
+        # 机构信息和收藏状态，各标签页共用缓存
+        course_org, has_fav = load_org_header(request, org_id)
 
         # 通过机构找到这个机构的课程，并按一些数据进行排序
         all_course = course_org.courses.all().order_by('-students')
@@ -133,12 +130,6 @@ class OrgCourseView(View):
             elif sort == 'click':
                 all_course = all_course.order_by('click_nums')
 
-        # 机构是否已收藏
-        has_fav = False
-        if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=course_org.id, fav_type=2):
-                has_fav = True
-
         # 标记当前页，用于页面选中active
         current_access_url = 'org'
         current_url = 'org_course'
@@ -148,7 +139,8 @@ class OrgCourseView(View):
 # 机构讲师
 class OrgTeacherView(View):
     def get(self, request, org_id):
-        course_org = CourseOrg.objects.get(id=org_id)
+        # 机构信息和收藏状态，各标签页共用缓存
+        course_org, has_fav = load_org_header(request, org_id)
 
         # 通过机构找到这个机构的教师，并按一些数据进行排序
         all_teacher = course_org.teachers.all().order_by('-click_nums')
@@ -157,12 +149,6 @@ class OrgTeacherView(View):
             if sort == 'fav':
                 all_teacher = all_teacher.order_by('-fav_nums')
 
-        # 机构是否已收藏
-        has_fav = False
-        if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=course_org.id, fav_type=2):
-                has_fav = True
-
         # 标记当前页，用于页面选中active
         current_access_url = 'org'
         current_url = 'org_teacher'
@@ -172,13 +158,8 @@ class OrgTeacherView(View):
 # 机构介绍
 class OrgDescView(View):
     def get(self, request, org_id):
-        course_org = CourseOrg.objects.get(id=org_id)
-
-        # 机构是否已收藏
-        has_fav = False
-        if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=course_org.id, fav_type=2):
-                has_fav = True
+        # 机构信息和收藏状态，各标签页共用缓存
+        course_org, has_fav = load_org_header(request, org_id)
 
         # 标记当前页，用于页面选中active
         current_access_url = 'org'
@@ -204,88 +185,62 @@ class AddFavView(View):
             # 未登录时返回json提示未登录，跳转到登录页面是在ajax中做的
             return HttpResponse('{"fav_status":"fail", "fav_msg":"用户未登录"}', content_type='application/json')
 
-        exist_records = UserFavorite.objects.filter(user=request.user, fav_id=fav_id, fav_type=fav_type)
-
-        if exist_records:
-            # 如果已经存在，表明用户取消收藏
-            exist_records.delete()
-            if int(fav_type) == 2:
-                # 机构模型中存储的收藏数减1
-                CourseOrg.objects.get(id=fav_id).change_fav_nums(add=-1)
-            elif int(fav_type) == 1:
-                # 课程收藏-1
-                course = Course.objects.get(id=fav_type)
-                course.fav_nums -= 1
-                if course.fav_nums < 0:
-                    course.fav_nums = 0  # 避免负数出现
-                course.save(update_fields=['fav_nums'])
-            elif int(fav_type) == 3:
-                # 讲师收藏-1
-                teacher = Teacher.objects.get(id=fav_id)
-                teacher.fav_nums -= 1
-                if teacher.fav_nums < 0:
-                    teacher.fav_nums = 0  # 避免负数出现
-                teacher.save(update_fields=['fav_nums'])
-            return HttpResponse('{"fav_status":"success", "fav_msg":"添加收藏"}', content_type='application/json')
+        # 收藏服务在一个事务中完成收藏记录和收藏数的修改
+        result = toggle_fav(request.user, fav_id, fav_type)
+        if result is None:
+            return HttpResponse('{"fav_status":"fail", "fav_msg":"收藏出错"}', content_type='application/json')
+        elif result:
+            # 返回的是按钮上要显示的文字
+            return HttpResponse('{"fav_status":"success", "fav_msg":"取消收藏"}', content_type='application/json')
         else:
-            user_fav = UserFavorite()
-            # 如果取到了id值才进行收藏
-            if int(fav_id) > 0 and int(fav_type) > 0:
-                user_fav.fav_id = fav_id
-                user_fav.fav_type = fav_type
-                user_fav.user = request.user
-                user_fav.save()
-
-                if int(fav_type) == 2:
-                    # 机构模型中存储的收藏数加1
-                    CourseOrg.objects.get(id=fav_id).change_fav_nums(add=1)
-                elif int(fav_type) == 1:
-                    # 课程收藏-1
-                    course = Course.objects.get(id=fav_type)
-                    course.fav_nums += 1
-                    course.save(update_fields=['fav_nums'])
-                elif int(fav_type) == 3:
-                    # 讲师收藏-1
-                    teacher = Teacher.objects.get(id=fav_id)
-                    teacher.fav_nums += 1
-                    teacher.save(update_fields=['fav_nums'])
-                return HttpResponse('{"fav_status":"success", "fav_msg":"取消收藏"}', content_type='application/json')
-            else:
-                return HttpResponse('{"fav_status":"fail", "fav_msg":"收藏出错"}', content_type='application/json')
+            return HttpResponse('{"fav_status":"success", "fav_msg":"添加收藏"}', content_type='application/json')
+
+
+# 批量收藏或取消收藏，fav_ids为逗号分隔的同一类型的数据id
+class BatchFavView(View):
+    def post(self, request):
+        if not request.user.is_authenticated:
+            return HttpResponse('{"fav_status":"fail", "fav_msg":"用户未登录"}', content_type='application/json')
+        fav_ids = request.POST.get('fav_ids', '').split(',')
+        fav_type = request.POST.get('fav_type', 0)
+        result = batch_toggle_fav(request.user, fav_ids, fav_type)
+        if result is None:
+            return HttpResponse('{"fav_status":"fail", "fav_msg":"收藏出错"}', content_type='application/json')
+        # 返回每个id切换后的状态，true为已收藏
+        return HttpResponse('{"fav_status":"success", "fav_result":%s}' % json.dumps({str(k): v for k, v in result.items()}),
+                            content_type='application/json')
 
 
 # 讲师列表
 class TeacherListView(View):
     def get(self, request):
         all_teacher = Teacher.objects.all().order_by('-click_nums')
-        teacher_nums = all_teacher.count()
+        order_field = '-click_nums'  # keyset分页使用的排序字段
 
         # 全局搜索---讲师列表
         search_keywords = request.GET.get('keywords', '')
         if search_keywords:
-            # 在name字段进行操作, 做like语句的操作。i代表不区分大小写，or操作使用Q
-            all_teacher = all_teacher.filter(Q(name__icontains=search_keywords) |
-                                             Q(points__icontains=search_keywords) |
-                                             Q(org__name__icontains=search_keywords) |
-                                             Q(work_company__icontains=search_keywords) |
-                                             Q(work_position__icontains=search_keywords))
+            # 通过倒排索引搜索，结果按相关度排序，此时不能按字段做keyset分页
+            all_teacher = search_queryset(all_teacher, 'teacher', search_keywords)
+            order_field = None
 
         sort = request.GET.get('sort', '')
         if sort:
             if sort == 'fav':
-                all_teacher = all_teacher.order_by('-fav_nums')
+                order_field = '-fav_nums'
 
         try:
             page = request.GET.get('page', 1)
         except PageNotAnInteger:
             page = 1
-            # 这里每页显示5个
-        p = Paginator(all_teacher, 5, request=request)
+            # 这里每页显示5个，翻页时按排序字段和id定位，不使用OFFSET
+        p = KeysetPaginator(all_teacher, 5, request=request, order_field=order_field)
 
         all_teacher_page = p.page(page)
+        teacher_nums = p.count
 
         # 排行榜讲师
-        rank_teacher = Teacher.objects.all().order_by("-fav_nums", "click_nums")[:5]
+        rank_teacher = get_trending('teacher', 5)
 
         # 标记当前页，用于页面选中active
         current_access_url = 'teacher'
@@ -297,12 +252,12 @@ class TeacherDetailView(View):
     def get(self, request, teacher_id):
         teacher = Teacher.objects.get(id=teacher_id)
 
-        # 增加讲师的访问量
-        teacher.click_nums += 1
-        teacher.save(update_fields=['click_nums'])
+        # 增加讲师的访问量，先记入计数器缓冲，定期批量写回数据库
+        click_counter.incr(teacher, 'click_nums')
+        record('teacher', teacher.id, 'click')
 
         # 排行榜讲师
-        rank_teacher = Teacher.objects.all().order_by("-fav_nums", "click_nums")[:5]
+        rank_teacher = get_trending('teacher', 5)
 
         # 讲师和机构是否已收藏
         has_fav_teacher = False
@@ -310,10 +265,11 @@ class TeacherDetailView(View):
 
         # 必须是用户已登录我们才需要判断。
         if request.user.is_authenticated:
-            if UserFavorite.objects.filter(user=request.user, fav_id=teacher.id, fav_type=3):
+            # 收藏集合按用户缓存，页面上的判断都不查询数据库
+            if has_fav(request.user, teacher.id, 3):
                 # 该讲师已收藏
                 has_fav_teacher = True
-            if UserFavorite.objects.filter(user=request.user, fav_id=teacher.org.id, fav_type=2):
+            if has_fav(request.user, teacher.org_id, 2):
                 # 该机构已收藏
                 has_fav_org = True
 
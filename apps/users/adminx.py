@@ -4,7 +4,7 @@
 import xadmin
 from xadmin import views
 
-from .models import EmailVerifyRecord, Banner, UserProfile
+from .models import EmailVerifyRecord, EmailOutbox, Banner, UserProfile, LoginIdentifier
 from courses.models import *
 from organization.models import *
 from operation.models import *
@@ -25,6 +25,16 @@ class EmailVerifyRecordAdmin(object):
 xadmin.site.register(EmailVerifyRecord, EmailVerifyRecordAdmin)
 
 
+# 邮件发件箱管理类，发送失败的邮件可以在这里查看错误信息
+class EmailOutboxAdmin(object):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_try_time', 'add_time', 'sent_time']
+    search_fields = ['to_email', 'subject']
+    list_filter = ['status', 'add_time']
+
+
+xadmin.site.register(EmailOutbox, EmailOutboxAdmin)
+
+
 # 创建banner的管理类
 class BannerAdmin(object):
     list_display = ['title', 'image', 'url', 'index', 'add_time']
@@ -36,6 +46,17 @@ class BannerAdmin(object):
 xadmin.site.register(Banner, BannerAdmin)
 
 
+# 登录标识由用户信号维护，后台只用于查看
+class LoginIdentifierAdmin(object):
+    list_display = ['identifier', 'kind', 'user', 'has_collisions']
+    search_fields = ['identifier']
+    list_filter = ['kind', 'has_collisions']
+    readonly_fields = ['identifier', 'kind', 'user']
+
+
+xadmin.site.register(LoginIdentifier, LoginIdentifierAdmin)
+
+
 # 创建Xadmin的全局管理器并与view绑定。
 class BaseSetting(object):
     # 开启主题功能
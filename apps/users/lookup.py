@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from utils.bloom import BloomFilter
+from utils.queue import CacheLock
+from .models import LoginIdentifier, UserProfile
+
+# 布隆过滤器放在缓存中各进程共用，进程内保留一份，版本号变化时重新读取。
+# 缓存必须是多进程共用的memcached/redis：本地内存缓存时别的进程看不到新加入的标识，会把新用户判断为不存在。
+# 只能使用本地内存缓存并且有多个进程时，设置LOGIN_BLOOM_ENABLED = False关闭过滤器
+BLOOM_KEY = 'login:bloom'
+BLOOM_VERSION_KEY = 'login:bloom:version'
+# 每次修改过滤器前加1，保存后如果发现期间有其它进程修改或放弃修改，说明刚保存的过滤器可能漏掉标识，让它失效
+BLOOM_GENERATION_KEY = 'login:bloom:generation'
+LOGIN_BLOOM_ENABLED = getattr(settings, 'LOGIN_BLOOM_ENABLED', True)
+LOGIN_BLOOM_CAPACITY = getattr(settings, 'LOGIN_BLOOM_CAPACITY', 100000)
+LOGIN_BLOOM_ERROR_RATE = getattr(settings, 'LOGIN_BLOOM_ERROR_RATE', 0.01)
+
+# 重建时要扫描整张登录标识表，锁的过期时间长一些
+lock = CacheLock('login:bloom:lock', timeout=60)
+_local = {'version': None, 'bloom': None}
+
+
+def normalize_identifier(value):
+    # 去掉首尾空白并统一大小写
+    return (value or '').strip().casefold()
+
+
+def _bloom_key(kind, identifier):
+    return '{}:{}'.format(kind, identifier)
+
+
+def _next_generation():
+    cache.add(BLOOM_GENERATION_KEY, 0, None)
+    try:
+        return cache.incr(BLOOM_GENERATION_KEY)
+    except ValueError:
+        # 刚好被清除了
+        cache.set(BLOOM_GENERATION_KEY, 1, None)
+        return 1
+
+
+def _invalidate():
+    # 先改变修改计数再删除版本号，正在保存的进程检查计数时会发现，不会把版本号恢复回来
+    _next_generation()
+    cache.delete(BLOOM_VERSION_KEY)
+
+
+def _save_bloom(bloom, generation):
+    """
+    保存过滤器，返回是否有效：保存后修改计数已经不是generation时，期间有其它进程修改过，删除版本号等待重建
+    """
+    version = uuid.uuid4().hex
+    cache.set(BLOOM_KEY, bloom, None)
+    cache.set(BLOOM_VERSION_KEY, version, None)
+    if cache.get(BLOOM_GENERATION_KEY) != generation:
+        cache.delete(BLOOM_VERSION_KEY)
+        return False
+    _local['version'], _local['bloom'] = version, bloom
+    return True
+
+
+def _rebuild():
+    # 持有锁时按登录标识表重建，返回(标识数, 过滤器)；拿不到锁或保存后已失效时过滤器为None
+    if not lock.acquire():
+        return None, None
+    try:
+        generation = _next_generation()
+        count = LoginIdentifier.objects.count()
+        bloom = BloomFilter(max(LOGIN_BLOOM_CAPACITY, count * 2), LOGIN_BLOOM_ERROR_RATE)
+        for kind, identifier in LoginIdentifier.objects.values_list('kind', 'identifier').iterator():
+            bloom.add(_bloom_key(kind, identifier))
+        return count, bloom if _save_bloom(bloom, generation) else None
+    finally:
+        lock.release()
+
+
+def rebuild_bloom():
+    """
+    按登录标识表重建布隆过滤器，过滤器失效后首次使用时自动执行，也可以由rebuild_login_filter命令执行。
+    返回加入的标识数，其它进程正在修改过滤器时返回None
+    """
+    return _rebuild()[0]
+
+
+def get_bloom():
+    """
+    当前的布隆过滤器，其它进程正在重建时返回None，此时不使用过滤器
+    """
+    version = cache.get(BLOOM_VERSION_KEY)
+    if version is not None and version == _local['version']:
+        return _local['bloom']
+    bloom = cache.get(BLOOM_KEY) if version is not None else None
+    if bloom is None:
+        return _rebuild()[1]
+    _local['version'], _local['bloom'] = version, bloom
+    return bloom
+
+
+def _add_to_bloom(keys):
+    # 拿不到锁、过滤器已被清除或已失效时都让它失效，下次使用时重建，保证不会漏判
+    if not lock.acquire():
+        _invalidate()
+        return
+    try:
+        generation = _next_generation()
+        bloom = cache.get(BLOOM_KEY)
+        if bloom is None or cache.get(BLOOM_VERSION_KEY) is None:
+            cache.delete(BLOOM_VERSION_KEY)
+            return
+        for key in keys:
+            bloom.add(key)
+        _save_bloom(bloom, generation)
+    finally:
+        lock.release()
+
+
+def might_exist(identifier, kind):
+    # False表示一定不存在，不需要查询数据库
+    if not LOGIN_BLOOM_ENABLED:
+        return True
+    bloom = get_bloom()
+    return bloom is None or _bloom_key(kind, identifier) in bloom
+
+
+def email_exists(email):
+    """
+    邮箱是否已注册，布隆过滤器判断不存在时不查询数据库，否则按唯一索引查询一次
+    """
+    email = normalize_identifier(email)
+    if not email or not might_exist(email, 'email'):
+        return False
+    return LoginIdentifier.objects.filter(identifier=email, kind='email').exists()
+
+
+def get_user_by_identifier(value):
+    """
+    按用户名或邮箱找到用户，不区分大小写：布隆过滤器判断两者都不存在时不查询数据库，否则一次索引查询连同用户一起取出。
+    只差大小写的其它账号没有登录标识，只有标识标记了冲突、分属不同用户或者没有找到标识时，
+    并且输入与找到的用户不完全一致，才再按原样精确查找一次
+    """
+    identifier = normalize_identifier(value)
+    if not identifier or not (might_exist(identifier, 'username') or might_exist(identifier, 'email')):
+        return None
+    rows = list(LoginIdentifier.objects.select_related('user').filter(identifier=identifier))
+    users = {row.user_id: row.user for row in rows}
+    user = users.popitem()[1] if len(users) == 1 else None
+    if user is not None and not any(row.has_collisions for row in rows):
+        return user
+    value = value.strip()
+    if user is None or value not in (user.username, user.email):
+        exact = list(UserProfile.objects.filter(Q(username=value) | Q(email=value))[:2])
+        if len(exact) == 1:
+            return exact[0]
+    return user
+
+
+def sync_identifiers(user):
+    """
+    用户名或邮箱变化后同步登录标识表，已被其他用户占用的标识跳过并标记冲突
+    """
+    wanted = {(kind, normalize_identifier(value)) for kind, value in (('username', user.username), ('email', user.email)) if normalize_identifier(value)}
+    existing = {(kind, identifier): pk for pk, kind, identifier in LoginIdentifier.objects.filter(user=user).values_list('id', 'kind', 'identifier')}
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        LoginIdentifier.objects.filter(id__in=stale).delete()
+    added = []
+    for kind, identifier in wanted - set(existing):
+        try:
+            with transaction.atomic():
+                LoginIdentifier.objects.create(user=user, kind=kind, identifier=identifier)
+        except IntegrityError:
+            # 标识已被只差大小写的其他用户占用，标记冲突，该用户登录时按原样精确查找
+            LoginIdentifier.objects.filter(kind=kind, identifier=identifier).update(has_collisions=True)
+            continue
+        added.append(_bloom_key(kind, identifier))
+    if added:
+        # 提交后再加入过滤器，这时同时进行的重建要么已经能查到这些标识，要么会因为修改计数变化而失效
+        transaction.on_commit(lambda: _add_to_bloom(added))
@@ -0,0 +1,18 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from users.lookup import rebuild_bloom
+
+
+# 重建登录标识的布隆过滤器，部署后或用户数超过预计容量时执行
+class Command(BaseCommand):
+    help = '按登录标识表重建布隆过滤器'
+
+    def handle(self, *args, **options):
+        nums = rebuild_bloom()
+        if nums is None:
+            self.stdout.write('其它进程正在修改布隆过滤器，请稍后重试')
+        else:
+            self.stdout.write('已加入 {} 个登录标识'.format(nums))
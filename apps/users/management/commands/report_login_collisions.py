@@ -0,0 +1,30 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from users.lookup import normalize_identifier
+from users.models import LoginIdentifier, UserProfile
+
+
+# 列出用户名或邮箱与其他用户只差大小写的账号，这些账号没有登录标识，登录时需要按原样的大小写输入。
+# 同时按实际情况重新标记登录标识的冲突，冲突的账号改名或删除后可以执行一次，不再为该标识做精确查找
+class Command(BaseCommand):
+    help = '列出用户名或邮箱只差大小写的冲突账号，并更新登录标识的冲突标记'
+
+    def handle(self, *args, **options):
+        owners = {(kind, identifier): (pk, user_id)
+                  for pk, kind, identifier, user_id in LoginIdentifier.objects.values_list('id', 'kind', 'identifier', 'user_id').iterator()}
+        colliding = set()
+        nums = 0
+        for user_id, username, email in UserProfile.objects.order_by('id').values_list('id', 'username', 'email').iterator():
+            for kind, value in (('username', username), ('email', email)):
+                owner = owners.get((kind, normalize_identifier(value)))
+                if owner is None or owner[1] == user_id:
+                    continue
+                colliding.add(owner[0])
+                nums += 1
+                self.stdout.write('用户{} {} {} (与用户{}冲突)'.format(user_id, kind, value, owner[1]))
+        LoginIdentifier.objects.filter(has_collisions=True).exclude(id__in=colliding).update(has_collisions=False)
+        LoginIdentifier.objects.filter(id__in=colliding, has_collisions=False).update(has_collisions=True)
+        self.stdout.write('共 {} 个冲突的用户名或邮箱'.format(nums))
@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from utils.email_send import send_outbox_batch, EMAIL_OUTBOX_BATCH_SIZE
+
+
+# 发送发件箱中的邮件：多个工作线程各自取一批邮件，一批共用一个SMTP连接。
+# 可以常驻运行，也可以加--once由crontab定时执行
+class Command(BaseCommand):
+    help = '多线程批量发送发件箱中的邮件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='工作线程数')
+        parser.add_argument('--batch', type=int, default=EMAIL_OUTBOX_BATCH_SIZE, help='每批邮件数')
+        parser.add_argument('--interval', type=float, default=5, help='发件箱为空时等待的秒数')
+        parser.add_argument('--once', action='store_true', help='发件箱为空时退出')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        counts = []
+
+        def work():
+            nums = 0
+            try:
+                while not stop.is_set():
+                    batch_nums = send_outbox_batch(options['batch'])
+                    nums += batch_nums
+                    if not batch_nums:
+                        if options['once']:
+                            break
+                        stop.wait(options['interval'])
+            finally:
+                # 每个线程使用自己的数据库连接，退出时关闭
+                connection.close()
+                counts.append(nums)
+
+        workers = [threading.Thread(target=work, daemon=True) for i in range(max(options['workers'], 1))]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write('已处理 {} 封邮件'.format(sum(counts)))
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.8 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20180816_2025'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='read_message_id',
+            field=models.IntegerField(default=0, verbose_name='消息已读位置'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.0.8 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_login_identifiers(apps, schema_editor):
+    # 为已有用户生成登录标识，大小写不同但相同的标识只保留先注册的用户，并标记为有冲突。
+    # 后注册的用户登录时需要按原样的大小写输入，由lookup.get_user_by_identifier精确查找，
+    # 可以用report_login_collisions命令列出这些用户
+    UserProfile = apps.get_model('users', 'UserProfile')
+    LoginIdentifier = apps.get_model('users', 'LoginIdentifier')
+    identifiers = {}
+    for user_id, username, email in UserProfile.objects.order_by('id').values_list('id', 'username', 'email'):
+        for kind, value in (('username', username), ('email', email)):
+            identifier = (value or '').strip().casefold()
+            if not identifier:
+                continue
+            if (kind, identifier) in identifiers:
+                identifiers[(kind, identifier)].has_collisions = True
+                continue
+            identifiers[(kind, identifier)] = LoginIdentifier(user_id=user_id, kind=kind, identifier=identifier)
+    LoginIdentifier.objects.bulk_create(identifiers.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_userprofile_read_message_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginIdentifier',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identifier', models.CharField(max_length=254, verbose_name='登录标识')),
+                ('kind', models.CharField(choices=[('username', '用户名'), ('email', '邮箱')], max_length=10, verbose_name='类型')),
+                ('has_collisions', models.BooleanField(default=False, editable=False, verbose_name='有大小写冲突')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifiers', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '登录标识',
+                'verbose_name_plural': '登录标识',
+                'unique_together': {('identifier', 'kind')},
+            },
+        ),
+        migrations.RunPython(fill_login_identifiers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.0.8 on 2026-10-18 12:05
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_loginidentifier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254, verbose_name='收件人')),
+                ('from_email', models.CharField(max_length=254, verbose_name='发件人')),
+                ('subject', models.CharField(max_length=200, verbose_name='主题')),
+                ('body', models.TextField(verbose_name='内容')),
+                ('status', models.CharField(choices=[('pending', '待发送'), ('sent', '已发送'), ('failed', '发送失败')], default='pending', max_length=10, verbose_name='状态')),
+                ('attempts', models.IntegerField(default=0, verbose_name='失败次数')),
+                ('next_try_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='下次发送时间')),
+                ('claim', models.CharField(blank=True, default='', max_length=32, verbose_name='处理批次')),
+                ('last_error', models.CharField(blank=True, default='', max_length=500, verbose_name='错误信息')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='添加时间')),
+                ('sent_time', models.DateTimeField(blank=True, null=True, verbose_name='发送时间')),
+            ],
+            options={
+                'verbose_name': '邮件发件箱',
+                'verbose_name_plural': '邮件发件箱',
+                'index_together': {('status', 'next_try_time')},
+            },
+        ),
+    ]
@@ -18,11 +18,13 @@ class UserProfile(AbstractUser):
     address = models.CharField(max_length=100, default='', verbose_name='地址')
     mobile = models.CharField(max_length=11, null=True, blank=True, verbose_name='电话')
     image = models.ImageField(upload_to='image/%Y/%m', default='image/default.jpg', blank=True, null=True, max_length=100, verbose_name='头像')
+    # 消息已读位置，id不大于它的个人消息和全员消息都是已读，之后的按单条已读记录判断
+    read_message_id = models.IntegerField(default=0, verbose_name='消息已读位置')
 
     def get_unread_nums(self):
-        # 获取用户未读消息，import需要放在这儿，如果放在头部，会产生循环import
-        from operation.models import UserMessage
-        return UserMessage.objects.filter(user=self.id, has_read=False).count()
+        # 获取用户未读消息数，计数缓存命中时不查询数据库。import需要放在这儿，如果放在头部，会产生循环import
+        from operation.inbox import get_unread_nums
+        return get_unread_nums(self)
 
     # Meta信息，即后台栏目名
     class Meta:
@@ -32,6 +34,26 @@ class UserProfile(AbstractUser):
         return self.username
 
 
+# 登录标识：用户名和邮箱统一转为小写后各存一条，登录和查重都按identifier唯一索引查询，由信号同步
+class LoginIdentifier(models.Model):
+    KIND_CHOICES = (
+        ('username', '用户名'),
+        ('email', '邮箱'),
+    )
+    identifier = models.CharField(max_length=254, verbose_name='登录标识')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='类型')
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='identifiers', verbose_name='用户')
+    # 还有其它账号的用户名或邮箱与该标识只差大小写，这些账号没有登录标识，登录时要按原样的大小写精确查找
+    has_collisions = models.BooleanField(default=False, editable=False, verbose_name='有大小写冲突')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '登录标识'
+        unique_together = (('identifier', 'kind'),)
+
+    def __str__(self):
+        return '{}:{}'.format(self.kind, self.identifier)
+
+
 class EmailVerifyRecord(models.Model):
     SEND_CHOICES = (
         ("register", "注册"),
@@ -51,6 +73,34 @@ class EmailVerifyRecord(models.Model):
         return '{}({})'.format(self.code, self.email)
 
 
+# 发件箱：请求中只写入一条记录，由send_emails命令的工作线程批量发送，失败后按间隔翻倍重试
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = (
+        ('pending', '待发送'),
+        ('sent', '已发送'),
+        ('failed', '发送失败'),
+    )
+    to_email = models.EmailField(max_length=254, verbose_name='收件人')
+    from_email = models.CharField(max_length=254, verbose_name='发件人')
+    subject = models.CharField(max_length=200, verbose_name='主题')
+    body = models.TextField(verbose_name='内容')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='状态')
+    attempts = models.IntegerField(default=0, verbose_name='失败次数')
+    # 下次可以发送的时间，工作线程取出记录时会往后推，进程中断后到时间由其它线程接手
+    next_try_time = models.DateTimeField(default=datetime.now, verbose_name='下次发送时间')
+    claim = models.CharField(max_length=32, default='', blank=True, verbose_name='处理批次')
+    last_error = models.CharField(max_length=500, default='', blank=True, verbose_name='错误信息')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name='添加时间')
+    sent_time = models.DateTimeField(null=True, blank=True, verbose_name='发送时间')
+
+    class Meta:
+        verbose_name_plural = verbose_name = '邮件发件箱'
+        index_together = (('status', 'next_try_time'),)
+
+    def __str__(self):
+        return '{}({})'.format(self.subject, self.to_email)
+
+
 # 1、图片 2. 点击图片地址 3. 轮播图序号(控制前后)
 class Banner(models.Model):
     title = models.CharField(max_length=100, verbose_name='标题')
@@ -0,0 +1,15 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import UserProfile
+from .lookup import sync_identifiers
+
+
+# 新建用户或修改了用户名、邮箱时同步登录标识，只更新登录时间等字段时跳过
+@receiver(post_save, sender=UserProfile)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'username', 'email'} & set(update_fields):
+        sync_identifiers(instance)
@@ -1,3 +1,103 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from operation.tests import MigrationTestCase
+from . import lookup
+from .models import UserProfile, LoginIdentifier
+
+
+class BloomLoginTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        lookup._local.update(version=None, bloom=None)
+        self.user = UserProfile.objects.create_user('Alice', 'Alice@a.com', '12345')
+
+    def test_login_is_case_insensitive(self):
+        self.assertEqual(authenticate(username='alice', password='12345'), self.user)
+        self.assertEqual(authenticate(username=' ALICE@A.COM ', password='12345'), self.user)
+        self.assertIsNone(authenticate(username='alice', password='x'))
+
+    def test_unknown_identifier_skips_database(self):
+        lookup.get_bloom()
+        with self.assertNumQueries(0):
+            self.assertIsNone(lookup.get_user_by_identifier('nobody@a.com'))
+            self.assertFalse(lookup.email_exists('nobody@a.com'))
+
+    def test_added_identifier_is_found(self):
+        lookup.get_bloom()
+        lookup._add_to_bloom(['username:bob'])
+        self.assertTrue(lookup.might_exist('bob', 'username'))
+
+    def test_evicted_filter_is_rebuilt_not_reused(self):
+        lookup.get_bloom()
+        cache.delete(lookup.BLOOM_KEY)
+        lookup._add_to_bloom(['username:bob'])
+        self.assertIsNone(cache.get(lookup.BLOOM_VERSION_KEY))
+        # 重建后包含数据库中的标识
+        LoginIdentifier.objects.create(user=self.user, kind='username', identifier='bob')
+        self.assertTrue(lookup.might_exist('bob', 'username'))
+
+    def test_lock_timeout_invalidates_filter(self):
+        lookup.get_bloom()
+        with mock.patch.object(lookup.lock, 'acquire', return_value=False):
+            lookup._add_to_bloom(['username:bob'])
+            self.assertIsNone(cache.get(lookup.BLOOM_VERSION_KEY))
+            # 其它进程正在重建时不使用过滤器
+            self.assertIsNone(lookup.get_bloom())
+            self.assertTrue(lookup.might_exist('carol', 'username'))
+
+    def test_concurrent_change_invalidates_save(self):
+        # 重建期间其它进程放弃了添加，保存的过滤器不能生效
+        build = lookup.BloomFilter
+
+        def bloom_with_concurrent_invalidate(*args):
+            lookup._invalidate()
+            return build(*args)
+        with mock.patch.object(lookup, 'BloomFilter', side_effect=bloom_with_concurrent_invalidate):
+            self.assertIsNone(lookup.get_bloom())
+        self.assertIsNone(cache.get(lookup.BLOOM_VERSION_KEY))
+        self.assertIsNotNone(lookup.get_bloom())
+
+    def test_other_casing_without_collision_is_one_query(self):
+        lookup.get_bloom()
+        with self.assertNumQueries(1):
+            self.assertEqual(lookup.get_user_by_identifier('ALICE'), self.user)
+
+    def test_case_collision_falls_back_to_exact_lookup(self):
+        other = UserProfile.objects.create_user('alice', 'other@a.com', '54321')
+        self.assertFalse(LoginIdentifier.objects.filter(user=other, kind='username').exists())
+        self.assertTrue(LoginIdentifier.objects.get(user=self.user, kind='username').has_collisions)
+        self.assertEqual(authenticate(username='alice', password='54321'), other)
+        self.assertEqual(authenticate(username='Alice', password='12345'), self.user)
+
+    def test_report_command_lists_and_reflags_collisions(self):
+        other = UserProfile.objects.create_user('alice', 'other@a.com', '54321')
+        output = io.StringIO()
+        call_command('report_login_collisions', stdout=output)
+        self.assertIn('用户{} username alice'.format(other.id), output.getvalue())
+        # 冲突的账号改名后清除标记
+        UserProfile.objects.filter(id=other.id).update(username='carol')
+        call_command('report_login_collisions', stdout=io.StringIO())
+        self.assertFalse(LoginIdentifier.objects.filter(has_collisions=True).exists())
+
+
+class LoginIdentifierMigrationTest(MigrationTestCase):
+    migrate_from = ('users', '0006_userprofile_read_message_id')
+    migrate_to = ('users', '0007_loginidentifier')
+
+    def prepare(self):
+        self.first = UserProfile.objects.create_user('Bob', 'bob@a.com', '12345')
+        self.second = UserProfile.objects.create_user('bob', 'bob2@a.com', '12345')
+
+    def test_identifiers_are_filled_and_collisions_flagged(self):
+        new_apps = self.migrate([self.migrate_to])
+        rows = new_apps.get_model('users', 'LoginIdentifier').objects.values_list('user_id', 'kind', 'identifier', 'has_collisions')
+        self.assertEqual(sorted(rows), sorted([
+            (self.first.id, 'username', 'bob', True), (self.first.id, 'email', 'bob@a.com', False),
+            (self.second.id, 'email', 'bob2@a.com', False),
+        ]))
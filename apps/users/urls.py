@@ -3,7 +3,7 @@
 
 from django.urls import path, re_path
 
-from .views import UserCenterInfoView, UserModifypwdView, UserImageUploadView, ModifyEmailSendCodeView, SaveEmailModifyView, MyCourseView, MyFavoriteView, MyMessageView
+from .views import UserCenterInfoView, UserModifypwdView, UserImageUploadView, ModifyEmailSendCodeView, SaveEmailModifyView, MyCourseView, MyFavoriteView, MyMessageView, MessageReadView
 
 app_name = 'users'
 
@@ -17,5 +17,6 @@ urlpatterns = [
     path('my_course/', MyCourseView.as_view(), name='my_course'),  # 我的课程
     path('my_favorite/', MyFavoriteView.as_view(), name='my_favorite'),  # 我的收藏
     path('my_message/', MyMessageView.as_view(), name='my_message'),  # 我的消息
+    path('my_message/read/', MessageReadView.as_view(), name='message_read'),  # 标记单条消息已读
 ]
 
@@ -1,7 +1,7 @@
 from django.shortcuts import render, HttpResponse, HttpResponseRedirect, reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.db import transaction
 from django.views.generic import View
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.mixins import LoginRequiredMixin  # 需要登录才能访问
@@ -11,32 +11,36 @@ import json
 
 from captcha.models import CaptchaStore
 from captcha.helpers import captcha_image_url
-from pure_pagination import Paginator, EmptyPage, PageNotAnInteger
+from pure_pagination import EmptyPage, PageNotAnInteger
 
 from .models import UserProfile, EmailVerifyRecord
+from .lookup import get_user_by_identifier, email_exists
 from .forms import LoginForm, RegisterForm, ForgetPwdForm, ModifyPwdForm, UserImageUploadForm, UserCenterInfoForm
 from utils.email_send import send_register_email
-from operation.models import UserCourse, UserFavorite, UserMessage
+from operation.models import UserCourse, UserMessage
+from operation.trending import get_first
+from operation.favorites import FavoriteResolver
+from operation.inbox import InboxPaginator, mark_all_read, mark_read, get_unread_nums
 from courses.models import Course
-from organization.models import Teacher, CourseOrg
+from organization.models import CourseOrg
 from users.models import Banner
 
 
 # 自定义登录，可使用邮箱和账号
 class CustomBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # 不希望用户存在两个，get只能有一个。两个是get失败的一种原因 Q为使用并集查询
-            user = UserProfile.objects.get(Q(username=username) | Q(email=username))
-
-            # django的后台中密码加密：所以不能password==password
-            # UserProfile继承的AbstractUser中有def check_password(self, raw_password)
-
-            if user.check_password(password):
-                return user
-        except Exception as e:
+        # 用户名或邮箱都转为小写后按登录标识表的唯一索引查询，不存在的标识由布隆过滤器直接排除
+        user = get_user_by_identifier(username)
+        if user is None:
+            # 同样做一次密码哈希，避免通过响应时间判断账号是否存在
+            UserProfile().set_password(password)
             return None
 
+        # django的后台中密码加密：所以不能password==password
+        # UserProfile继承的AbstractUser中有def check_password(self, raw_password)
+        if user.check_password(password):
+            return user
+
 
 # 当我们配置url被这个view处理时，自动传入request对象
 def user_login(request):
@@ -130,26 +134,28 @@ class RegisterView(View):
             pass_word = request.POST.get("password", "")
 
             # 用户不为空字符串，且用户
-            if user_name.strip() != '' and not UserProfile.objects.filter(email=user_name):
-                # 实例化一个user_profile对象，将前台值存入
-                user_profile = UserProfile()
-                user_profile.username = user_name
-                user_profile.email = user_name
-
-                # 加密password进行保存
-                user_profile.password = make_password(pass_word)
-                # 默认激活状态True，需要改为False
-                user_profile.is_active = False
-                user_profile.save()
-
-                # 写入欢迎注册消息到用户消息
-                user_message = UserMessage()
-                user_message.user = user_profile.id  # 接收用户的id
-                user_message.message = '欢迎注册在线学习平台'
-                user_message.save()
-
-                # 发送注册激活邮件
-                send_register_email(request_uri=request.build_absolute_uri(), email=user_name, send_type='register')
+            if user_name.strip() != '' and not email_exists(user_name):
+                # 用户、欢迎消息和激活邮件在一个事务中写入，激活邮件只写入发件箱，不等待邮件服务器
+                with transaction.atomic():
+                    # 实例化一个user_profile对象，将前台值存入
+                    user_profile = UserProfile()
+                    user_profile.username = user_name
+                    user_profile.email = user_name
+
+                    # 加密password进行保存
+                    user_profile.password = make_password(pass_word)
+                    # 默认激活状态True，需要改为False
+                    user_profile.is_active = False
+                    user_profile.save()
+
+                    # 写入欢迎注册消息到用户消息
+                    user_message = UserMessage()
+                    user_message.user = user_profile.id  # 接收用户的id
+                    user_message.message = '欢迎注册在线学习平台'
+                    user_message.save()
+
+                    # 发送注册激活邮件
+                    send_register_email(request_uri=request.build_absolute_uri(), email=user_name, send_type='register')
 
                 return render(request, 'login.html')
             else:
@@ -222,7 +228,7 @@ class ForgetPwdView(View):
 
         if forgetpwd_form.is_valid():
             email = request.POST.get('email', '')
-            if UserProfile.objects.filter(email=email):
+            if email_exists(email):
                 # 如果邮箱是注册过的，就发送改密邮件，然后跳回登录页面
                 send_register_email(request_uri=request.build_absolute_uri(), email=email, send_type='forget')
 
@@ -394,7 +400,7 @@ class ModifyEmailSendCodeView(LoginRequiredMixin, View):
         new_email = request.GET.get('new_email', '').strip()
         if new_email == '':
             return HttpResponse('{"email_status":"fail", "email_msg":"邮箱不能为空"}', content_type='application/json')
-        elif UserProfile.objects.filter(email=new_email):
+        elif email_exists(new_email):
             return HttpResponse('{"email_status":"fail", "email_msg":"邮箱已存在"}', content_type='application/json')
         else:
             if send_register_email(request_uri=request.build_absolute_uri(), email=new_email, send_type='update_email'):
@@ -440,17 +446,17 @@ class MyFavoriteView(LoginRequiredMixin, View):
     redirect_field_name = 'next'
 
     def get(self, request):
+        # 收藏记录一次查询，每种类型一次in_bulk，页头的收藏下拉框复用已加载的对象
+        resolver = FavoriteResolver.for_request(request)
+
         # 获取所有用户收藏的课程
-        all_user_fav_course = UserFavorite.objects.filter(user=request.user, fav_type=1)
-        all_fav_course = [Course.objects.get(id=user_fav_course.fav_id) for user_fav_course in all_user_fav_course]
+        all_fav_course = resolver.resolve(1)
 
         # 获取所有用户收藏的讲师
-        all_user_fav_teacher = UserFavorite.objects.filter(user=request.user, fav_type=3)
-        all_fav_teacher = [Teacher.objects.get(id=user_fav_teacher.fav_id) for user_fav_teacher in all_user_fav_teacher]
+        all_fav_teacher = resolver.resolve(3)
 
         # 收藏的机构
-        all_user_fav_org = UserFavorite.objects.filter(user=request.user, fav_type=2)
-        all_fav_org = [CourseOrg.objects.get(id=user_fav_org.fav_id) for user_fav_org in all_user_fav_org]
+        all_fav_org = resolver.resolve(2)
         return render(request, 'usercenter-fav.html', locals())
 
 
@@ -460,27 +466,36 @@ class MyMessageView(LoginRequiredMixin, View):
     redirect_field_name = 'next'
 
     def get(self, request):
-        all_user_msg = UserMessage.objects.all().filter(user=request.user.id)
-
-        # 当访问我的消息时，所有未读消息变为已读
-        UserMessage.objects.filter(user=request.user.id, has_read=False).update(has_read=True)
-
         # 分页
         try:
             page = request.GET.get('page', 1)
         except PageNotAnInteger:
             page = 1
-        # 这里指从all_course中取8个出来，每页显示8个
-        p = Paginator(all_user_msg, 8, request=request)
+        # 个人消息和全员消息合并显示，每页显示8个，翻页时按消息id定位
+        p = InboxPaginator(request.user, 8, request=request)
         all_user_msg = p.page(page)
+
+        # 当访问我的消息时，所有未读消息变为已读，只需移动用户的消息已读位置
+        mark_all_read(request.user)
         return render(request, 'usercenter-msg.html', locals())
 
 
+# 标记单条消息已读
+class MessageReadView(LoginRequiredMixin, View):
+    login_url = '/login/'
+    redirect_field_name = 'next'
+
+    def post(self, request):
+        if mark_read(request.user, request.POST.get('msg_id', 0)):
+            return HttpResponse('{"status":"success", "unread_nums":%d}' % get_unread_nums(request.user), content_type='application/json')
+        return HttpResponse('{"status":"fail", "msg":"消息不存在"}', content_type='application/json')
+
+
 class IndexView(View):
     def get(self, request):
         all_banner = Banner.objects.all()
-        first_org = CourseOrg.objects.order_by('-students', '-click_nums', '-fav_nums').first()  # 最火机构
-        first_teacher = Teacher.objects.order_by('-fav_nums', '-click_nums').first()  # 最强讲师
+        first_org = get_first('org')  # 最火机构
+        first_teacher = get_first('teacher')  # 最强讲师
         # 课程位，取4个进行显示
         courses = Course.objects.all()[:8]
         # 轮播图课程位取1个显示
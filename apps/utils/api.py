@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""只读的JSON数据接口，支持fields字段筛选、cursor翻页、ETag/Last-Modified条件请求，边查询边输出"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FileField
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.generic.base import View
+
+from .fragment import get_list_version, get_list_modified
+from .pagination import KeysetPaginator
+
+API_PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 20)
+API_MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+
+def to_json(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def api_error(message, status=400):
+    return JsonResponse({'detail': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def int_param(request, name):
+    # 整数类型的查询参数，没有时返回None，不是整数时抛出ValueError
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('{}必须是整数'.format(name))
+
+
+def conditional(request, version_name):
+    """
+    根据列表版本号生成ETag，数据未变化时返回304，否则返回(None, etag, last_modified)
+    """
+    version = get_list_version(version_name)
+    etag = quote_etag(hashlib.md5('{}:{}'.format(version, request.get_full_path()).encode('utf-8')).hexdigest())
+    last_modified = get_list_modified(version_name)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+
+class CatalogView(View):
+    """
+    列表接口基类，子类指定model、允许返回的字段和对应的列表版本号名称。
+    ?fields=id,name 只查询需要的列(.values())，?cursor= 按id做keyset翻页，?limit= 每页数量
+    """
+    model = None
+    # 允许返回的字段，外键使用xxx_id
+    allowed_fields = ()
+    default_fields = ()
+    # 数据变化时由信号更新的列表版本号名称，见utils.fragment
+    version_name = None
+
+    def get_queryset(self, request, **kwargs):
+        # 查询参数不正确时抛出ValueError，返回400
+        return self.model.objects.all()
+
+    def get_version_name(self, **kwargs):
+        return self.version_name
+
+    def get_fields(self, request):
+        fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+        if not fields:
+            return list(self.default_fields)
+        unknown = [field for field in fields if field not in self.allowed_fields]
+        if unknown:
+            raise ValueError('不支持的字段: {}'.format(', '.join(unknown)))
+        return fields
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.GET.get('limit', API_PAGE_SIZE))
+        except ValueError:
+            raise ValueError('limit必须是整数')
+        return min(max(limit, 1), API_MAX_PAGE_SIZE)
+
+    def get(self, request, **kwargs):
+        try:
+            fields = self.get_fields(request)
+            limit = self.get_limit(request)
+            queryset = self.get_queryset(request, **kwargs)
+        except ValueError as e:
+            return api_error(str(e))
+
+        response, etag, last_modified = conditional(request, self.get_version_name(**kwargs))
+        if response is not None:
+            return response
+
+        paginator = KeysetPaginator(queryset, limit, order_field='id')
+        queryset = paginator.object_list
+        cursor = request.GET.get('cursor')
+        if cursor:
+            direction, values = paginator.decode_cursor(cursor)
+            if direction != 'next':
+                return api_error('cursor不正确')
+            queryset = paginator.seek(direction, values)
+        # 翻页需要id，多取一条判断是否还有下一页
+        rows = queryset.values(*(fields if 'id' in fields else fields + ['id']))[:limit + 1]
+
+        response = StreamingHttpResponse(self.stream(rows, fields, limit, paginator), content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def stream(self, rows, fields, limit, paginator):
+        # 逐条序列化输出，不在内存中拼出整个响应
+        file_fields = {field for field in fields if isinstance(self.model._meta.get_field(field), FileField)}
+        yield '{"results": ['
+        last = None
+        has_more = False
+        for i, row in enumerate(rows.iterator()):
+            if i == limit:
+                has_more = True
+                break
+            last = row
+            item = {}
+            for field in fields:
+                value = row[field]
+                if field in file_fields:
+                    value = default_storage.url(value) if value else None
+                item[field] = value
+            yield (',' if i else '') + to_json(item)
+        next_cursor = paginator.encode_cursor('next', last) if has_more else None
+        yield '], "next": {}}}'.format(to_json(next_cursor))
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""点击数等计数字段的延迟写入(write-behind)计数器"""
+
+import atexit
+import logging
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .queue import CacheLock
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindCounter(object):
+    """
+    计数器先把增量累积在缓存中，定期合并成按F()表达式的批量UPDATE写回数据库。
+    缓存为本地内存时是进程内缓冲，由该进程的请求和退出时写回；配置为memcached/redis时即为多进程共享缓冲，
+    此时也可以由flush_counters命令写回。
+    """
+    buffer_key = 'counter:buffer'
+    flush_at_key = 'counter:flush_at'
+
+    def __init__(self, interval=None):
+        # 两次写回数据库的最短间隔(秒)
+        self.interval = interval if interval is not None else getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10)
+        # 请求中只尝试两次，拿不到锁时直接写数据库，不在页面请求里长时间等待
+        self.lock = CacheLock('counter:lock', retries=2)
+
+    @staticmethod
+    def _update(label, field, pk_deltas):
+        # 相同增量的记录合并为一条UPDATE，F()保证并发时增量不会丢失
+        model = apps.get_model(label)
+        by_delta = defaultdict(list)
+        for pk, delta in pk_deltas.items():
+            if delta:
+                by_delta[delta].append(pk)
+        for delta, pks in by_delta.items():
+            model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+    def incr(self, instance, field, delta=1):
+        label = instance._meta.label
+        if not self.lock.acquire():
+            # 拿不到锁时直接写数据库，宁可多一次写入也不丢计数
+            self._update(label, field, {instance.pk: delta})
+            return
+        try:
+            buffer = cache.get(self.buffer_key) or {}
+            pk_deltas = buffer.setdefault((label, field), {})
+            pk_deltas[instance.pk] = pk_deltas.get(instance.pk, 0) + delta
+            cache.set(self.buffer_key, buffer, None)
+        finally:
+            self.lock.release()
+
+        # 距离上次写回超过间隔时，顺带把缓冲写回数据库
+        flush_at = cache.get(self.flush_at_key)
+        if flush_at is None or time.time() - flush_at >= self.interval:
+            self.flush()
+
+    def flush(self):
+        # 按模型和字段批量写回，写回成功的部分才从缓冲中删除，返回写回的记录数。
+        # 写回期间持有锁，其它请求拿不到锁时会直接写数据库，不会丢失增量
+        if not self.lock.acquire():
+            return 0
+        buffer = {}
+        try:
+            buffer = cache.get(self.buffer_key) or {}
+            cache.set(self.flush_at_key, time.time(), None)
+            nums = 0
+            for key in list(buffer):
+                label, field = key
+                self._update(label, field, buffer[key])
+                nums += len(buffer.pop(key))
+            return nums
+        finally:
+            # 写入失败时剩余的增量留在缓冲中，下次再写
+            if buffer:
+                cache.set(self.buffer_key, buffer, None)
+            else:
+                cache.delete(self.buffer_key)
+            self.lock.release()
+
+
+click_counter = WriteBehindCounter()
+
+
+# 进程退出时把剩余的增量写回数据库
+@atexit.register
+def _flush_on_exit():
+    try:
+        click_counter.flush()
+    except Exception:
+        # 没写回的增量仍留在缓存的缓冲中，共享缓存时由其它进程或flush_counters命令写回
+        logger.exception('退出时写回计数失败')
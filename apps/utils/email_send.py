@@ -1,14 +1,24 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from datetime import datetime, timedelta
 from random import Random
 import re
+import uuid
 
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 
-from users.models import EmailVerifyRecord
+from users.models import EmailVerifyRecord, EmailOutbox
 from django.conf import settings
 
+# 每个工作线程一次取出的邮件数，这一批共用一个SMTP连接
+EMAIL_OUTBOX_BATCH_SIZE = getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+# 失败后第一次重试的间隔(秒)，之后每次翻倍，超过最大次数不再发送
+EMAIL_OUTBOX_RETRY_DELAY = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+EMAIL_OUTBOX_MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+# 取出的邮件在这段时间(秒)内不会被其它线程取到，工作进程中断后到时间自动重新发送
+EMAIL_OUTBOX_LEASE = getattr(settings, 'EMAIL_OUTBOX_LEASE', 300)
+
 
 # 生成随机字符串
 def random_str(random_length=8):
@@ -29,6 +39,67 @@ def verify_email_format(email):
         return False
 
 
+def queue_email(subject, body, to_email, from_email=None):
+    # 写入发件箱，与请求在同一个事务中，事务回滚时邮件也不会发出
+    return EmailOutbox.objects.create(subject=subject, body=body, to_email=to_email, from_email=from_email or settings.EMAIL_FROM)
+
+
+def _claim_emails(batch_size):
+    # 先查出到期的邮件，再用带条件的UPDATE标记批次，多个线程同时取时每封邮件只会被一个线程拿到
+    now = datetime.now()
+    pending = EmailOutbox.objects.filter(status='pending', next_try_time__lte=now)
+    ids = list(pending.order_by('next_try_time').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    pending.filter(id__in=ids).update(claim=claim, next_try_time=now + timedelta(seconds=EMAIL_OUTBOX_LEASE))
+    return list(EmailOutbox.objects.filter(claim=claim, status='pending'))
+
+
+def _retry_later(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:500]
+    email.claim = ''
+    if email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.next_try_time = datetime.now() + timedelta(seconds=EMAIL_OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'next_try_time'])
+
+
+def send_outbox_batch(batch_size=None):
+    """
+    取出一批到期的邮件，打开一次连接逐封发送，发送失败的按间隔翻倍重试，返回取出的邮件数。
+    连接由EMAIL_BACKEND决定，本地测试可以使用filebased后端或本地的SMTP调试服务器
+    """
+    emails = _claim_emails(batch_size or EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # 连不上邮件服务器，整批稍后重试
+        for email in emails:
+            _retry_later(email, e)
+        return len(emails)
+
+    sent_ids = []
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.to_email], connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                _retry_later(email, e)
+            else:
+                sent_ids.append(email.id)
+    finally:
+        connection.close()
+    EmailOutbox.objects.filter(id__in=sent_ids).update(status='sent', sent_time=datetime.now(), claim='')
+    return len(emails)
+
+
 # 发送注册邮件,发送之前先保存到数据库，到时候查询链接是否存在
 def send_register_email(request_uri, email, send_type='register'):
     # 检查邮箱格式，格式不正确发送邮件返回False
@@ -58,32 +129,15 @@ def send_register_email(request_uri, email, send_type='register'):
     if send_type == 'register':
         email_title = '在线学习平台 注册激活链接'
         email_body = '请点击链接激活账号：{}active/{}'.format(request_uri, code)  # request_uri='http://127.0.0.1:8000/register/'
-
-        # 使用Django内置函数完成邮件发送。四个参数：主题，邮件内容，从哪里发，接受者list
-        send_status = send_mail(email_title, email_body, settings.EMAIL_FROM, [email])
-        if send_status:
-            return True
-        else:
-            return False
-
     elif send_type == 'forget':
         email_title = '在线学习平台 密码重置链接'
         email_body = '请点击链接重置密码：{}reset/{}'.format(request_uri, code)  # request_uri='http://127.0.0.1:8000/forgetpwd/'
-
-        # 使用Django内置函数完成邮件发送。四个参数：主题，邮件内容，从哪里发，接受者list
-        send_status = send_mail(email_title, email_body, settings.EMAIL_FROM, [email])
-        if send_status:
-            return True
-        else:
-            return False
-
     elif send_type == 'update_email':
         email_title = '在线学习平台 修改邮箱地址'
         email_body = '用户邮箱修改确认验证码：{} （区分大小写）'.format(code)
+    else:
+        return False
 
-        # 使用Django内置函数完成邮件发送。四个参数：主题，邮件内容，从哪里发，接受者list
-        send_status = send_mail(email_title, email_body, settings.EMAIL_FROM, [email])
-        if send_status:
-            return True
-        else:
-            return False
+    # 写入发件箱后立即返回，由send_emails命令的工作线程发送，请求不再等待邮件服务器
+    queue_email(email_title, email_body, email)
+    return True
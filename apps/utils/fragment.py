@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""模板片段缓存的版本号，数据变化时递增版本号使对应片段缓存失效"""
+
+import time
+
+from django.core.cache import cache
+
+
+# 片段依赖的关联数据，例如课程卡片中显示了机构名称，机构变化时课程卡片也要失效
+FRAGMENT_DEPENDS = {
+    'courses.Course': (('organization.CourseOrg', 'course_org_id'),),
+    'organization.Teacher': (('organization.CourseOrg', 'org_id'),),
+}
+
+
+def _object_key(label, pk):
+    return 'fragment:version:{}:{}'.format(label, pk)
+
+
+def _list_key(name):
+    return 'fragment:version:list:{}'.format(name)
+
+
+def _bump(key):
+    # 版本号初始值取当前时间，缓存被清除后也不会和旧片段的版本号重复
+    if not cache.add(key, int(time.time()), None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time()), None)
+    # 同时记录修改时间，用于接口的Last-Modified
+    cache.set(key + ':modified', int(time.time()), None)
+
+
+def bump_object_version(instance):
+    _bump(_object_key(instance._meta.label, instance.pk))
+
+
+def bump_list_version(name):
+    _bump(_list_key(name))
+
+
+def _get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        _bump(key)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key, 0)) for key in keys]
+
+
+def get_object_version(instance):
+    # 数据自身及其依赖数据的版本号，一次缓存读取
+    label = instance._meta.label
+    keys = [_object_key(label, instance.pk)]
+    for depend_label, attr in FRAGMENT_DEPENDS.get(label, ()):
+        keys.append(_object_key(depend_label, getattr(instance, attr, None)))
+    return '.'.join(_get_versions(keys))
+
+
+def get_list_version(name):
+    return _get_versions([_list_key(name)])[0]
+
+
+def get_list_modified(name):
+    # 列表最后一次变化的时间戳，没有记录时返回当前时间
+    modified = cache.get(_list_key(name) + ':modified')
+    if modified is None:
+        modified = int(time.time())
+        cache.set(_list_key(name) + ':modified', modified, None)
+    return modified
@@ -0,0 +1,17 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""模型的公共混入类"""
+
+
+class DerivedFieldsMixin(object):
+    """
+    editable=False 的统计字段由信号和命令通过UPDATE维护。已有记录整行save()时不写这些字段，
+    避免后台编辑等用读取时的旧值覆盖期间的增量更新
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if field.editable and not field.primary_key]
+        return super(DerivedFieldsMixin, self).save(*args, **kwargs)
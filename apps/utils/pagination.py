@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""基于排序键的keyset(seek)分页，兼容pure_pagination的模板用法"""
+
+import base64
+import hashlib
+import heapq
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from pure_pagination import Paginator, PageNotAnInteger
+from pure_pagination.paginator import Page, PageRepresentation
+
+
+class KeysetPaginator(Paginator):
+    """
+    上一页/下一页通过cursor参数记录当前页首尾记录的排序键值，用 WHERE (排序字段, id) < (值, id) 代替 OFFSET，
+    翻页再深也只是一次索引查询；页码链接仍然使用page参数。总数按查询语句缓存，减少COUNT(*)。
+    order_field 为空时(例如按搜索相关度排序)退化为普通的OFFSET分页。
+    """
+    cursor_param = 'cursor'
+
+    def __init__(self, object_list, per_page, request=None, order_field='-id', count=None,
+                 first_page_key=None, first_page_timeout=60, **kwargs):
+        super(KeysetPaginator, self).__init__(object_list, per_page, request=request, **kwargs)
+        self.order_field = order_field
+        # 已经维护了计数字段时可以直接传入总数
+        self._count = count
+        # 第一页最常访问，可以指定缓存key把第一页的数据缓存first_page_timeout秒，数据变化时由调用方删除该key
+        self.first_page_key = first_page_key
+        self.first_page_timeout = first_page_timeout
+        if order_field:
+            field = order_field.lstrip('-')
+            desc = order_field.startswith('-')
+            self.keys = [(field, desc)] if field in ('id', 'pk') else [(field, desc), ('id', desc)]
+            self.object_list = object_list.order_by(*[('-' if d else '') + f for f, d in self.keys])
+
+    def _get_count(self):
+        # 总数只用于显示“共N条”和页码，允许有短时间的误差
+        if self._count is None:
+            try:
+                cache_key = 'pagination:count:' + hashlib.md5(str(self.object_list.query).encode('utf-8')).hexdigest()
+            except Exception:
+                return super(KeysetPaginator, self)._get_count()
+            self._count = cache.get(cache_key)
+            if self._count is None:
+                self._count = self.object_list.count()
+                cache.set(cache_key, self._count, getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 60))
+        return self._count
+    count = property(_get_count)
+
+    def encode_cursor(self, direction, obj):
+        # obj可以是模型实例，也可以是values()返回的字典
+        values = [str(obj[field] if isinstance(obj, dict) else getattr(obj, field)) for field, desc in self.keys]
+        data = json.dumps([direction] + values).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            direction, values = data[0], data[1:]
+            model = self.object_list.model
+            values = [model._meta.get_field(field).to_python(value) for (field, desc), value in zip(self.keys, values)]
+        except Exception:
+            return None, None
+        if direction not in ('next', 'prev') or len(values) != len(self.keys):
+            return None, None
+        return direction, values
+
+    def seek(self, direction, values):
+        # 构造 (f1, f2) 在排序方向上位于 (v1, v2) 之后(或之前)的条件
+        condition = Q()
+        equal = {}
+        for (field, desc), value in zip(self.keys, values):
+            after = desc if direction == 'next' else not desc
+            condition |= Q(**dict(equal, **{field + ('__lt' if after else '__gt'): value}))
+            equal[field] = value
+        queryset = self.object_list.filter(condition)
+        if direction == 'prev':
+            queryset = queryset.reverse()
+        return queryset
+
+    def page(self, number):
+        cursor = self.request.GET.get(self.cursor_param) if self.request else None
+        if self.order_field and cursor:
+            direction, values = self.decode_cursor(cursor)
+            if direction:
+                try:
+                    number = max(int(number), 1)
+                except (TypeError, ValueError):
+                    raise PageNotAnInteger('That page number is not an integer')
+                rows = list(self.seek(direction, values)[:self.per_page + 1])
+                more = len(rows) > self.per_page
+                rows = rows[:self.per_page]
+                if direction == 'prev':
+                    rows.reverse()
+                return KeysetPage(rows, number, self, more if direction == 'next' else True)
+        number = self.validate_number(number)
+        if number == 1 and self.first_page_key:
+            rows = cache.get(self.first_page_key)
+            if rows is None:
+                rows = list(self.object_list[:self.per_page])
+                cache.set(self.first_page_key, rows, self.first_page_timeout)
+            return KeysetPage(rows, number, self)
+        bottom = (number - 1) * self.per_page
+        return KeysetPage(list(self.object_list[bottom:bottom + self.per_page]), number, self)
+
+
+class KeysetPage(Page):
+    def __init__(self, object_list, number, paginator, has_more=None):
+        self.has_more = has_more
+        super(KeysetPage, self).__init__(object_list, number, paginator)
+
+    def has_next(self):
+        if self.has_more is not None:
+            return self.has_more
+        return super(KeysetPage, self).has_next()
+
+    def _cursor_querystring(self, page_number, direction, obj):
+        querystring = self.paginator.request.GET.copy()
+        querystring['page'] = page_number
+        querystring[self.paginator.cursor_param] = self.paginator.encode_cursor(direction, obj)
+        return querystring.urlencode()
+
+    def next_page_number(self):
+        number = self.number + 1
+        if self.paginator.order_field and self.paginator.request and self.object_list:
+            return PageRepresentation(number, self._cursor_querystring(number, 'next', self.object_list[-1]))
+        return PageRepresentation(number, self._other_page_querystring(number))
+
+    def previous_page_number(self):
+        number = self.number - 1
+        if number > 1 and self.paginator.order_field and self.paginator.request and self.object_list:
+            return PageRepresentation(number, self._cursor_querystring(number, 'prev', self.object_list[0]))
+        return PageRepresentation(number, self._other_page_querystring(number))
+
+    def _other_page_querystring(self, page_number):
+        # 页码链接使用普通分页，去掉cursor参数
+        if self.paginator.request:
+            self.base_queryset.pop(self.paginator.cursor_param, None)
+        return super(KeysetPage, self)._other_page_querystring(page_number)
+
+
+class MergedQuerySet(object):
+    """
+    把多个同一模型、相同排序的查询集按排序键合并成一个有序序列，切片时每个查询集各取前N条再归并，
+    每个查询集都能走自己的索引，不需要 WHERE a OR b ORDER BY 的全量排序。
+    实现了KeysetPaginator用到的order_by、filter、reverse、count和切片
+    """
+
+    def __init__(self, querysets, ordering=('id',)):
+        self.querysets = list(querysets)
+        self.model = self.querysets[0].model
+        self.ordering = tuple(ordering)
+
+    def _clone(self, querysets, ordering=None):
+        return MergedQuerySet(querysets, ordering or self.ordering)
+
+    def order_by(self, *fields):
+        return self._clone([qs.order_by(*fields) for qs in self.querysets], fields)
+
+    def filter(self, *args, **kwargs):
+        return self._clone([qs.filter(*args, **kwargs) for qs in self.querysets])
+
+    def reverse(self):
+        ordering = [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+        return self._clone([qs.reverse() for qs in self.querysets], ordering)
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice) or k.step or (k.start or 0) < 0 or k.stop is None:
+            raise TypeError('MergedQuerySet只支持[start:stop]切片')
+        # 各字段的排序方向必须一致
+        desc = self.ordering[0].startswith('-')
+        fields = [field.lstrip('-') for field in self.ordering]
+        streams = [qs[:k.stop] for qs in self.querysets]
+        merged = heapq.merge(*streams, key=lambda obj: tuple(getattr(obj, field) for field in fields), reverse=desc)
+        return list(merged)[k.start or 0:k.stop]
@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""基于缓存的跨进程锁和批量写入队列"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+
+def is_shared_cache():
+    # 默认缓存是否为多进程共用的缓存，本地内存缓存和DummyCache只在本进程内
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return not backend.endswith(('.LocMemCache', '.DummyCache'))
+
+
+def is_redis_cache():
+    # 默认缓存是否为redis，只有开启了持久化的redis才能放还没写入数据库的数据
+    return 'redis' in settings.CACHES.get('default', {}).get('BACKEND', '').lower()
+
+
+class CacheLock(object):
+    # cache.add只有在key不存在时才会成功，借此实现跨进程的简单锁
+    def __init__(self, key, timeout=5, retries=20):
+        self.key = key
+        self.timeout = timeout
+        self.retries = retries
+
+    def acquire(self):
+        for i in range(self.retries):
+            if cache.add(self.key, 1, self.timeout):
+                return True
+            time.sleep(0.005)
+        return False
+
+    def release(self):
+        cache.delete(self.key)
+
+
+class CacheQueue(object):
+    """
+    请求中只把数据追加到缓存队列，队列达到batch_size条或距上次写入超过interval秒时，
+    取出全部数据交给handler批量写入数据库，也可以由flush命令定时写入。
+    写入前数据只在缓存中，缓存必须是多进程共用、开启了持久化并且不会淘汰该key的redis，
+    本地内存缓存和memcached在进程退出或内存不足时会丢数据，因此未配置redis时不能开启。
+    enabled为False时不经过缓存，put直接交给handler写入。
+    """
+
+    def __init__(self, name, handler, batch_size=50, interval=5, enabled=False):
+        if enabled and not is_redis_cache():
+            raise ImproperlyConfigured('批量写入队列{}需要配置开启了持久化的redis缓存'.format(name))
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.interval = interval
+        self.enabled = enabled
+        self.items_key = 'queue:{}:items'.format(name)
+        self.flush_at_key = 'queue:{}:flush_at'.format(name)
+        # 请求中只尝试两次，拿不到锁时直接写数据库
+        self.lock = CacheLock('queue:{}:lock'.format(name), retries=2)
+
+    def put(self, item):
+        # 未开启或拿不到锁时直接交给handler写入，保证数据不丢
+        if not self.enabled or not self.lock.acquire():
+            self.handler([item])
+            return
+        try:
+            items = cache.get(self.items_key) or []
+            items.append(item)
+            cache.set(self.items_key, items, None)
+        finally:
+            self.lock.release()
+
+        flush_at = cache.get(self.flush_at_key)
+        if len(items) >= self.batch_size or flush_at is None or time.time() - flush_at >= self.interval:
+            self.flush()
+
+    def pending(self):
+        # 尚未写入数据库的数据
+        if not self.enabled:
+            return []
+        return cache.get(self.items_key) or []
+
+    def flush(self):
+        if not self.enabled or not self.lock.acquire():
+            return 0
+        try:
+            items = cache.get(self.items_key) or []
+            cache.delete(self.items_key)
+            cache.set(self.flush_at_key, time.time(), None)
+        finally:
+            self.lock.release()
+        if items:
+            try:
+                self.handler(items)
+            except Exception:
+                # 写入失败时放回队列头部，下次再写
+                self._requeue(items)
+                raise
+        return len(items)
+
+    def _requeue(self, items):
+        # 放回时多等一会儿锁
+        lock = CacheLock(self.lock.key)
+        if not lock.acquire():
+            logger.error('批量写入队列%s放回数据失败，丢失%s条', self.name, len(items))
+            return
+        try:
+            cache.set(self.items_key, items + (cache.get(self.items_key) or []), None)
+        finally:
+            lock.release()
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""课程、机构、讲师的倒排索引搜索"""
+
+import hashlib
+import html
+import re
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import IntegerField, Count, Sum, OuterRef, Subquery
+from django.utils.html import strip_tags
+
+from operation.models import SearchIndex
+
+try:
+    # 可选依赖，安装pypinyin后支持拼音搜索
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+
+# 每种数据对应的模型及参与索引的字段和权重，字段中的__表示跨外键取值
+SEARCH_DOCS = {
+    'course': ('courses.Course', (('name', 3), ('desc', 2), ('detail', 1))),
+    'org': ('organization.CourseOrg', (('name', 3), ('desc', 1))),
+    'teacher': ('organization.Teacher', (('name', 3), ('points', 2), ('org__name', 1), ('work_company', 1), ('work_position', 1))),
+}
+
+TERM_MAX_LENGTH = 50
+WORD_RE = re.compile(r'[一-龥]+|[a-z0-9]+')
+
+
+def _is_cjk(word):
+    return '一' <= word[0] <= '龥'
+
+
+def tokenize(text, query=False):
+    """
+    中文按单字和二元组(bigram)切分，英文和数字按单词切分。
+    建索引时英文单词额外写入所有前缀，查询时只取完整单词，从而支持前缀匹配。
+    """
+    terms = []
+    for word in WORD_RE.findall((text or '').lower()):
+        if _is_cjk(word):
+            bigrams = [word[i:i + 2] for i in range(len(word) - 1)]
+            if query:
+                terms.extend(bigrams or [word])
+            else:
+                terms.extend(word)
+                terms.extend(bigrams)
+                if lazy_pinyin is not None:
+                    # 为每个二元组写入全拼和首字母，例如 入门 -> rumen、rm
+                    for bigram in bigrams:
+                        pinyin = lazy_pinyin(bigram)
+                        terms.append(''.join(pinyin))
+                        terms.append(''.join(p[0] for p in pinyin if p))
+        else:
+            word = word[:TERM_MAX_LENGTH]
+            if query:
+                terms.append(word)
+            else:
+                terms.extend(word[:i] for i in range(1, len(word) + 1))
+    return terms
+
+
+def _field_value(instance, field):
+    value = instance
+    for attr in field.split('__'):
+        value = getattr(value, attr, None)
+        if value is None:
+            return ''
+    # 课程详情等字段是富文本，去掉标签和实体，只索引文字
+    return html.unescape(strip_tags(str(value)))
+
+
+def _version_key(doc_type):
+    return 'search:version:{}'.format(doc_type)
+
+
+def _bump_version(doc_type):
+    # 索引有变化时递增版本号，旧版本的搜索结果缓存自然失效
+    key = _version_key(doc_type)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_indexed_fields(doc_type):
+    return [field for field, weight in SEARCH_DOCS[doc_type][1]]
+
+
+def index_document(doc_type, instance):
+    # 重新生成单条数据的索引
+    terms = Counter()
+    for field, weight in SEARCH_DOCS[doc_type][1]:
+        for term in tokenize(_field_value(instance, field)):
+            terms[term] += weight
+
+    with transaction.atomic():
+        SearchIndex.objects.filter(doc_type=doc_type, doc_id=instance.pk).delete()
+        SearchIndex.objects.bulk_create([
+            SearchIndex(doc_type=doc_type, doc_id=instance.pk, term=term, weight=weight)
+            for term, weight in terms.items()
+        ])
+    _bump_version(doc_type)
+
+
+def remove_document(doc_type, doc_id):
+    SearchIndex.objects.filter(doc_type=doc_type, doc_id=doc_id).delete()
+    _bump_version(doc_type)
+
+
+def rebuild_index(doc_type):
+    # 全量重建某种数据的索引，返回索引的数据条数
+    label, fields = SEARCH_DOCS[doc_type]
+    queryset = apps.get_model(label).objects.all()
+    if doc_type == 'teacher':
+        queryset = queryset.select_related('org')
+    SearchIndex.objects.filter(doc_type=doc_type).delete()
+    nums = 0
+    for instance in queryset.iterator():
+        index_document(doc_type, instance)
+        nums += 1
+    return nums
+
+
+def _matches(doc_type, terms):
+    # 命中全部词条的数据，按数据id分组
+    return SearchIndex.objects.filter(doc_type=doc_type, term__in=terms).values('doc_id').annotate(hits=Count('id')).filter(hits=len(terms))
+
+
+def search(doc_type, keywords):
+    """
+    返回按相关度排序的全部数据id列表，要求命中查询中的全部词条。
+    结果按规范化后的词条缓存，索引版本变化后缓存失效。
+    """
+    terms = sorted(set(tokenize(keywords, query=True)))
+    if not terms:
+        return []
+
+    digest = hashlib.md5(' '.join(terms).encode('utf-8')).hexdigest()
+    cache_key = 'search:{}:{}:{}'.format(doc_type, cache.get(_version_key(doc_type), 0), digest)
+    ids = cache.get(cache_key)
+    if ids is None:
+        rows = _matches(doc_type, terms).annotate(score=Sum('weight')).order_by('-score', '-doc_id')
+        ids = [row['doc_id'] for row in rows]
+        cache.set(cache_key, ids, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 600))
+    return ids
+
+
+def search_queryset(queryset, doc_type, keywords):
+    """
+    用搜索结果过滤查询集，并按相关度排序，后续仍可以用order_by覆盖排序。
+    过滤和相关度都用子查询交给数据库，结果再多也不会把id列表拼进SQL，分页总数也是准确的
+    """
+    terms = sorted(set(tokenize(keywords, query=True)))
+    if not terms:
+        return queryset.none()
+    score = SearchIndex.objects.filter(doc_type=doc_type, term__in=terms, doc_id=OuterRef('pk')).values('doc_id').annotate(
+        score=Sum('weight')).values('score')
+    return queryset.filter(pk__in=_matches(doc_type, terms).values('doc_id')).annotate(
+        search_score=Subquery(score, output_field=IntegerField())).order_by('-search_score', '-pk')
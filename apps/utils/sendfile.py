@@ -0,0 +1,157 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""媒体文件下载和视频播放，支持Range分段请求、条件请求和前端服务器sendfile"""
+
+import os
+import re
+import mimetypes
+from urllib.parse import quote, unquote, urlparse
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# 只支持单个区间，例如 bytes=0-499、bytes=500-、bytes=-500
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange(object):
+    """
+    文件的一个区间，read()最多只读到区间末尾。
+    保留fileno()，gunicorn等服务器会从当前位置按Content-Length直接sendfile，不经过Python缓冲
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def media_path(url, host=None):
+    """
+    本站MEDIA_URL下的文件地址转换为磁盘路径，外部地址或路径越界时返回None。
+    带域名的地址只有域名是本站(host，一般传入request.get_host())时才算本站文件
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.netloc and parsed.netloc.lower() != (host or '').lower():
+        return None
+    path = unquote(parsed.path)
+    if not path.startswith(settings.MEDIA_URL):
+        return None
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    full_path = os.path.abspath(os.path.join(root, path[len(settings.MEDIA_URL):]))
+    if not full_path.startswith(root + os.sep):
+        return None
+    return full_path
+
+
+def parse_range(header, size):
+    """
+    解析Range请求头，返回(start, end)闭区间；没有或不支持时返回None，区间不可满足时返回False
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # 最后N个字节
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return 'attachment; filename="{}"'.format(filename)
+    except UnicodeEncodeError:
+        return "attachment; filename*=utf-8''{}".format(quote(filename))
+
+
+def serve_file(request, path, filename=None, attachment=False, sendfile_root=None, sendfile_url=None):
+    """
+    发送本地文件：
+    1. ETag/Last-Modified条件请求，未修改返回304
+    2. Range分段请求返回206，视频可以拖动播放
+    3. 配置了SENDFILE_BACKEND时只返回X-Accel-Redirect/X-Sendfile头，由nginx/apache发送文件。
+       nginx的内部地址为 sendfile_url + 相对sendfile_root的路径，默认是SENDFILE_URL和MEDIA_ROOT
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404('文件不存在')
+    if not os.path.isfile(path):
+        raise Http404('文件不存在')
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = quote_etag('{:x}-{:x}'.format(last_modified, size))
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    backend = getattr(settings, 'SENDFILE_BACKEND', '')
+    if backend:
+        # 前端服务器自己处理Range和条件请求
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            # nginx中需要配置 internal 的location，指向sendfile_root
+            relative_path = os.path.relpath(path, os.path.abspath(sendfile_root or settings.MEDIA_ROOT)).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = quote((sendfile_url or getattr(settings, 'SENDFILE_URL', '/protected/')) + relative_path)
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE', '')
+        if range_header:
+            # If-Range不匹配时说明文件已变化，返回整个文件
+            if_range = request.META.get('HTTP_IF_RANGE', '')
+            if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+                byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416, content_type=content_type)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(FileRange(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = size
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if attachment:
+        response['Content-Disposition'] = content_disposition(filename or os.path.basename(path))
+    return response
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""边读文件边生成zip压缩包，不生成临时文件，内存占用只有一个数据块"""
+
+import os
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+# 这些格式本身已经压缩过，直接存储，不再deflate
+STORED_EXTENSIONS = {
+    '.zip', '.rar', '.7z', '.gz', '.bz2', '.xz',
+    '.jpg', '.jpeg', '.png', '.gif', '.mp3', '.mp4', '.flv', '.avi', '.mkv',
+}
+
+
+class _ChunkBuffer(object):
+    """
+    只能追加写入的缓冲区，没有tell/seek，ZipFile会改用数据描述符记录crc和大小
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def unique_name(name, used):
+    # 压缩包内文件重名时加序号
+    base, ext = os.path.splitext(name)
+    n = 1
+    while name in used:
+        n += 1
+        name = '{}({}){}'.format(base, n, ext)
+    used.add(name)
+    return name
+
+
+def stream_zip(files, chunk_size=CHUNK_SIZE):
+    """
+    files为(压缩包内文件名, 磁盘路径)的可迭代对象，生成zip文件的数据块
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for arcname, path in files:
+            stat = os.stat(path)
+            zinfo = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+            zinfo.file_size = stat.st_size
+            if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=stat.st_size > zipfile.ZIP64_LIMIT) as dest:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    dest.write(data)
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            # 文件结束时写入数据描述符
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # 关闭时写入中央目录
+    yield buffer.drain()